@@ -0,0 +1,459 @@
+"""Admission control: per route class bulkheads and per-user in-flight caps.
+
+Routes are grouped into classes (upload, pdf, preview, chat, jobs, default). Each
+class may run at most LIMIT requests at once; up to QUEUE more wait at most
+TIMEOUT seconds for a slot, and anything beyond that is turned away at once with
+503 and Retry-After. Each logged-in user may hold at most PER_USER requests of a
+class; the next one gets 429. Anonymous requests are only limited by their class:
+behind the proxy they all come from its address, so keying them on it would put
+every client starting a session under one user's cap. Health, metrics and static
+routes are never limited; neither are /batch and /bootstrap, but each of their
+parts is admitted like a request of its own.
+
+Inline previews have their own class, so the previews of one answer cannot take
+the slots a reference click needs, and clicks keep a short queue even where
+other classes have none. Render job status long-polls and results only wait on
+work that was admitted when it was submitted, so they are capped per user only.
+
+Counts live in one mmap()ed file per class, so with ADMISSION_LOCK_DIR
+(gunicorn.conf.py sets one) the limits hold across all workers of the instance,
+and a crashed worker's slots are reclaimed once a limit is hit. Without it limits
+apply per worker. Queued requests sleep until a release wakes them.
+Slots are released when the response is closed, so streamed PDFs and SSE
+answers hold theirs until the last byte.
+
+Every setting can be overridden per class, e.g. ADMISSION_UPLOAD_LIMIT=2,
+ADMISSION_CHAT_QUEUE=16, ADMISSION_PDF_PER_USER=4, ADMISSION_CHAT_TIMEOUT=5,
+ADMISSION_UPLOAD_RETRY_AFTER=30. A LIMIT or PER_USER of 0 means unlimited.
+"""
+import collections
+import contextlib
+import hashlib
+import math
+import mmap
+import os
+import select
+import tempfile
+import threading
+import time
+
+from metrics import record_phase, registry
+
+# Requests the instance can serve at once (workers x threads); gunicorn.conf.py derives it
+ADMISSION_CAPACITY = int(os.environ.get("ADMISSION_CAPACITY", "8"))
+# Queue length of each class as a multiple of its limit
+ADMISSION_QUEUE_FACTOR = float(os.environ.get("ADMISSION_QUEUE_FACTOR", "1"))
+ADMISSION_LOCK_DIR = os.environ.get("ADMISSION_LOCK_DIR")
+# Users are hashed into this many buckets to bound the size of the shared counters
+ADMISSION_USER_BUCKETS = int(os.environ.get("ADMISSION_USER_BUCKETS", "4096"))
+# Workers that may count requests at once, restarted ones included until their row is reclaimed
+ADMISSION_MAX_WORKERS = int(os.environ.get("ADMISSION_MAX_WORKERS", "64"))
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "1").lower() in ("1", "true", "yes")
+
+# URL rules per class; unlisted routes are "default"
+ROUTE_CLASSES = {
+    "upload": ("/upload_pdf",),
+    "pdf": ("/view_highlights", "/view_pdf/<blob_name>", "/highlight_jobs"),
+    "preview": ("/highlight_preview",),
+    "chat": ("/chat", "/chat/stream"),
+    "jobs": ("/highlight_jobs/<job_id>", "/highlight_jobs/<job_id>/result"),
+}
+EXEMPT_RULES = (
+    "/health",
+    "/metrics",
+    "/stats",
+    "/static/<path:filename>",
+    "/assets/<path:filename>",
+    # Only wait for their parts, each of which is admitted as a request of its own
+    "/batch",
+    "/bootstrap",
+)
+
+# class -> (share of ADMISSION_CAPACITY, minimum limit, minimum queue, per user,
+#           queue timeout, Retry-After); a share of 0 leaves the class unlimited
+_DEFAULTS = {
+    "upload": (0.25, 1, 0, 1, 2.0, 30),
+    "pdf": (0.25, 2, 2, 4, 5.0, 2),
+    "preview": (0.25, 1, 0, 3, 2.0, 2),
+    "chat": (0.5, 1, 0, 2, 5.0, 2),
+    "jobs": (0, 0, 0, 4, 2.0, 1),
+    "default": (0, 0, 0, 8, 2.0, 1),
+}
+
+admission_rejections = registry.counter(
+    "frontend_admission_rejections_total", "Requests turned away by admission control, by class and reason"
+)
+admission_wait = registry.histogram(
+    "frontend_admission_wait_seconds", "Time queued requests waited for a slot, by class"
+)
+
+
+def _setting(cls, name, default, cast):
+    return cast(os.environ.get(f"ADMISSION_{cls.upper()}_{name}", default))
+
+
+class Rejected(Exception):
+    def __init__(self, cls, reason, status, retry_after):
+        super().__init__(reason)
+        self.cls = cls
+        self.reason = reason
+        self.status = status
+        self.retry_after = retry_after
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class _Counters:
+    """In-flight counts of one class, shared by the workers through an mmap()ed file.
+
+    Each worker owns a row: its pid, its running and queued requests, and its
+    requests per user bucket. Totals are sums down a column, read and changed under
+    one flock() of the file, so an acquire costs the same however high the limit.
+    When a limit is hit the rows of dead workers are cleared, which frees the slots
+    of a worker that crashed. Queued requests block on a FIFO that releases write a
+    byte to while anyone is queued.
+    """
+
+    _PID, _RUNNING, _QUEUED, _USERS = 0, 1, 2, 3
+
+    def __init__(self, path, buckets, rows=ADMISSION_MAX_WORKERS):
+        self._width = self._USERS + buckets
+        self._rows = rows
+        size = rows * self._width * 4
+        # The layout is in the name, so a restart with other settings never reads old rows
+        self._fd = os.open(f"{path}-{rows}x{buckets}.counts", os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        self._cells = memoryview(self._map).cast("i")
+        try:
+            os.mkfifo(f"{path}.doorbell", 0o600)
+        except FileExistsError:
+            pass
+        # Read-write so opening never blocks for a writer, non-blocking so a full pipe never stalls a release
+        self._bell = os.open(f"{path}.doorbell", os.O_RDWR | os.O_NONBLOCK)
+        # flock() does not exclude threads sharing the descriptor
+        self._lock = threading.Lock()
+        self._row = None
+        self._reaped_at = 0.0
+
+    @contextlib.contextmanager
+    def _locked(self):
+        import fcntl
+
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                if self._row is None:
+                    self._row = self._claim_row()
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _claim_row(self):
+        pid = os.getpid()
+        bases = range(0, self._rows * self._width, self._width)
+        # A row with our pid was left by a dead worker whose pid we were given
+        free = [base for base in bases if self._cells[base + self._PID] in (0, pid)]
+        for base in free or [base for base in bases if not _alive(self._cells[base + self._PID])]:
+            self._clear(base)
+            self._cells[base + self._PID] = pid
+            return base
+        raise RuntimeError(f"All {self._rows} admission rows belong to live workers; raise ADMISSION_MAX_WORKERS")
+
+    def _clear(self, base):
+        self._map[base * 4:(base + self._width) * 4] = bytes(self._width * 4)
+
+    def _reap(self):
+        """Clear the rows of dead workers, at most once a second; True if any was cleared"""
+        now = time.monotonic()
+        if now - self._reaped_at < 1.0:
+            return False
+        self._reaped_at = now
+        reaped = False
+        for base in range(0, self._rows * self._width, self._width):
+            owner = self._cells[base + self._PID]
+            if owner and base != self._row and not _alive(owner):
+                self._clear(base)
+                reaped = True
+        return reaped
+
+    def _total(self, column):
+        return sum(self._cells[column::self._width])
+
+    def _full(self, column, limit):
+        if not limit or self._total(column) < limit:
+            return False
+        return not self._reap() or self._total(column) >= limit
+
+    def _add(self, column, bucket, n):
+        self._cells[self._row + column] += n
+        if bucket is not None:
+            self._cells[self._row + self._USERS + bucket] += n
+
+    def enter(self, bucket, limit, per_user, queue):
+        """Count a request in: "running", "queued", or the reason it is turned away"""
+        with self._locked():
+            if bucket is not None and self._full(self._USERS + bucket, per_user):
+                return "per_user"
+            if not self._full(self._RUNNING, limit):
+                self._add(self._RUNNING, bucket, 1)
+                return "running"
+            if not queue or self._full(self._QUEUED, queue):
+                return "queue_full"
+            self._add(self._QUEUED, bucket, 1)
+            return "queued"
+
+    def start(self, limit):
+        """Move one of our queued requests to running if there is room"""
+        with self._locked():
+            if self._full(self._RUNNING, limit):
+                return False
+            self._cells[self._row + self._QUEUED] -= 1
+            self._cells[self._row + self._RUNNING] += 1
+            return True
+
+    def leave(self, bucket, queued=False):
+        with self._locked():
+            self._add(self._QUEUED if queued else self._RUNNING, bucket, -1)
+            ring = not queued and self._total(self._QUEUED) > 0
+        if ring:
+            try:
+                os.write(self._bell, b"\0")
+            except BlockingIOError:
+                pass  # The pipe is full of wake-ups already
+
+    def wait(self, timeout):
+        """Block until a release rings or timeout seconds pass"""
+        poller = select.poll()
+        poller.register(self._bell, select.POLLIN)
+        if poller.poll(max(timeout, 0) * 1000):
+            try:
+                # One byte: each release wakes one waiter
+                os.read(self._bell, 1)
+            except BlockingIOError:
+                pass  # Another waiter took it
+
+    def totals(self):
+        with self._locked():
+            return self._total(self._RUNNING), self._total(self._QUEUED)
+
+
+class Ticket:
+    """A slot held by one admitted request; release() is idempotent"""
+
+    def __init__(self, bulkhead, bucket):
+        self._bulkhead = bulkhead
+        self._bucket = bucket
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._bulkhead._done(self._bucket)
+
+
+class Bulkhead:
+    def __init__(self, cls, directory):
+        share, min_limit, min_queue, per_user, timeout, retry_after = _DEFAULTS[cls]
+        self.cls = cls
+        limit = max(min_limit, math.ceil(ADMISSION_CAPACITY * share)) if share else 0
+        self.limit = _setting(cls, "LIMIT", str(limit), int)
+        queue = max(min_queue, int(self.limit * ADMISSION_QUEUE_FACTOR)) if self.limit else 0
+        self.queue = _setting(cls, "QUEUE", str(queue), int)
+        self.per_user = _setting(cls, "PER_USER", str(per_user), int)
+        self.timeout = _setting(cls, "TIMEOUT", str(timeout), float)
+        self.retry_after = _setting(cls, "RETRY_AFTER", str(retry_after), int)
+        self._counters = _Counters(os.path.join(directory, cls), ADMISSION_USER_BUCKETS if self.per_user else 0)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.queued = 0
+        self.counts = collections.Counter()
+        self._waits = collections.deque(maxlen=512)
+
+    def _reject(self, reason, status):
+        with self._lock:
+            self.counts[f"rejected_{reason}"] += 1
+        admission_rejections.inc(cls=self.cls, reason=reason)
+        raise Rejected(self.cls, reason, status, self.retry_after)
+
+    def _done(self, bucket):
+        self._counters.leave(bucket)
+        with self._lock:
+            self.in_flight -= 1
+
+    def acquire(self, user):
+        """Return a Ticket, or raise Rejected; a user of None is not capped per user"""
+        bucket = None
+        if self.per_user and user is not None:
+            bucket = int(hashlib.sha1(user.encode("utf-8")).hexdigest(), 16) % ADMISSION_USER_BUCKETS
+        state = self._counters.enter(bucket, self.limit, self.per_user, self.queue)
+        if state == "per_user":
+            self._reject("per_user", 429)
+        if state == "queue_full":
+            self._reject("queue_full", 503)
+        if state == "queued":
+            self._wait_for_slot(bucket)
+        with self._lock:
+            self.in_flight += 1
+            self.counts["admitted"] += 1
+        return Ticket(self, bucket)
+
+    def _wait_for_slot(self, bucket):
+        with self._lock:
+            self.queued += 1
+        start = time.monotonic()
+        started = False
+        try:
+            while not self._counters.start(self.limit):
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self._reject("timeout", 503)
+                self._counters.wait(remaining)
+            started = True
+        finally:
+            if not started:
+                self._counters.leave(bucket, queued=True)
+            waited = time.monotonic() - start
+            with self._lock:
+                self.queued -= 1
+                self._waits.append(waited)
+            admission_wait.observe(waited, cls=self.cls)
+            record_phase("admission", waited)
+
+    def stats(self):
+        instance_in_flight, instance_queued = self._counters.totals()
+        with self._lock:
+            waits = sorted(self._waits)
+            stats = {
+                "limit": self.limit,
+                "queue": self.queue,
+                "per_user": self.per_user,
+                "timeout": self.timeout,
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "instance_in_flight": instance_in_flight,
+                "instance_queued": instance_queued,
+                "counts": dict(self.counts),
+            }
+        stats["wait_ms_p50"] = round(waits[len(waits) // 2] * 1000, 1) if waits else 0.0
+        stats["wait_ms_p95"] = round(waits[int(len(waits) * 0.95)] * 1000, 1) if waits else 0.0
+        return stats
+
+
+class AdmissionController:
+    def __init__(self, lock_dir=ADMISSION_LOCK_DIR, enabled=ADMISSION_ENABLED):
+        self.lock_dir = lock_dir
+        self.enabled = enabled
+        self._classes = {rule: cls for cls, rules in ROUTE_CLASSES.items() for rule in rules}
+        self._pid = None
+        self._bulkheads = {}
+        self._lock = threading.Lock()
+
+    def _get_bulkheads(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    # Without a shared directory each worker gets its own (per-worker limits)
+                    directory = self.lock_dir or tempfile.mkdtemp(prefix="dot-rag-frontend-admission-")
+                    os.makedirs(directory, exist_ok=True)
+                    self._bulkheads = {cls: Bulkhead(cls, directory) for cls in _DEFAULTS}
+                    self._pid = pid
+        return self._bulkheads
+
+    def route_class(self, rule):
+        if rule is None or rule in EXEMPT_RULES:
+            return None
+        return self._classes.get(rule, "default")
+
+    def admit(self, rule, user):
+        """Ticket for a request to rule by user, None when exempt; raises Rejected"""
+        cls = self.route_class(rule)
+        if not self.enabled or cls is None:
+            return None
+        return self._get_bulkheads()[cls].acquire(user)
+
+    def stats(self):
+        bulkheads = self._get_bulkheads()
+        return {
+            "enabled": self.enabled,
+            "cross_worker": bool(self.lock_dir),
+            "classes": {cls: bulkhead.stats() for cls, bulkhead in bulkheads.items()},
+        }
+
+    def gauges(self):
+        classes = self.stats()["classes"]
+        return [
+            ("frontend_admission_in_flight", "gauge", "Admitted requests still running in this worker, by class",
+             [({"cls": cls}, s["in_flight"]) for cls, s in classes.items()]),
+            ("frontend_admission_queued", "gauge", "Requests in this worker waiting for a slot, by class",
+             [({"cls": cls}, s["queued"]) for cls, s in classes.items()]),
+        ]
+
+
+def init_app(app, controller):
+    """Admit each request before its view runs and release it when the response closes"""
+    from flask import g, jsonify, request, session
+    from werkzeug.wsgi import ClosingIterator
+
+    @app.before_request
+    def _admit():
+        rule = request.url_rule.rule if request.url_rule else None
+        if controller.route_class(rule) is None:
+            return None
+        # Anonymous requests (login, static pages) share the proxy's address; only their class limits them
+        user = session.get("user_id")
+        try:
+            g._admission_ticket = controller.admit(rule, user)
+        except Rejected as e:
+            if e.status == 429:
+                message = f"Too many {e.cls} requests in progress for this user"
+            else:
+                message = f"Server busy ({e.cls} requests); try again shortly"
+            return jsonify({"error": message, "reason": e.reason}), e.status, {"Retry-After": str(e.retry_after)}
+        return None
+
+    @app.after_request
+    def _release_on_close(response):
+        ticket = g.pop("_admission_ticket", None)
+        if ticket is None:
+            return response
+        if not response.direct_passthrough:
+            response.call_on_close(ticket.release)
+            return response
+        # werkzeug hands a passthrough body (send_file's file wrapper) to the server
+        # as is and the server only closes that body, so chain the release onto it
+        body = response.response
+        close = getattr(body, "close", None)
+
+        def close_and_release():
+            try:
+                if close is not None:
+                    close()
+            finally:
+                ticket.release()
+
+        try:
+            body.close = close_and_release
+        except AttributeError:
+            response.response = ClosingIterator(body, ticket.release)
+        return response
+
+    @app.teardown_request
+    def _release_unsent(exc):
+        # Only reached with a ticket when no response was produced
+        ticket = g.pop("_admission_ticket", None)
+        if ticket is not None:
+            ticket.release()
+
+    registry.register_collector(controller.gauges)
@@ -0,0 +1,215 @@
+"""Fingerprinted, precompressed static assets and negotiated response compression.
+
+At startup every file under static/ is hashed and, when compressible, gzip and
+(with the optional brotli package) brotli variants are built once. Templates
+link to /assets/<name>.<hash>.<ext> through asset_url(), so those URLs never
+change content and are served with an immutable Cache-Control. The rendered
+index page is kept per worker and revalidated with its ETag.
+
+Large JSON responses are compressed per request for clients that accept it;
+streamed responses (SSE, PDFs) are left alone.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+from metrics import phase
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+ASSET_URL_PREFIX = "/assets"
+ASSET_MAX_AGE = 365 * 24 * 3600
+# Smaller files are not worth a compressed variant
+ASSET_COMPRESS_MIN_BYTES = 1024
+# JSON responses at least this large are compressed when the client accepts it
+JSON_COMPRESS_MIN_BYTES = int(os.environ.get("JSON_COMPRESS_MIN_BYTES", "4096"))
+JSON_GZIP_LEVEL = int(os.environ.get("JSON_GZIP_LEVEL", "6"))
+JSON_BROTLI_QUALITY = int(os.environ.get("JSON_BROTLI_QUALITY", "5"))
+
+_COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+_ENCODINGS = ("br", "gzip")
+
+
+def _mimetype(name):
+    if name.endswith(".js"):
+        return "text/javascript; charset=utf-8"
+    mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    return f"{mimetype}; charset=utf-8" if mimetype.startswith("text/") else mimetype
+
+
+def _compressed_variants(data, mimetype, gzip_level=9, brotli_quality=11):
+    """{encoding: bytes} for the encodings that make data smaller"""
+    if len(data) < ASSET_COMPRESS_MIN_BYTES or not mimetype.startswith(_COMPRESSIBLE):
+        return {}
+    variants = {"gzip": gzip.compress(data, compresslevel=gzip_level, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=brotli_quality)
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data)}
+
+
+def _negotiate(request, variants):
+    """Best encoding in variants the client accepts, or "identity" """
+    accepted = request.accept_encodings
+    for encoding in _ENCODINGS:
+        if encoding in variants and accepted.quality(encoding) > 0:
+            return encoding
+    return "identity"
+
+
+class Asset:
+    def __init__(self, name, data, mimetype, digest):
+        self.name = name
+        self.mimetype = mimetype
+        self.digest = digest
+        self.variants = dict(_compressed_variants(data, mimetype), identity=data)
+
+    def response(self, request, cache_control):
+        from flask import Response
+
+        encoding = _negotiate(request, self.variants)
+        resp = Response(self.variants[encoding], mimetype=self.mimetype)
+        resp.set_etag(f"{self.digest}-{encoding}")
+        resp.headers["Cache-Control"] = cache_control
+        resp.vary.add("Accept-Encoding")
+        if encoding != "identity":
+            resp.headers["Content-Encoding"] = encoding
+        return resp.make_conditional(request)
+
+
+class AssetManifest:
+    """Maps logical static names (css/app.css) to fingerprinted, precompressed assets"""
+
+    def __init__(self, root):
+        self.root = root
+        self._assets = {}  # fingerprinted name -> Asset
+        self._names = {}  # logical name -> fingerprinted name
+        self._pages = {}  # template name -> Asset
+        self._lock = threading.Lock()
+
+    def build(self):
+        assets, names = {}, {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for filename in filenames:
+                if filename.startswith("."):
+                    continue
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, "/")
+                with open(path, "rb") as fh:
+                    data = fh.read()
+                digest = hashlib.sha256(data).hexdigest()[:12]
+                stem, ext = os.path.splitext(name)
+                fingerprinted = f"{stem}.{digest}{ext}"
+                assets[fingerprinted] = Asset(name, data, _mimetype(name), digest)
+                names[name] = fingerprinted
+        with self._lock:
+            self._assets, self._names = assets, names
+            self._pages.clear()
+
+    def url(self, name):
+        fingerprinted = self._names.get(name)
+        return f"{ASSET_URL_PREFIX}/{fingerprinted or name}"
+
+    def get(self, filename):
+        """(asset, immutable) for a fingerprinted or plain logical name"""
+        asset = self._assets.get(filename)
+        if asset is not None:
+            return asset, True
+        fingerprinted = self._names.get(filename)
+        return (self._assets[fingerprinted], False) if fingerprinted else (None, False)
+
+    def page(self, template):
+        """The rendered template as an Asset, rendered once per manifest build"""
+        asset = self._pages.get(template)
+        if asset is None:
+            from flask import render_template
+
+            data = render_template(template).encode("utf-8")
+            asset = Asset(template, data, "text/html; charset=utf-8", hashlib.sha256(data).hexdigest()[:12])
+            with self._lock:
+                self._pages[template] = asset
+        return asset
+
+    def stats(self):
+        with self._lock:
+            assets = list(self._assets.values()) + list(self._pages.values())
+        return {
+            "assets": len(self._assets),
+            "pages": len(self._pages),
+            "brotli": brotli is not None,
+            "bytes": {
+                encoding: sum(len(a.variants[encoding]) for a in assets if encoding in a.variants)
+                for encoding in ("identity",) + _ENCODINGS
+            },
+        }
+
+
+def _should_compress(request, response):
+    return (
+        response.status_code == 200
+        and response.mimetype == "application/json"
+        and not response.direct_passthrough
+        and not response.is_streamed
+        and "Content-Encoding" not in response.headers
+        and request.method != "HEAD"
+    )
+
+
+def compress_response(request, response):
+    """Compress a buffered JSON response for clients that accept br/gzip"""
+    if not _should_compress(request, response):
+        return response
+    data = response.get_data()
+    if len(data) < JSON_COMPRESS_MIN_BYTES:
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = _negotiate(request, ("br", "gzip") if brotli is not None else ("gzip",))
+    if encoding == "identity":
+        return response
+    with phase("compress"):
+        if encoding == "br":
+            body = brotli.compress(data, quality=JSON_BROTLI_QUALITY)
+        else:
+            body = gzip.compress(data, compresslevel=JSON_GZIP_LEVEL)
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak=weak)
+    return response
+
+
+def init_app(app, manifest=None):
+    """Build the asset manifest, expose asset_url() to templates and serve /assets"""
+    from flask import abort, request
+
+    manifest = manifest or AssetManifest(app.static_folder)
+    manifest.build()
+    app.extensions["assets"] = manifest
+    app.jinja_env.globals["asset_url"] = manifest.url
+
+    @app.route(f"{ASSET_URL_PREFIX}/<path:filename>")
+    def asset(filename):
+        found, immutable = manifest.get(filename)
+        if found is None:
+            abort(404)
+        cache_control = f"public, max-age={ASSET_MAX_AGE}, immutable" if immutable else "no-cache"
+        return found.response(request, cache_control)
+
+    @app.after_request
+    def _compress(response):
+        return compress_response(request, response)
+
+    return manifest
+
+
+def send_page(template):
+    """Serve a rendered template from the manifest with ETag revalidation"""
+    from flask import current_app, request
+
+    return current_app.extensions["assets"].page(template).response(request, "no-cache")
@@ -0,0 +1,40 @@
+import asyncio
+import os
+import threading
+
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+
+def _run_loop(loop):
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def get_event_loop():
+    """Return this process's background event loop, starting it on first use.
+
+    Request handlers share one long-lived loop instead of creating and closing
+    a new loop per request. The loop is recreated after fork.
+    """
+    global _loop, _loop_pid
+    pid = os.getpid()
+    if _loop is None or _loop_pid != pid:
+        with _loop_lock:
+            if _loop is None or _loop_pid != pid:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=_run_loop, args=(loop,), name="async-runtime", daemon=True)
+                thread.start()
+                _loop, _loop_pid = loop, pid
+    return _loop
+
+
+def run_coroutine(coro, timeout=None):
+    """Run a coroutine on the shared loop from synchronous code and return its result"""
+    future = asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+    try:
+        return future.result(timeout=timeout)
+    except Exception:
+        future.cancel()
+        raise
@@ -0,0 +1,209 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from metrics import record_backend_call
+
+BACKEND_BASE_URL = os.environ.get("BACKEND_BASE_URL", "http://localhost:8000")
+
+# Connection pooling (per worker process)
+BACKEND_POOL_CONNECTIONS = int(os.environ.get("BACKEND_POOL_CONNECTIONS", "4"))
+BACKEND_POOL_MAXSIZE = int(os.environ.get("BACKEND_POOL_MAXSIZE", "32"))
+BACKEND_POOL_BLOCK = os.environ.get("BACKEND_POOL_BLOCK", "false").lower() in ("1", "true", "yes")
+
+# Bounded retry with exponential backoff, only applied to idempotent methods
+BACKEND_RETRIES = int(os.environ.get("BACKEND_RETRIES", "2"))
+BACKEND_RETRY_BACKOFF = float(os.environ.get("BACKEND_RETRY_BACKOFF", "0.3"))
+
+BACKEND_CONNECT_TIMEOUT = float(os.environ.get("BACKEND_CONNECT_TIMEOUT", "5"))
+
+# Default read timeouts (seconds) per proxied route. Override with
+# BACKEND_TIMEOUT_<ROUTE>=<read> or BACKEND_TIMEOUT_<ROUTE>=<connect>,<read>
+DEFAULT_READ_TIMEOUTS = {
+    "login": 20,
+    "chat_history": 30,
+    "user_sessions": 30,
+    "view_pdf": 60,
+    "view_highlights": 120,
+    "chat": 120,
+    "upload_pdf": 300,
+}
+
+
+def route_timeout(route):
+    """Return the (connect, read) timeout tuple for a route"""
+    connect = BACKEND_CONNECT_TIMEOUT
+    read = DEFAULT_READ_TIMEOUTS.get(route, 30)
+    override = os.environ.get(f"BACKEND_TIMEOUT_{route.upper()}")
+    if override:
+        parts = [float(p) for p in override.split(",") if p.strip()]
+        if len(parts) == 1:
+            read = parts[0]
+        elif len(parts) >= 2:
+            connect, read = parts[0], parts[1]
+    return (connect, read)
+
+
+class PoolStats:
+    """Thread-safe counters describing how the backend connection pool is used"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkins = 0
+            self.new_connections = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+
+    def record_checkout(self, waited):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            if waited > self.wait_max:
+                self.wait_max = waited
+
+    def record_checkin(self):
+        with self._lock:
+            self.checkins += 1
+
+    def record_new_connection(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def snapshot(self):
+        with self._lock:
+            checkouts = self.checkouts
+            reused = max(checkouts - self.new_connections, 0)
+            return {
+                "pid": os.getpid(),
+                "pool_maxsize": BACKEND_POOL_MAXSIZE,
+                "pool_block": BACKEND_POOL_BLOCK,
+                "requests": checkouts,
+                "connections_opened": self.new_connections,
+                "connections_in_use": max(checkouts - self.checkins, 0),
+                "reuse_ratio": round(reused / checkouts, 4) if checkouts else 0.0,
+                "avg_wait_ms": round(self.wait_total / checkouts * 1000, 3) if checkouts else 0.0,
+                "max_wait_ms": round(self.wait_max * 1000, 3),
+            }
+
+
+pool_stats = PoolStats()
+
+
+class _InstrumentedPoolMixin:
+    """Records checkout wait time, new connections and releases for pool_stats"""
+
+    def _new_conn(self):
+        pool_stats.record_new_connection()
+        return super()._new_conn()
+
+    def _get_conn(self, timeout=None):
+        start = time.perf_counter()
+        conn = super()._get_conn(timeout=timeout)
+        pool_stats.record_checkout(time.perf_counter() - start)
+        return conn
+
+    def _put_conn(self, conn):
+        pool_stats.record_checkin()
+        return super()._put_conn(conn)
+
+
+class _InstrumentedHTTPConnectionPool(_InstrumentedPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _InstrumentedHTTPSConnectionPool(_InstrumentedPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class _PooledAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _InstrumentedHTTPConnectionPool,
+            "https": _InstrumentedHTTPSConnectionPool,
+        }
+
+
+def _build_session():
+    retry = Retry(
+        total=BACKEND_RETRIES,
+        backoff_factor=BACKEND_RETRY_BACKOFF,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}),
+        raise_on_status=False,
+    )
+    adapter = _PooledAdapter(
+        pool_connections=BACKEND_POOL_CONNECTIONS,
+        pool_maxsize=BACKEND_POOL_MAXSIZE,
+        pool_block=BACKEND_POOL_BLOCK,
+        max_retries=retry,
+    )
+    s = requests.Session()
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return this worker's shared keep-alive session.
+
+    The session is (re)built lazily per process so that gunicorn workers forked
+    from a preloaded master never share sockets with their parent.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+                pool_stats.reset()
+    return _session
+
+
+def backend_request(method, path, route, **kwargs):
+    """Send a request to BACKEND_BASE_URL through the pooled session"""
+    kwargs.setdefault("timeout", route_timeout(route))
+    start = time.perf_counter()
+    status = "error"
+    resp = None
+    try:
+        resp = get_session().request(method, f"{BACKEND_BASE_URL}{path}", **kwargs)
+        status = resp.status_code
+        return resp
+    finally:
+        size = None
+        if resp is not None:
+            length = resp.headers.get("Content-Length")
+            if length and length.isdigit():
+                size = int(length)
+            elif not kwargs.get("stream"):
+                size = len(resp.content)
+        record_backend_call(route, status, time.perf_counter() - start, size)
+
+
+def backend_get(path, route, **kwargs):
+    return backend_request("GET", path, route, **kwargs)
+
+
+def backend_post(path, route, **kwargs):
+    return backend_request("POST", path, route, **kwargs)
+
+
+def get_pool_stats():
+    return pool_stats.snapshot()
@@ -0,0 +1,184 @@
+"""Throughput of the reference engine on LLM-shaped answers and adversarial inputs.
+
+Compares references.extract_references against the previous regex parser
+(kept here as the baseline) on:
+
+  answers      synthetic answers with a bulleted reference list
+  inline       answers citing "(file.pdf, Page n)" inside the prose
+  streamed     the answers fed to ReferenceExtractor in ~4 character tokens
+  adversarial  whitespace runs, ".pdf" without pages, very long words and
+               huge page lists, at growing sizes to show the scaling
+
+    python benchmarks/bench_references.py --answers 2000 --json out.json
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from references import ReferenceExtractor, extract_references  # noqa: E402
+
+FILENAMES = [
+    "Telecom Licensing Guidelines (2021).pdf",
+    "spectrum_policy v2.1.pdf",
+    "Infrastructure Sharing & Right of Way Rules.pdf",
+    "QoS Regulations - Amendment 3.pdf",
+    "Annual Report 2022-23.pdf",
+    "Unified License Agreement.pdf",
+]
+PROSE = (
+    "The licensee must ensure compliance with the quality of service benchmarks and "
+    "submit quarterly reports to the authority. Penalties apply for each deficiency, "
+    "and repeated violations may lead to suspension of the licence."
+).split()
+PAGE_FORMS = ["Page {a}", "Pages {a} and {b}", "Pages {a}, {b}", "Pg. {a}", "pp {a}-{c}", "Pages: {a}–{c}", "p. {a}"]
+
+
+def _legacy_extract_pdf_references(text):
+    """The parser references.py replaced, kept verbatim as the baseline"""
+    def _expand_pages(pages_str):
+        s = re.sub(r'\band\b', ',', pages_str, flags=re.IGNORECASE)
+        s = s.replace('–', '-').replace('—', '-')
+        tokens = [t.strip() for t in s.split(',') if t.strip()]
+        out = []
+        for t in tokens:
+            m = _PAGE_TOKEN.fullmatch(t)
+            if not m:
+                continue
+            start = int(m.group(1))
+            end = int(m.group(2)) if m.group(2) else start
+            if end >= start:
+                out.extend(range(start, end + 1))
+        return out
+
+    _PAGE_TOKEN = re.compile(r'(\d+)\s*(?:[-–—]\s*(\d+))?$')
+    result = defaultdict(list)
+    line_pattern = re.compile(
+        r'[\s\-•]*'
+        r'(?P<filename>[\w\s\-()&_]+\.pdf)\s*,?\s*'
+        r'Pages?\s*:?\s*'
+        r'(?P<pages>[\d\s, and]+)',
+        re.IGNORECASE
+    )
+    for m in line_pattern.finditer(text):
+        filename = m.group('filename').strip()
+        pages = _expand_pages(m.group('pages'))
+        if pages:
+            result[filename] = sorted(set(pages))
+    return dict(result)
+
+
+def _pages(rng):
+    a = rng.randint(1, 300)
+    return rng.choice(PAGE_FORMS).format(a=a, b=a + rng.randint(1, 40), c=a + rng.randint(1, 4))
+
+
+def make_answer(rng, inline=False):
+    paragraphs = []
+    for _ in range(rng.randint(2, 5)):
+        words = [rng.choice(PROSE) for _ in range(rng.randint(40, 120))]
+        if inline:
+            pos = rng.randrange(len(words))
+            words.insert(pos, f"({rng.choice(FILENAMES)}, {_pages(rng)})")
+        paragraphs.append("**Note:** " + " ".join(words) + ".")
+    if not inline:
+        refs = [f"- {name}, {_pages(rng)}" for name in rng.sample(FILENAMES, rng.randint(1, 4))]
+        paragraphs.append("References:\n" + "\n".join(refs))
+    return "\n\n".join(paragraphs)
+
+
+def adversarial(kind, size):
+    if kind == "whitespace":
+        return "See " + " " * size + "x"
+    if kind == "pdf_without_pages":
+        return " ".join(f"doc{i}.pdf" for i in range(size // 9))
+    if kind == "long_word":
+        return "a" * size + ".pdf, Page 1"
+    if kind == "huge_page_list":
+        return "big.pdf, Pages " + ", ".join(str(i % 999 + 1) for i in range(size // 5))
+    raise ValueError(kind)
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def _throughput(seconds, n_bytes, n_refs):
+    return {
+        "seconds": round(seconds, 4),
+        "mb_per_s": round(n_bytes / seconds / 1e6, 2) if seconds else None,
+        "refs_per_s": round(n_refs / seconds) if seconds else None,
+    }
+
+
+def _streamed(text):
+    extractor = ReferenceExtractor()
+    for i in range(0, len(text), 4):
+        extractor.feed(text[i:i + 4])
+    extractor.close()
+    return extractor.references
+
+
+def run(n_answers, seed, sizes, legacy_max):
+    rng = random.Random(seed)
+    results = {}
+    for corpus, inline in (("answers", False), ("inline", True)):
+        texts = [make_answer(rng, inline) for _ in range(n_answers)]
+        n_bytes = sum(len(t.encode("utf-8")) for t in texts)
+        engine_s, engine_refs = _timed(lambda: [extract_references(t) for t in texts])
+        legacy_s, legacy_refs = _timed(lambda: [_legacy_extract_pdf_references(t) for t in texts])
+        n_refs = sum(len(r) for r in engine_refs)
+        results[corpus] = {
+            "answers": n_answers,
+            "bytes": n_bytes,
+            "engine": _throughput(engine_s, n_bytes, n_refs),
+            "legacy": _throughput(legacy_s, n_bytes, sum(len(r) for r in legacy_refs)),
+            "references_found": {"engine": n_refs, "legacy": sum(len(r) for r in legacy_refs)},
+        }
+        if not inline:
+            stream_s, _ = _timed(lambda: [_streamed(t) for t in texts])
+            results["streamed"] = {"bytes": n_bytes, "engine": _throughput(stream_s, n_bytes, n_refs)}
+
+    results["adversarial"] = {}
+    for kind in ("whitespace", "pdf_without_pages", "long_word", "huge_page_list"):
+        rows = []
+        for size in sizes:
+            text = adversarial(kind, size)
+            row = {"size": size, "engine_ms": round(_timed(extract_references, text)[0] * 1000, 3)}
+            if size <= legacy_max:
+                row["legacy_ms"] = round(_timed(_legacy_extract_pdf_references, text)[0] * 1000, 3)
+            rows.append(row)
+        results["adversarial"][kind] = rows
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--answers", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--sizes", default="250,500,1000,100000,1000000", help="adversarial input sizes")
+    parser.add_argument(
+        "--legacy-max", type=int, default=1000,
+        help="largest adversarial size run through the legacy parser (its cost is cubic)",
+    )
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    results = run(args.answers, args.seed, sizes, args.legacy_max)
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Micro-benchmark of get_relevant_sources at 10/100/1000 retrieved documents.
+
+Compares the indexed join in utility.get_relevant_sources with the previous
+nested loop (kept here as the baseline). Answers cite 5 files; retrieved
+documents spread over 50 files with some repeated chunks.
+
+    python benchmarks/bench_relevant_sources.py --sizes 10,100,1000 --json out.json
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utility import get_relevant_sources  # noqa: E402
+
+
+def _legacy_get_relevant_sources(result, response):
+    """The nested-loop join get_relevant_sources replaced (without its print)"""
+    relevant_sources = {}
+    for filename in result:
+        cleaned_source_filename = filename.split("/")[-1].strip()
+        cleaned_source_filename = cleaned_source_filename.replace("--\n\n\nReferences:\n- ", "").strip()
+        allowed_pages = result[filename]
+        for doc in response["source_documents"]:
+            cleaned_retrieved_filename = doc["filename"].split("/")[-1].strip()
+            if isinstance(doc["page_number"], list):
+                page_number = int(doc["page_number"][0])
+            else:
+                page_number = int(doc["page_number"])
+            if (
+                    (cleaned_retrieved_filename.lower() == cleaned_source_filename.lower()) and (page_number in allowed_pages)
+            ):
+                if cleaned_retrieved_filename in relevant_sources:
+                    relevant_sources[cleaned_retrieved_filename]["content"].append(doc["content"])
+                    relevant_sources[cleaned_retrieved_filename]["page_number"].append(doc["page_number"])
+                else:
+                    relevant_sources[cleaned_retrieved_filename] = doc
+                    relevant_sources[cleaned_retrieved_filename]["content"] = [doc["content"]]
+                    relevant_sources[cleaned_retrieved_filename]["page_number"] = [doc["page_number"]]
+    return [relevant_sources[file_name] for file_name in relevant_sources]
+
+
+def make_case(n_docs, rng, n_files=50, n_cited=5, duplicate_rate=0.1):
+    files = [f"uploads/Regulation {i:02d}.pdf" for i in range(n_files)]
+    docs = []
+    for i in range(n_docs):
+        if docs and rng.random() < duplicate_rate:
+            docs.append(dict(rng.choice(docs)))
+            continue
+        docs.append({
+            "filename": rng.choice(files),
+            # No list page numbers: the baseline re-reads documents it has already rewritten
+            # into lists and fails on [[n]]
+            "page_number": rng.choice([rng.randint(1, 40), str(rng.randint(1, 40))]),
+            "content": f"chunk {i} " + "text " * 60,
+        })
+    result = {
+        name.split("/")[-1]: sorted(rng.sample(range(1, 41), 8))
+        for name in rng.sample(files, n_cited)
+    }
+    return result, {"source_documents": docs}
+
+
+def _time(fn, cases, repeat):
+    samples = []
+    for _ in range(repeat):
+        inputs = [copy.deepcopy(case) for case in cases]  # the baseline mutates its input
+        start = time.perf_counter()
+        for result, response in inputs:
+            fn(result, response)
+        samples.append((time.perf_counter() - start) / len(cases) * 1e6)
+    return round(statistics.median(samples), 2)
+
+
+def run(sizes, seed, cases, repeat):
+    rng = random.Random(seed)
+    rows = []
+    for n_docs in sizes:
+        batch = [make_case(n_docs, rng) for _ in range(cases)]
+        indexed = _time(get_relevant_sources, batch, repeat)
+        legacy = _time(_legacy_get_relevant_sources, batch, repeat)
+        rows.append({
+            "docs": n_docs,
+            "indexed_us": indexed,
+            "legacy_us": legacy,
+            "speedup": round(legacy / indexed, 2) if indexed else None,
+        })
+    return {"cases_per_size": cases, "repeat": repeat, "results": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,100,1000")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--cases", type=int, default=50, help="random cases per size")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = run([int(s) for s in args.sizes.split(",")], args.seed, args.cases, args.repeat)
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
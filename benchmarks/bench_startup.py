@@ -0,0 +1,203 @@
+"""Worker startup cost: import-time report, boot time, memory and first highlight.
+
+  imports          `python -X importtime -c "import main"`: wall time and the
+                   slowest imports of main and its direct dependencies, lazily
+                   (now) and with PyMuPDF imported eagerly (as utility.py used to)
+  first_highlight  the first get_highlighted_pdf_content call in a fresh
+                   process, cold and after startup.prewarm()
+  gunicorn         STARTUP_MODE=lazy vs preload: time until /health answers,
+                   per-worker boot time (from the "booted in" log line), boot
+                   of a replacement worker, and RSS/PSS of the process tree
+
+    python benchmarks/bench_startup.py --workers 4 --json out.json
+"""
+import argparse
+import json
+import os
+import random
+import re
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from load_test import _free_port, _process_tree, _stop, _wait_for, rss_mb  # noqa: E402
+from stub_backend import Corpus, make_chat_response  # noqa: E402
+
+_ENV = dict(os.environ, BACKEND_BASE_URL="http://127.0.0.1:9")
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+_BOOTED = re.compile(r"Worker (\d+) booted in ([\d.]+) ms")
+
+_FIRST_HIGHLIGHT = """
+import json, sys, time
+start = time.perf_counter()
+import utility
+import_ms = (time.perf_counter() - start) * 1000
+if sys.argv[2] == "prewarmed":
+    import startup
+    startup.prewarm()
+case = json.load(open(sys.argv[1]))
+pdf = open(case["pdf"], "rb").read()
+
+class Pipeline:
+    def get_pdf_content_from_blob(self, blob_name):
+        return pdf
+
+    @staticmethod
+    def chunk_text(text):
+        return [c for c in text.split("\\n\\n") if c.strip()]
+
+start = time.perf_counter()
+_, found = utility.get_highlighted_pdf_content(Pipeline(), case["source"])
+first_ms = (time.perf_counter() - start) * 1000
+start = time.perf_counter()
+utility.get_highlighted_pdf_content(Pipeline(), case["source"])
+second_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({"import_utility_ms": import_ms, "first_ms": first_ms, "second_ms": second_ms, "found": found}))
+"""
+
+
+def _python(code, *args):
+    return subprocess.run(
+        [sys.executable, *code, *args], cwd=ROOT, env=_ENV, capture_output=True, text=True, check=True
+    )
+
+
+def _last_json(completed):
+    # utility prints its own progress lines; the result is the last one
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def import_report(runs, top):
+    modes = {"lazy": "import main", "eager_fitz": "import fitz; import main"}
+    results = {}
+    for mode, statement in modes.items():
+        walls = []
+        for _ in range(runs):
+            out = _python(["-c", f"import time; s = time.perf_counter(); {statement}; print(time.perf_counter() - s)"])
+            walls.append(float(out.stdout.strip().splitlines()[-1]))
+        report = _python(["-X", "importtime", "-c", statement]).stderr
+        top_level = []
+        for line in report.splitlines():
+            m = _IMPORT_LINE.match(line)
+            # Indent grows by two per level: the statement's own imports and theirs
+            if m and len(m.group(3)) <= 3:
+                top_level.append((int(m.group(2)), m.group(4)))
+        top_level.sort(reverse=True)
+        results[mode] = {
+            "wall_ms": round(statistics.median(walls) * 1000, 1),
+            "loads_fitz": " fitz" in report or " pymupdf" in report,
+            "loads_sklearn": " sklearn" in report,
+            "slowest": [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, name in top_level[:top]],
+        }
+    return results
+
+
+def first_highlight(pages, seed, runs):
+    corpus = Corpus(pages, seed)
+    response = make_chat_response(corpus, random.Random(seed))
+    doc = response["source_documents"][0]
+    name = doc["filename"].split("/")[-1]
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "doc.pdf")
+        with open(pdf_path, "wb") as fh:
+            fh.write(corpus.get(name)[0])
+        case_path = os.path.join(tmp, "case.json")
+        source = {"filename": name, "page_number": [doc["page_number"]], "content": [doc["content"]]}
+        with open(case_path, "w") as fh:
+            json.dump({"pdf": pdf_path, "source": source}, fh)
+        results = {}
+        for mode in ("cold", "prewarmed"):
+            rows = [_last_json(_python(["-c", _FIRST_HIGHLIGHT], case_path, mode)) for _ in range(runs)]
+            results[mode] = {
+                key: round(statistics.median(r[key] for r in rows), 1)
+                for key in ("import_utility_ms", "first_ms", "second_ms")
+            }
+            results[mode]["found"] = all(r["found"] for r in rows)
+    return {"pages": pages, **results}
+
+
+def pss_mb(pid):
+    total = 0
+    for p in _process_tree(pid):
+        try:
+            with open(f"/proc/{p}/smaps_rollup") as fh:
+                for line in fh:
+                    if line.startswith("Pss:"):
+                        total += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return round(total / 1024, 1)
+
+
+def _wait_for_boots(log_path, count, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with open(log_path) as fh:
+            boots = _BOOTED.findall(fh.read())
+        if len(boots) >= count:
+            return [(int(pid), float(ms)) for pid, ms in boots]
+        time.sleep(0.1)
+    raise RuntimeError(f"only {len(boots)} of {count} workers booted")
+
+
+def gunicorn_boot(mode, workers):
+    port = _free_port()
+    env = dict(_ENV, STARTUP_MODE=mode, GUNICORN_WORKERS=str(workers), GUNICORN_BIND=f"127.0.0.1:{port}")
+    with tempfile.NamedTemporaryFile("w+", suffix=".log") as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "--log-level", "info", "main:app"],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=log, start_new_session=True,
+        )
+        try:
+            _wait_for(f"http://127.0.0.1:{port}/health")
+            ready_ms = (time.perf_counter() - start) * 1000
+            boots = _wait_for_boots(log.name, workers)
+            all_ready_ms = (time.perf_counter() - start) * 1000
+            time.sleep(1)
+            memory = {"rss_mb": rss_mb(proc.pid), "pss_mb": pss_mb(proc.pid)}
+            # A replacement worker after a crash
+            os.kill(boots[0][0], signal.SIGKILL)
+            respawn_ms = _wait_for_boots(log.name, workers + 1)[-1][1]
+        finally:
+            _stop(proc)
+    return {
+        "workers": workers,
+        "first_health_ms": round(ready_ms, 1),
+        "all_workers_ms": round(all_ready_ms, 1),
+        "worker_boot_ms": round(statistics.median(ms for _, ms in boots), 1),
+        "respawn_boot_ms": respawn_ms,
+        **memory,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=300, help="pages of the highlighted PDF")
+    parser.add_argument("--runs", type=int, default=3, help="fresh processes per measurement")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = {
+        "imports": import_report(args.runs, args.top),
+        "first_highlight": first_highlight(args.pages, args.seed, args.runs),
+        "gunicorn": {mode: gunicorn_boot(mode, args.workers) for mode in ("lazy", "preload")},
+    }
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
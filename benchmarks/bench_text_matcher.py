@@ -0,0 +1,148 @@
+"""Hit rate and latency of page.search_for vs. text_matcher on synthetic PDFs.
+
+Pages are laid out line by line with words hyphenated across line breaks and
+irregular spacing; queries are the clean paragraph text, some with ligatures.
+
+    python benchmarks/bench_text_matcher.py --pages 200 --json out.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz  # noqa: E402
+
+from text_matcher import PageWords, match_rects  # noqa: E402
+
+WORDS = (
+    "the licence holder shall ensure that every transmission tower complies with spectrum "
+    "allocation rules infrastructure sharing obligations specified under the telecommunication "
+    "regulations and notifications issued from time to time by the authority including "
+    "quality of service benchmarks interconnection usage charges and significant financial "
+    "penalties for configuration deficiencies"
+).split()
+LIGATURES = {"fi": "ﬁ", "fl": "ﬂ", "ff": "ﬀ"}
+
+
+def make_paragraph(rng, n_words):
+    return " ".join(rng.choice(WORDS) for _ in range(n_words))
+
+
+def layout_lines(text, width, rng):
+    """Greedy line wrap that hyphenates long words at the line end"""
+    lines, line = [], ""
+    for word in text.split():
+        candidate = f"{line} {word}".strip()
+        if len(candidate) <= width:
+            line = candidate
+            continue
+        if len(word) > 6 and rng.random() < 0.7:
+            room = width - len(line) - 2
+            cut = max(3, min(room, len(word) - 3))
+            lines.append(f"{line} {word[:cut]}-".strip())
+            line = word[cut:]
+        else:
+            lines.append(line)
+            line = word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def build_pdf(n_pages, seed):
+    rng = random.Random(seed)
+    doc = fitz.open()
+    targets = []
+    for _ in range(n_pages):
+        page = doc.new_page()
+        y = 60
+        paragraphs = [make_paragraph(rng, rng.randint(25, 45)) for _ in range(5)]
+        target = rng.randrange(len(paragraphs))
+        for p_idx, para in enumerate(paragraphs):
+            top = y
+            for line in layout_lines(para, 80, rng):
+                # irregular spacing between words
+                spaced = line.replace(" ", "  ") if rng.random() < 0.2 else line
+                page.insert_text((60, y), spaced, fontsize=9)
+                y += 12
+            if p_idx == target:
+                targets.append((para, fitz.Rect(50, top - 12, 560, y)))
+            y += 10
+    return doc, targets
+
+
+def perturb_query(text, rng):
+    if rng.random() < 0.5:
+        for plain, lig in LIGATURES.items():
+            text = text.replace(plain, lig)
+    return text
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def run(n_pages, seed):
+    rng = random.Random(seed + 1)
+    doc, targets = build_pdf(n_pages, seed)
+    search_hits = matcher_hits = 0
+    search_ms, words_ms, match_ms = [], [], []
+    for page_no, (para, target_rect) in enumerate(targets):
+        page = doc[page_no]
+        query = perturb_query(para, rng)
+
+        start = time.perf_counter()
+        found = page.search_for(query)
+        search_ms.append((time.perf_counter() - start) * 1000)
+        search_hits += bool(found)
+
+        start = time.perf_counter()
+        page_words = PageWords.from_page(page)
+        words_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        rects = match_rects(page_words, query)
+        match_ms.append((time.perf_counter() - start) * 1000)
+        if rects and all(fitz.Rect(r).intersects(target_rect) for r in rects):
+            matcher_hits += 1
+
+    return {
+        "pages": n_pages,
+        "search_for": {
+            "hit_rate": round(search_hits / n_pages, 4),
+            "p50_ms": round(statistics.median(search_ms), 3),
+            "p95_ms": round(percentile(search_ms, 95), 3),
+        },
+        "text_matcher": {
+            "hit_rate": round(matcher_hits / n_pages, 4),
+            "words_p50_ms": round(statistics.median(words_ms), 3),
+            "match_p50_ms": round(statistics.median(match_ms), 3),
+            "match_p95_ms": round(percentile(match_ms, 95), 3),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = run(args.pages, args.seed)
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
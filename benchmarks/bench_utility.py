@@ -0,0 +1,141 @@
+"""Micro-benchmarks of the utility.py functions on the request path.
+
+Uses the stub backend's corpus, so answers, retrieved chunks and PDFs look like
+what the frontend handles in production:
+
+  extract_pdf_references       reference lists of generated /chat answers
+  get_relevant_sources         those references joined with 10/100/1000 chunks
+  get_highlighted_pdf_content  highlighting a cited source on an N page PDF,
+                               cold (no page index yet) and warm
+
+Results go to --json so runs can be compared between commits.
+
+    python benchmarks/bench_utility.py --pages 300 --json out.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pdf_index  # noqa: E402
+from stub_backend import Corpus, make_chat_response  # noqa: E402
+from utility import extract_pdf_references, get_highlighted_pdf_content, get_relevant_sources  # noqa: E402
+
+
+class StubPipeline:
+    """The two rag_pipeline methods get_highlighted_pdf_content uses"""
+
+    def __init__(self, corpus):
+        self.corpus = corpus
+
+    def get_pdf_content_from_blob(self, blob_name):
+        return self.corpus.get(blob_name.split("/")[-1])[0]
+
+    @staticmethod
+    def chunk_text(text):
+        return [chunk for chunk in text.split("\n\n") if chunk.strip()]
+
+
+def _median_us(fn, inputs, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for args in inputs:
+            fn(*args)
+        samples.append((time.perf_counter() - start) / len(inputs) * 1e6)
+    return round(statistics.median(samples), 2)
+
+
+def bench_references(corpus, rng, answers, repeat):
+    responses = [make_chat_response(corpus, rng) for _ in range(answers)]
+    return {
+        "answers": answers,
+        "answer_us": _median_us(extract_pdf_references, [(r["answer"],) for r in responses], repeat),
+        "reference_list_us": _median_us(extract_pdf_references, [(r["references"],) for r in responses], repeat),
+    }
+
+
+def bench_relevant_sources(corpus, rng, sizes, cases, repeat):
+    rows = []
+    for n_docs in sizes:
+        inputs = []
+        for _ in range(cases):
+            response = make_chat_response(corpus, rng, n_documents=n_docs)
+            inputs.append((extract_pdf_references(response["references"]), response))
+        rows.append({"docs": n_docs, "us": _median_us(get_relevant_sources, inputs, repeat)})
+    return rows
+
+
+def bench_highlight(corpus, rng, sources, repeat):
+    pipeline = StubPipeline(corpus)
+    response = make_chat_response(corpus, rng, n_documents=10)
+    mapped = get_relevant_sources(extract_pdf_references(response["references"]), response)[:sources]
+    cold, warm, found = [], [], 0
+    for source in mapped:
+        for attempt in range(repeat + 1):
+            if attempt == 0:
+                pdf_index._indexes.clear()
+            start = time.perf_counter()
+            _, ok = get_highlighted_pdf_content(pipeline, source)
+            elapsed = (time.perf_counter() - start) * 1000
+            if attempt == 0:
+                cold.append(elapsed)
+                found += bool(ok)
+            else:
+                warm.append(elapsed)
+    return {
+        "pages": corpus.pages,
+        "sources": len(mapped),
+        "found": found,
+        "cold_ms": round(statistics.median(cold), 2),
+        "warm_ms": round(statistics.median(warm), 2),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    corpus = Corpus(args.pages, args.seed)
+    rng = random.Random(args.seed)
+    return {
+        "commit": _git_commit(),
+        "extract_pdf_references": bench_references(corpus, rng, args.answers, args.repeat),
+        "get_relevant_sources": bench_relevant_sources(corpus, rng, args.sizes, args.cases, args.repeat),
+        "get_highlighted_pdf_content": bench_highlight(corpus, rng, args.sources, args.repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=300, help="pages per synthetic PDF")
+    parser.add_argument("--answers", type=int, default=500)
+    parser.add_argument("--sizes", default="10,100,1000", help="retrieved chunks per answer")
+    parser.add_argument("--cases", type=int, default=50, help="answers per size")
+    parser.add_argument("--sources", type=int, default=3, help="cited sources to highlight")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    args.sizes = [int(s) for s in args.sizes.split(",")]
+
+    results = run(args)
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
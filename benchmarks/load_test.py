@@ -0,0 +1,359 @@
+"""Load test of the real app under gunicorn against the local stub backend.
+
+Starts benchmarks/stub_backend.py and `gunicorn main:app` (with gunicorn.conf.py,
+so SERVING_MODE and GUNICORN_* apply), logs every client in, then drives each
+route at each concurrency for --duration seconds. Per route and concurrency it
+reports throughput, p50/p95/p99 latency, errors and the RSS of the gunicorn
+master and workers (peak while the route ran).
+
+With --background, other clients keep other routes busy the whole time (mixed
+load), e.g. to check that slow uploads and renders leave /chat latency alone;
+their outcomes, including admission rejections, are reported separately.
+
+    python benchmarks/load_test.py --concurrency 1,8,32 --duration 10 --json out.json
+    SERVING_MODE=async python benchmarks/load_test.py --workers 2 --routes chat,view_pdf
+    python benchmarks/load_test.py --routes chat --concurrency 4 --upload-latency 5 \
+        --background upload_pdf:16,view_highlights:16
+"""
+import argparse
+import collections
+import itertools
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from stub_backend import FILENAMES  # noqa: E402
+
+ROUTES = (
+    "health", "check_auth", "user_sessions", "chat_history", "bootstrap",
+    "chat", "chat_stream", "view_pdf", "view_highlights", "upload_pdf",
+)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def _process_tree(pid):
+    """pid and its descendants, from /proc"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as fh:
+                ppid = int(fh.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+
+def rss_mb(pid):
+    total = 0
+    for p in _process_tree(pid):
+        try:
+            with open(f"/proc/{p}/status") as fh:
+                for line in fh:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return round(total / 1024, 1)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+_client_ids = itertools.count()
+
+
+class Client:
+    """One logged-in browser: a session cookie plus sources from a first answer"""
+
+    def __init__(self, base_url, upload_pdf):
+        self.base_url = base_url
+        self.http = requests.Session()
+        self.upload_pdf = upload_pdf
+        # One user per client, so per-user admission caps see distinct users
+        email = f"bench-{next(_client_ids)}@example.com"
+        resp = self.http.post(f"{base_url}/login", json={"email": email, "password": "x"})
+        resp.raise_for_status()
+        self.sources = []
+
+    def load_sources(self, rng):
+        for _ in range(3):
+            resp = self.http.post(f"{self.base_url}/chat", json={"question": "What are the penalties?"})
+            self.sources.extend(resp.json().get("source_documents", []))
+        if not self.sources:
+            raise RuntimeError("/chat returned no mapped sources; check the stub backend")
+        rng.shuffle(self.sources)
+
+    def call(self, route, rng):
+        url = self.base_url
+        http = self.http
+        if route == "health":
+            return http.get(f"{url}/health")
+        if route in ("check_auth", "user_sessions", "chat_history"):
+            return http.get(f"{url}/{route}")
+        if route == "bootstrap":
+            return http.get(f"{url}/bootstrap?include=chat_history")
+        if route == "chat":
+            return http.post(f"{url}/chat", json={"question": "What are the penalties?"})
+        if route == "chat_stream":
+            resp = http.post(f"{url}/chat/stream", json={"question": "What are the penalties?"}, stream=True)
+            for _ in resp.iter_content(chunk_size=None):
+                pass
+            return resp
+        if route == "view_pdf":
+            return http.get(f"{url}/view_pdf/{rng.choice(FILENAMES)}")
+        if route == "view_highlights":
+            source = dict(rng.choice(self.sources), cited_pages_only=True, context_pages=1)
+            return http.post(f"{url}/view_highlights", json=source)
+        if route == "upload_pdf":
+            files = {"pdfs": ("bench.pdf", self.upload_pdf, "application/pdf")}
+            return http.post(f"{url}/upload_pdf", files=files)
+        raise ValueError(route)
+
+
+def run_route(clients, route, duration, server_pid, seed):
+    """Each client loops on route for duration seconds; returns the summary row"""
+    latencies, errors, lock = [], [0], threading.Lock()
+    peak_rss = [rss_mb(server_pid)]
+    stop = time.monotonic() + duration
+    running = threading.Event()
+    running.set()
+
+    def sample_rss():
+        while running.is_set():
+            peak_rss[0] = max(peak_rss[0], rss_mb(server_pid))
+            time.sleep(0.25)
+
+    def worker(client, idx):
+        rng = random.Random(f"{seed}:{route}:{idx}")
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            try:
+                ok = client.call(route, rng).status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += not ok
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    threads = [threading.Thread(target=worker, args=(c, i)) for i, c in enumerate(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+    running.clear()
+    sampler.join()
+    return {
+        "route": route,
+        "concurrency": len(clients),
+        "requests": len(latencies),
+        "errors": errors[0],
+        "throughput_rps": round(len(latencies) / wall, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "peak_rss_mb": peak_rss[0],
+    }
+
+
+class Background:
+    """Clients looping on other routes while the measured route runs"""
+
+    def __init__(self, clients_by_route, seed):
+        self.clients_by_route = clients_by_route
+        self.seed = seed
+        self.outcomes = {route: collections.Counter() for route in clients_by_route}
+        self._lock = threading.Lock()
+        self._running = threading.Event()
+        self._threads = []
+
+    def _loop(self, client, route, idx):
+        rng = random.Random(f"{self.seed}:background:{route}:{idx}")
+        while self._running.is_set():
+            retry_after = 0
+            try:
+                resp = client.call(route, rng)
+                outcome = "ok" if resp.status_code < 400 else "rejected" if resp.status_code in (429, 503) else "error"
+                if outcome == "rejected":
+                    retry_after = float(resp.headers.get("Retry-After", 1))
+            except requests.RequestException:
+                outcome = "error"
+            with self._lock:
+                self.outcomes[route][outcome] += 1
+            # Back off like a well-behaved client instead of hammering the server
+            if retry_after:
+                time.sleep(min(retry_after, 1.0) * rng.random())
+
+    def __enter__(self):
+        self._running.set()
+        for route, clients in self.clients_by_route.items():
+            for idx, client in enumerate(clients):
+                thread = threading.Thread(target=self._loop, args=(client, route, idx), daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    def __exit__(self, *exc):
+        self._running.clear()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def summary(self):
+        with self._lock:
+            return {route: dict(counts) for route, counts in self.outcomes.items()}
+
+
+def _start(cmd, env):
+    return subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, start_new_session=True)
+
+
+def _stop(proc):
+    if proc.poll() is None:
+        os.killpg(proc.pid, signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    stub_port, app_port = _free_port(), _free_port()
+    stub_url, app_url = f"http://127.0.0.1:{stub_port}", f"http://127.0.0.1:{app_port}"
+    env = dict(os.environ, BACKEND_BASE_URL=stub_url, GUNICORN_BIND=f"127.0.0.1:{app_port}")
+    if args.workers:
+        env["GUNICORN_WORKERS"] = str(args.workers)
+    stub = _start([
+        sys.executable, os.path.join(ROOT, "benchmarks", "stub_backend.py"), "--port", str(stub_port),
+        "--chat-latency", str(args.chat_latency), "--token-delay", str(args.token_delay),
+        "--highlight-latency", str(args.highlight_latency), "--upload-latency", str(args.upload_latency),
+        "--pages", str(args.pages),
+    ], env)
+    server = None
+    try:
+        _wait_for(f"{stub_url}/health")
+        server = _start([sys.executable, "-m", "gunicorn", "main:app"], env)
+        _wait_for(f"{app_url}/health")
+        idle_rss = rss_mb(server.pid)
+        upload_pdf = requests.get(f"{stub_url}/view_pdf/{FILENAMES[0]}").content
+        rng = random.Random(args.seed)
+        clients = [Client(app_url, upload_pdf) for _ in range(max(args.concurrency))]
+        if "view_highlights" in args.routes:
+            for client in clients:
+                client.load_sources(rng)
+        background_clients = {}
+        for route, count in args.background:
+            background_clients[route] = [Client(app_url, upload_pdf) for _ in range(count)]
+            if route == "view_highlights":
+                for client in background_clients[route]:
+                    client.load_sources(rng)
+        results = []
+        for route in args.routes:
+            for concurrency in args.concurrency:
+                with Background(background_clients, args.seed) as background:
+                    row = run_route(clients[:concurrency], route, args.duration, server.pid, args.seed)
+                if background_clients:
+                    row["background"] = background.summary()
+                print(json.dumps(row), file=sys.stderr)
+                results.append(row)
+        return {
+            "commit": _git_commit(),
+            "serving_mode": env.get("SERVING_MODE", "sync"),
+            "workers": env.get("GUNICORN_WORKERS"),
+            "duration_s": args.duration,
+            "stub": {"chat_latency": args.chat_latency, "token_delay": args.token_delay,
+                     "highlight_latency": args.highlight_latency, "upload_latency": args.upload_latency,
+                     "pages": args.pages},
+            "background": dict(args.background),
+            "idle_rss_mb": idle_rss,
+            "results": results,
+        }
+    finally:
+        if server is not None:
+            _stop(server)
+        _stop(stub)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--routes", default=",".join(ROUTES), help=f"comma separated, from {', '.join(ROUTES)}")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma separated client counts")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per route and concurrency")
+    parser.add_argument("--workers", type=int, help="GUNICORN_WORKERS (default from gunicorn.conf.py)")
+    parser.add_argument("--chat-latency", type=float, default=0.5)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--highlight-latency", type=float, default=0.1)
+    parser.add_argument("--upload-latency", type=float, default=0.0)
+    parser.add_argument("--background", default="", help="route:clients,... kept busy during every run")
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    args.routes = [r for r in args.routes.split(",") if r]
+    args.background = [(r, int(n)) for r, _, n in (item.partition(":") for item in args.background.split(",") if item)]
+    unknown = (set(args.routes) | {r for r, _ in args.background}) - set(ROUTES)
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(sorted(unknown))}")
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+
+    results = run(args)
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""Local stand-in for BACKEND_BASE_URL, for load tests and profiling.
+
+Implements the backend routes the frontend calls:
+
+  POST /auth/login       any credentials, returns a fixed token
+  POST /chat             answer with a reference list after --chat-latency seconds
+  POST /chat/stream      the same answer as SSE tokens, --token-delay apart
+  GET  /user_sessions    a fixed session list
+  GET  /chat_history     a fixed history
+  GET  /view_pdf/<name>  a synthetic --pages page PDF (ETag, If-None-Match, Range)
+  POST /view_highlights  the cited file's PDF after --highlight-latency seconds
+  POST /upload_pdf       drains the body and acknowledges it after --upload-latency seconds
+
+Cited filenames, pages and chunk contents match the served PDFs, so the
+frontend's reference mapping and highlighting do real work.
+
+    python benchmarks/stub_backend.py --port 8100 --chat-latency 0.5 --pages 300
+"""
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+FILENAMES = [
+    "Telecom Licensing Guidelines 2021.pdf",
+    "Spectrum Policy v2.pdf",
+    "Infrastructure Sharing Rules.pdf",
+    "QoS Regulations Amendment 3.pdf",
+    "Unified License Agreement.pdf",
+]
+WORDS = (
+    "the licence holder shall ensure that every transmission tower complies with spectrum "
+    "allocation rules infrastructure sharing obligations specified under the telecommunication "
+    "regulations and notifications issued from time to time by the authority including "
+    "quality of service benchmarks interconnection usage charges and financial penalties"
+).split()
+PARAGRAPHS_PER_PAGE = 4
+
+
+class Corpus:
+    """Synthetic PDFs and the paragraph text on each page, built lazily per file"""
+
+    def __init__(self, pages=300, seed=7):
+        self.pages = pages
+        self.seed = seed
+        self._docs = {}  # filename -> (pdf bytes, etag, [[paragraph, ...] per page])
+        self._lock = threading.Lock()
+
+    def get(self, filename):
+        entry = self._docs.get(filename)
+        if entry is None:
+            with self._lock:
+                entry = self._docs.get(filename)
+                if entry is None:
+                    entry = self._docs[filename] = self._build(filename)
+        return entry
+
+    def _build(self, filename):
+        import fitz
+
+        rng = random.Random(f"{self.seed}:{filename}")
+        doc = fitz.open()
+        page_texts = []
+        for _ in range(self.pages):
+            page = doc.new_page()
+            paragraphs = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(25, 40)))
+                          for _ in range(PARAGRAPHS_PER_PAGE)]
+            rect = fitz.Rect(60, 60, page.rect.width - 60, page.rect.height - 60)
+            page.insert_textbox(rect, "\n\n".join(paragraphs), fontsize=10)
+            page_texts.append(paragraphs)
+        data = doc.tobytes(garbage=3, deflate=True)
+        doc.close()
+        return data, hashlib.sha1(data).hexdigest()[:16], page_texts
+
+    def paragraph(self, filename, page_number, idx=0):
+        return self.get(filename)[2][page_number - 1][idx % PARAGRAPHS_PER_PAGE]
+
+
+def make_chat_response(corpus, rng, n_cited=3, n_documents=10):
+    """A /chat payload: answer, reference list and retrieved chunks (some cited)"""
+    cited = {name: sorted(rng.sample(range(1, corpus.pages + 1), 2)) for name in rng.sample(FILENAMES, n_cited)}
+    prose = " ".join(rng.choice(WORDS) for _ in range(120))
+    refs = "\n".join(f"- {name}, Pages {pages[0]} and {pages[1]}" for name, pages in cited.items())
+    answer = f"**Summary:** {prose}.\n\nReferences:\n{refs}"
+    documents = []
+    for name, pages in cited.items():
+        for page in pages:
+            documents.append({
+                "filename": f"uploads/{name}",
+                "page_number": page,
+                "content": corpus.paragraph(name, page, rng.randrange(PARAGRAPHS_PER_PAGE)),
+            })
+    while len(documents) < n_documents:
+        name = rng.choice(FILENAMES)
+        page = rng.randint(1, corpus.pages)
+        documents.append({"filename": f"uploads/{name}", "page_number": page, "content": corpus.paragraph(name, page)})
+    rng.shuffle(documents)
+    return {
+        "answer": answer,
+        "references": refs,
+        "source_documents": documents,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "StubBackend/1.0"
+    # Set on the subclass made by make_server
+    config = None
+    corpus = None
+
+    def log_message(self, format, *args):
+        if self.config.verbose:
+            super().log_message(format, *args)
+
+    def _read_body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            size = 0
+            while True:
+                length = int(self.rfile.readline().split(b";")[0], 16)
+                if length == 0:
+                    self.rfile.readline()
+                    return size, b""
+                self.rfile.read(length)
+                self.rfile.readline()
+                size += length
+        length = int(self.headers.get("Content-Length") or 0)
+        return length, self.rfile.read(length)
+
+    def _json_body(self):
+        _, body = self._read_body()
+        try:
+            return json.loads(body or b"{}")
+        except ValueError:
+            return {}
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_pdf(self, filename, headers=None):
+        data, etag, _ = self.corpus.get(filename)
+        etag = f'"{etag}"'
+        headers = dict(headers or {}, ETag=etag)
+        headers["Accept-Ranges"] = "bytes"
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        range_header = self.headers.get("Range", "")
+        if range_header.startswith("bytes=") and "," not in range_header:
+            start, _, end = range_header[6:].partition("-")
+            start = int(start or 0)
+            end = min(int(end) if end else len(data) - 1, len(data) - 1)
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            return self._send(206, data[start:end + 1], "application/pdf", headers)
+        self._send(200, data, "application/pdf", headers)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/user_sessions":
+            sessions = [{"session_id": f"s{i}", "title": f"Session {i}", "updated_at": "2024-01-01T00:00:00"}
+                        for i in range(20)]
+            return self._send(200, {"sessions": sessions})
+        if path == "/chat_history":
+            history = [{"question": f"Question {i}?", "answer": " ".join(WORDS[:40]), "session_id": f"s{i % 20}"}
+                       for i in range(50)]
+            return self._send(200, {"history": history})
+        if path.startswith("/view_pdf/"):
+            filename = unquote(path[len("/view_pdf/"):])
+            if filename not in FILENAMES:
+                return self._send(404, {"error": "Blob not found"})
+            return self._send_pdf(filename)
+        if path == "/health":
+            return self._send(200, {"status": "healthy"})
+        self._send(404, {"error": "Not found"})
+
+    do_HEAD = do_GET
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        if path == "/auth/login":
+            self._json_body()
+            return self._send(200, {"access_token": "stub-token", "token_type": "bearer"})
+        if path == "/chat":
+            self._json_body()
+            time.sleep(self.config.chat_latency)
+            return self._send(200, make_chat_response(self.corpus, random.Random()))
+        if path == "/chat/stream":
+            self._json_body()
+            return self._stream_chat()
+        if path == "/view_highlights":
+            source = self._json_body()
+            filename = source.get("filename", "").split("/")[-1]
+            if filename not in FILENAMES:
+                return self._send(404, {"error": "Blob not found"})
+            time.sleep(self.config.highlight_latency)
+            page = source.get("page_number")
+            page = page[0] if isinstance(page, list) and page else page
+            return self._send_pdf(filename, {"X-Page-Number": str(page or 1)})
+        if path == "/upload_pdf":
+            size, _ = self._read_body()
+            time.sleep(self.config.upload_latency)
+            return self._send(200, {"success": True, "bytes": size})
+        self._read_body()
+        self._send(404, {"error": "Not found"})
+
+    def _stream_chat(self):
+        time.sleep(self.config.chat_latency / 2)  # time to first token
+        response = make_chat_response(self.corpus, random.Random())
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        answer = response["answer"]
+        step = max(1, len(answer) // 40)
+        for i in range(0, len(answer), step):
+            self._write_chunk(f"data: {json.dumps({'token': answer[i:i + step]})}\n\n".encode("utf-8"))
+            time.sleep(self.config.token_delay)
+        final = {key: response[key] for key in ("references", "source_documents", "timestamp")}
+        self._write_chunk(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        self._write_chunk(b"")
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients closing pooled keep-alive connections are expected under load
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+def make_server(host="127.0.0.1", port=8100, chat_latency=0.5, token_delay=0.02, highlight_latency=0.1,
+                pages=300, seed=7, verbose=False, upload_latency=0.0):
+    config = argparse.Namespace(
+        chat_latency=chat_latency, token_delay=token_delay, highlight_latency=highlight_latency,
+        upload_latency=upload_latency, verbose=verbose,
+    )
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config, "corpus": Corpus(pages, seed)})
+    return StubServer((host, port), handler)
+
+
+def start_in_thread(**kwargs):
+    """Start a stub server on a background thread; returns (server, base_url)"""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, name="stub-backend", daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--chat-latency", type=float, default=0.5, help="seconds before a /chat answer")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between streamed tokens")
+    parser.add_argument("--highlight-latency", type=float, default=0.1, help="seconds before /view_highlights")
+    parser.add_argument("--upload-latency", type=float, default=0.0, help="seconds before /upload_pdf answers")
+    parser.add_argument("--pages", type=int, default=300, help="pages per synthetic PDF")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.chat_latency, args.token_delay, args.highlight_latency,
+                         args.pages, args.seed, args.verbose, args.upload_latency)
+    print(f"Stub backend on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
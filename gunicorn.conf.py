@@ -0,0 +1,87 @@
+# Gunicorn settings, picked up automatically when gunicorn is started from this
+# directory (e.g. `gunicorn main:app`).
+#
+# SERVING_MODE selects how each worker handles concurrent requests:
+#   sync     - one request per worker process (gunicorn default)
+#   threaded - GUNICORN_THREADS requests per worker on OS threads
+#   async    - gevent workers; up to GUNICORN_WORKER_CONNECTIONS in-flight
+#              requests per worker, since proxy routes only wait on I/O
+import multiprocessing
+import os
+import tempfile
+import time
+
+SERVING_MODE = os.environ.get("SERVING_MODE", "sync").lower()
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:" + os.environ.get("PORT", "8000"))
+workers = int(os.environ.get("GUNICORN_WORKERS", str(min(multiprocessing.cpu_count() * 2 + 1, 8))))
+# /chat may wait 120s and /upload_pdf 300s on the backend
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "600"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "5"))
+
+if SERVING_MODE == "async":
+    worker_class = "gevent"
+    worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", "1000"))
+    # Let every in-flight request hold a pooled backend connection
+    os.environ.setdefault("BACKEND_POOL_MAXSIZE", str(worker_connections))
+elif SERVING_MODE == "threaded":
+    worker_class = "gthread"
+    threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+    os.environ.setdefault("BACKEND_POOL_MAXSIZE", str(threads))
+else:
+    worker_class = "sync"
+
+# The response cache invalidates a user's entries through a per-user counter; with
+# several workers it must be shared, or only the worker that saw the change clears them
+if workers > 1:
+    os.environ.setdefault("CACHE_BACKEND", "sqlite")
+
+# Admission control (admission.py): route class limits are shares of what the instance
+# can serve at once, enforced across workers through counters shared in one directory
+if SERVING_MODE == "async":
+    _capacity = workers * worker_connections
+elif SERVING_MODE == "threaded":
+    _capacity = workers * threads
+else:
+    _capacity = workers
+    # A queued request would hold a sync worker while it waits; reject at once instead
+    # (except reference clicks, whose class keeps a short queue; see admission.py)
+    os.environ.setdefault("ADMISSION_QUEUE_FACTOR", "0")
+os.environ.setdefault("ADMISSION_CAPACITY", str(_capacity))
+# /batch and /bootstrap run their parts on a pool per worker, sized so every request the
+# worker serves at once can run a full batch
+os.environ.setdefault(
+    "BATCH_CONCURRENCY", str(_capacity // workers * int(os.environ.get("BATCH_MAX_PARTS", "8")))
+)
+os.environ.setdefault(
+    "ADMISSION_LOCK_DIR",
+    os.path.join(tempfile.gettempdir(), "dot-rag-frontend-admission-" + bind.replace(":", "_").replace("/", "_")),
+)
+
+# STARTUP_MODE=preload imports the app once in the master and pre-warms PyMuPDF and
+# scikit-learn there (see startup.py), so workers fork with them already loaded.
+# The default (lazy) imports the app in each worker and the PDF stack on first use.
+STARTUP_MODE = os.environ.get("STARTUP_MODE", "lazy").lower()
+# gevent patches the stdlib per worker, after fork; a preloaded app would hold unpatched locks
+preload_app = STARTUP_MODE == "preload" and SERVING_MODE != "async"
+
+
+def when_ready(server):
+    if preload_app:
+        import startup
+
+        startup.prewarm()
+        server.log.info("Pre-warmed PDF/ML stack in %s ms", startup.stats()["prewarm_ms"])
+
+
+def pre_fork(server, worker):
+    worker.boot_started = time.monotonic()
+
+
+def post_worker_init(worker):
+    import startup
+
+    seconds = time.monotonic() - worker.boot_started
+    startup.record_boot(seconds)
+    worker.log.info("Worker %s booted in %.1f ms (%s)", worker.pid, seconds * 1000, STARTUP_MODE)
@@ -3,12 +3,25 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import os
-import asyncio
+import functools
+import json
+import threading
+import time
 import traceback
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, session, send_file, Response
-import requests
+from flask import Flask, request, jsonify, session, send_file, Response, url_for
+
+import admission
+import assets
+import metrics
+import startup
+from async_runtime import run_coroutine
+from backend_client import backend_get, backend_post, get_pool_stats
+from pdf_cache import BLOB_CACHE_TTL, blob_cache_key, highlight_cache, highlight_cache_key, send_cached_pdf
+from response_cache import MemoryCacheBackend, cached_view, invalidate_user, response_cache
+from upload_stream import MultipartStream
 
 from utility import (
     authenticate_user,
@@ -16,7 +29,14 @@ from utility import (
     extract_pdf_references,
     get_relevant_sources,
     get_highlighted_pdf_content,
+    IncrementalReferenceExtractor,
+    cited_pages_pdf_file,
+    render_pdf_file_preview,
 )
+from prefetch import HighlightPrefetcher
+from render_jobs import RENDER_DEFAULT_DEADLINE, JobExpired, QueueFull, render_jobs
+from singleflight import coalescer
+from speech_tokens import SpeechTokenError, speech_tokens
 
 # from frontend.utility import (authenticate_user, generate_user_id,
 #                                                extract_refs_dict,
@@ -25,7 +45,62 @@ from utility import (
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SECRET_KEY", "your-secret-key-here")
-BACKEND_BASE_URL = os.environ.get("BACKEND_BASE_URL", "http://localhost:8000")
+metrics.init_app(app)
+asset_manifest = assets.init_app(app)
+admission_control = admission.AdmissionController()
+admission.init_app(app, admission_control)
+PDF_STREAM_CHUNK_SIZE = int(os.environ.get("PDF_STREAM_CHUNK_SIZE", str(64 * 1024)))
+
+# Uploads: reject oversized request bodies before they are parsed, and forward at most
+# UPLOAD_CONCURRENCY files to the backend in parallel per worker.
+app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("MAX_CONTENT_LENGTH", str(100 * 1024 * 1024)))
+MAX_UPLOAD_FILES = int(os.environ.get("MAX_UPLOAD_FILES", "3"))
+UPLOAD_CONCURRENCY = int(os.environ.get("UPLOAD_CONCURRENCY", "3"))
+_upload_executor = ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY, thread_name_prefix="upload")
+
+# /batch and /bootstrap: read-only endpoints that may be combined, run concurrently
+BATCH_ALLOWED_PATHS = ("/check_auth", "/user_sessions", "/chat_history", "/available_files")
+BATCH_MAX_PARTS = int(os.environ.get("BATCH_MAX_PARTS", "8"))
+# Parts of all batches in this worker share the pool; gunicorn.conf.py sizes it for the
+# requests a worker serves at once (under gevent its threads are greenlets)
+_batch_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("BATCH_CONCURRENCY", str(BATCH_MAX_PARTS))), thread_name_prefix="batch"
+)
+
+# Inline source previews: rendered images are kept in a bounded in-process LRU
+PREVIEW_DEFAULT_DPI = int(os.environ.get("PREVIEW_DEFAULT_DPI", "96"))
+PREVIEW_MAX_DPI = int(os.environ.get("PREVIEW_MAX_DPI", "200"))
+PREVIEW_CACHE_TTL = float(os.environ.get("PREVIEW_CACHE_TTL", "600"))
+PREVIEW_DEADLINE = float(os.environ.get("PREVIEW_DEADLINE", "30"))
+RENDER_MAX_DEADLINE = float(os.environ.get("RENDER_MAX_DEADLINE", "300"))
+RENDER_MAX_POLL_WAIT = float(os.environ.get("RENDER_MAX_POLL_WAIT", "25"))
+PREVIEW_MIMETYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+# Request fields of /highlight_preview that are not part of the source
+_PREVIEW_OPTIONS = ("dpi", "format", "clip")
+preview_cache = MemoryCacheBackend(
+    max_entries=int(os.environ.get("PREVIEW_CACHE_MAX_ENTRIES", "512")),
+    max_bytes=int(os.environ.get("PREVIEW_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+)
+
+# Cited-pages-only mode of /view_highlights: the backend's highlighted PDF is cut down
+# to the cited pages plus context pages on each side (the UI asks for 1, see static/js/app.js)
+VIEWER_CONTEXT_PAGES = 1
+VIEWER_MAX_CONTEXT_PAGES = int(os.environ.get("VIEWER_MAX_CONTEXT_PAGES", "5"))
+VIEWER_DEADLINE = float(os.environ.get("VIEWER_DEADLINE", "60"))
+# Optional speculative rendering of cited sources after each answer (PREFETCH_HIGHLIGHTS=1)
+prefetcher = HighlightPrefetcher(highlight_cache, render_jobs)
+
+# Request headers forwarded to the backend so range/conditional requests work end to end
+_FORWARDED_PDF_REQUEST_HEADERS = ("Range", "If-Range", "If-None-Match", "If-Modified-Since")
+# Backend response headers preserved on streamed PDF responses
+_PASSTHROUGH_PDF_HEADERS = (
+    "Content-Length",
+    "Content-Range",
+    "Content-Encoding",
+    "Accept-Ranges",
+    "ETag",
+    "Last-Modified",
+)
 
 def _auth_headers():
     token = session.get("access_token")
@@ -35,10 +110,69 @@ def _auth_headers():
     return headers
 
 
+def _pdf_request_headers(headers):
+    for name in _FORWARDED_PDF_REQUEST_HEADERS:
+        value = request.headers.get(name)
+        if value:
+            headers[name] = value
+    return headers
+
+
+def _stream_pdf_response(resp, download_name, extra_headers=None, cache_writer=None, on_finish=None):
+    """Relay a streamed backend PDF response chunk by chunk.
+
+    The raw (still encoded) body is forwarded so Content-Length, Content-Range and
+    ETag stay valid, and memory per download is bounded by PDF_STREAM_CHUNK_SIZE.
+
+    Without a cache_writer the backend body is read as the client reads ours, and
+    on_finish is called at once. With one, a background thread copies the backend
+    body into the cache entry at backend speed while the client is served from the
+    growing file, and on_finish (e.g. releasing the single-flight lock) runs once
+    the entry is committed or discarded: however slowly the client reads, and
+    whether it reads at all (HEAD, or a client gone before the first chunk).
+    """
+    headers = {"Content-Disposition": f'inline; filename="{download_name}"'}
+    for name in _PASSTHROUGH_PDF_HEADERS:
+        if name in resp.headers:
+            headers[name] = resp.headers[name]
+    headers.update(extra_headers or {})
+
+    if cache_writer is None:
+        if on_finish:
+            on_finish()
+        body = (chunk for chunk in resp.raw.stream(PDF_STREAM_CHUNK_SIZE, decode_content=False) if chunk)
+        close = resp.close
+    else:
+
+        def fill():
+            try:
+                for chunk in resp.raw.stream(PDF_STREAM_CHUNK_SIZE, decode_content=False):
+                    if chunk:
+                        cache_writer.write(chunk)
+                cache_writer.commit()
+            except Exception as e:
+                print(f"Caching {download_name} failed: {str(e)}")
+            finally:
+                cache_writer.abort()
+                resp.close()
+                if on_finish:
+                    on_finish()
+
+        reader = cache_writer.reader()
+        threading.Thread(target=fill, name="pdf-cache-fill", daemon=True).start()
+        body = cache_writer.follow(reader, PDF_STREAM_CHUNK_SIZE)
+        close = reader.close
+        headers["X-Cache"] = "MISS"
+    # Not direct_passthrough: werkzeug only runs call_on_close for bodies it wraps itself
+    response = Response(body, status=resp.status_code, mimetype="application/pdf", headers=headers)
+    response.call_on_close(close)
+    return response
+
+
 @app.route("/")
 def index():
     """Main page with chat interface"""
-    return render_template("index.html")
+    return assets.send_page("index.html")
 
 
 @app.route("/login", methods=["POST"])
@@ -53,10 +187,10 @@ def login():
             return jsonify({"error": "Email and password are required"}), 400
 
         # Authenticate against backend to obtain JWT
-        resp = requests.post(
-            f"{BACKEND_BASE_URL}/auth/login",
+        resp = backend_post(
+            "/auth/login",
+            "login",
             json={"email": email, "password": password},
-            timeout=20,
         )
         if resp.status_code != 200:
             return jsonify({"error": "Invalid credentials"}), 401
@@ -101,147 +235,667 @@ def check_auth():
 
 
 @app.route("/chat_history")
+@cached_view("chat_history")
 def chat_history():
     """Get chat history for authenticated user"""
     if not session.get("logged_in"):
         return jsonify({"error": "Not authenticated"}), 401
 
     try:
-        resp = requests.get(f"{BACKEND_BASE_URL}/chat_history", headers=_auth_headers(), timeout=30)
+        resp = backend_get("/chat_history", "chat_history", headers=_auth_headers())
         return jsonify(resp.json()), resp.status_code
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/user_sessions")
+@cached_view("user_sessions")
 def user_sessions():
     """Get all sessions for authenticated user"""
     if not session.get("logged_in"):
         return jsonify({"error": "Not authenticated"}), 401
 
     try:
-        resp = requests.get(f"{BACKEND_BASE_URL}/user_sessions", headers=_auth_headers(), timeout=30)
+        resp = backend_get("/user_sessions", "user_sessions", headers=_auth_headers())
         return jsonify(resp.json()), resp.status_code
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/view_highlights", methods=["POST"])
-def view_highlights():
-    source = request.get_json()
+_SOURCE_FIELDS = ("filename", "page_number", "content")
+_VIEWER_OPTIONS = ("cited_pages_only", "context_pages")
+
+
+def _source_error(source):
+    """Basic validation of a highlight request payload"""
     if not source:
         return jsonify({"error": "No data provided"}), 400
-    # Basic validation
-    for field in ["filename", "page_number", "content"]:
+    for field in _SOURCE_FIELDS:
         if not source.get(field):
             return jsonify({"error": f"Missing required field: {field}"}), 400
+    if source.get("cited_pages_only"):
+        try:
+            context_pages = int(source.get("context_pages", VIEWER_CONTEXT_PAGES))
+        except (TypeError, ValueError):
+            context_pages = -1
+        if not 0 <= context_pages <= VIEWER_MAX_CONTEXT_PAGES:
+            return jsonify({"error": f"context_pages must be between 0 and {VIEWER_MAX_CONTEXT_PAGES}"}), 400
+    return None
+
+
+def _backend_source(source):
+    """The source without the cited-pages options, which this frontend applies itself"""
+    return {k: v for k, v in source.items() if k not in _VIEWER_OPTIONS}
+
+
+def _source_cache_key(source, user_id):
+    # Per user: the backend authorizes blob access per user, so a hit must not cross users
+    options = {k: v for k, v in source.items() if k not in _SOURCE_FIELDS and k != "user_id"}
+    return highlight_cache_key(
+        source["filename"], source["page_number"], source["content"], user_id=user_id, **options
+    )
+
+
+def _highlight_headers(resp):
+    return {"X-Page-Number": resp.headers.get("X-Page-Number", "1")}
+
+
+def _fetch_highlighted_pdf(source, auth_headers, user_id, job=None, **meta):
+    """Return (path, headers, error) for user_id's highlighted PDF, from cache or the backend.
+
+    meta is stored with a newly cached entry (e.g. prefetched/ttl for speculative renders).
+    A render job waits for an identical fetch at most until its deadline.
+    """
+    source = _backend_source(source)
+    cache_key = _source_cache_key(source, user_id)
+    hit = highlight_cache.get(cache_key)
+    if hit:
+        prefetcher.record_hit(cache_key, hit[1])
+        return hit[0], hit[1].get("headers", {}), None
+    # Shares the /view_highlights flight, so a click during a prefetch waits for it
+    timeout = max(job.remaining(), 0) if job is not None else None
+    flight = coalescer.acquire(("view_highlights", cache_key), "view_highlights", timeout=timeout)
     try:
-        resp = requests.post(
-            f"{BACKEND_BASE_URL}/view_highlights",
-            json=source,
-            headers=_auth_headers(),
-            timeout=120,
+        if job is not None:
+            job.check()
+        if flight.waited:
+            hit = highlight_cache.get(cache_key)
+            if hit:
+                flight.release(deduped=True)
+                return hit[0], hit[1].get("headers", {}), None
+        resp = backend_post("/view_highlights", "view_highlights", json=source, headers=auth_headers)
+        if resp.status_code != 200 or not resp.headers.get("Content-Type", "").startswith("application/pdf"):
+            try:
+                payload = resp.json()
+            except ValueError:
+                payload = {"error": f"Backend returned HTTP {resp.status_code}"}
+            return None, None, (payload, resp.status_code if resp.status_code >= 400 else 502)
+        headers = _highlight_headers(resp)
+        return highlight_cache.put_bytes(cache_key, resp.content, headers=headers, **meta), headers, None
+    finally:
+        flight.release()
+
+
+@app.route("/view_highlights", methods=["POST"])
+def view_highlights():
+    source = request.get_json()
+    error = _source_error(source)
+    if error:
+        return error
+    download_name = source.get("filename", "document.pdf")
+    if source.get("cited_pages_only"):
+        return _view_cited_pages(source, download_name)
+    cache_key = flight = None
+    user_id = session.get("user_id")
+    if session.get("logged_in") and user_id and not request.headers.get("Range"):
+        cache_key = _source_cache_key(source, user_id)
+        with metrics.phase("cache"):
+            hit = highlight_cache.get(cache_key)
+        if not hit:
+            # Identical concurrent requests wait for the first render instead of repeating it
+            flight = coalescer.acquire(("view_highlights", cache_key), "view_highlights")
+            hit = highlight_cache.get(cache_key) if flight.waited else None
+            if hit:
+                flight.release(deduped=True)
+        if hit:
+            prefetcher.record_hit(cache_key, hit[1])
+            return send_cached_pdf(hit[0], download_name, headers=hit[1].get("headers"))
+    try:
+        resp = backend_post(
+            "/view_highlights",
+            "view_highlights",
+            json=_backend_source(source),
+            headers=_pdf_request_headers(_auth_headers()),
             stream=True,
         )
-        if resp.status_code == 200 and resp.headers.get("Content-Type", "").startswith("application/pdf"):
-            download_name = source.get("filename", "document.pdf")
-            return Response(
-                resp.content,
-                mimetype="application/pdf",
-                headers={
-                    "Content-Disposition": f'inline; filename="{download_name}"',
-                    "X-Page-Number": resp.headers.get("X-Page-Number", "1"),
-                },
+        if resp.status_code in (200, 206) and resp.headers.get("Content-Type", "").startswith("application/pdf"):
+            extra_headers = _highlight_headers(resp)
+            cache_writer = None
+            if cache_key and resp.status_code == 200 and not resp.headers.get("Content-Encoding"):
+                cache_writer = highlight_cache.writer(cache_key, headers=extra_headers)
+            # The flight is held until the backend body is in the cache, not until the
+            # client has it, then waiters are served from disk
+            on_finish, flight = (flight.release if flight else None), None
+            return _stream_pdf_response(
+                resp, download_name, extra_headers=extra_headers, cache_writer=cache_writer, on_finish=on_finish
             )
+        if resp.status_code == 304:
+            return _stream_pdf_response(resp, download_name)
         return jsonify(resp.json()), resp.status_code
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if flight:
+            flight.release()
+
+
+def _view_cited_pages(source, download_name):
+    """Serve the cited pages of a highlighted PDF, cut from the full rendering in the render pool"""
+    if not session.get("logged_in"):
+        return jsonify({"error": "Not authenticated"}), 401
+    user_id = session.get("user_id")
+    cache_key = _source_cache_key(source, user_id)
+    hit = highlight_cache.get(cache_key)
+    if hit:
+        prefetcher.record_hit(cache_key, hit[1])
+        return send_cached_pdf(hit[0], download_name, headers=hit[1].get("headers"))
+    try:
+        path, headers = render_jobs.run(
+            _cited_pages_task, source, _auth_headers(), user_id, deadline=VIEWER_DEADLINE, kind="pdf"
+        )
+        resp = send_cached_pdf(path, download_name, headers=headers)
+        resp.headers["X-Cache"] = "MISS"
+        return resp
+    except _BackendError as e:
+        return jsonify(e.payload), e.status
+    except QueueFull:
+        return jsonify({"error": "PDF renderer busy"}), 503, {"Retry-After": "2"}
+    except JobExpired:
+        return jsonify({"error": "PDF rendering timed out"}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/highlight_preview", methods=["POST"])
+def highlight_preview():
+    """Small image of the highlighted region of a cited page, for inline previews"""
+    if not session.get("logged_in"):
+        return jsonify({"error": "Not authenticated"}), 401
+    data = request.get_json() or {}
+    source = data["source"] if "source" in data else {k: v for k, v in data.items() if k not in _PREVIEW_OPTIONS}
+    error = _source_error(source)
+    if error:
+        return error
+    try:
+        dpi = min(max(int(data.get("dpi", PREVIEW_DEFAULT_DPI)), 36), PREVIEW_MAX_DPI)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid dpi"}), 400
+    fmt = data.get("format", "png").lower()
+    if fmt not in PREVIEW_MIMETYPES:
+        return jsonify({"error": f"Unsupported format: {fmt}"}), 400
+    clip = bool(data.get("clip", True))
+
+    user_id = session.get("user_id")
+    source, key = _preview_source(source, user_id, dpi, fmt, clip)
+    cached = preview_cache.get(key)
+    if cached is not None:
+        return _preview_response(cached, hit=True)
+    try:
+        # Rasterizing holds the GIL, so it runs in the render process pool
+        cached = render_jobs.run(
+            _preview_task, source, _auth_headers(), user_id, key, dpi, fmt, clip,
+            deadline=PREVIEW_DEADLINE, kind="preview",
+        )
+        return _preview_response(cached, hit=False)
+    except _BackendError as e:
+        return jsonify(e.payload), e.status
+    except QueueFull:
+        return jsonify({"error": "Preview renderer busy"}), 503, {"Retry-After": "2"}
+    except JobExpired:
+        return jsonify({"error": "Preview rendering timed out"}), 504
+    except Exception as e:
+        return jsonify({"error": f"Error rendering preview: {str(e)}"}), 500
+
+
+class _BackendError(Exception):
+    def __init__(self, payload, status):
+        super().__init__(payload.get("error", f"Backend returned HTTP {status}"))
+        self.payload = payload
+        self.status = status
+
+
+def _preview_source(source, user_id, dpi, fmt, clip):
+    """The viewer's payload for a source and the preview cache key.
+
+    A preview is rendered from the PDF a reference click opens, so fetching it warms
+    the highlight cache entry the click then reads.
+    """
+    source = _viewer_source(source)
+    return source, f"{_source_cache_key(source, user_id)}:{dpi}:{fmt}:{int(clip)}"
+
+
+def _highlighted_pdf_task(job, source, auth_headers, user_id, **meta):
+    if source.get("cited_pages_only"):
+        return _cited_pages_task(job, source, auth_headers, user_id, **meta)
+    path, headers, error = _fetch_highlighted_pdf(source, auth_headers, user_id, job=job, **meta)
+    if error:
+        raise _BackendError(*error)
+    return path, headers
+
+
+def _cited_pages_task(job, source, auth_headers, user_id, **meta):
+    """(path, headers) of the cited-pages PDF for source, cut from the cached full rendering.
+
+    X-Page-Number is the page to open in the smaller PDF and X-Page-Map the original
+    page number of each of its pages.
+    """
+    cache_key = _source_cache_key(source, user_id)
+    hit = highlight_cache.get(cache_key)
+    if hit:
+        return hit[0], hit[1].get("headers", {})
+    path, headers, error = _fetch_highlighted_pdf(source, auth_headers, user_id, job=job)
+    if error:
+        raise _BackendError(*error)
+    context_pages = int(source.get("context_pages", VIEWER_CONTEXT_PAGES))
+    data, page_map = job.cpu(cited_pages_pdf_file, path, source["page_number"], context_pages)
+    opened = int(headers.get("X-Page-Number", "1"))
+    headers = {
+        "X-Page-Number": str(page_map.index(opened) + 1 if opened in page_map else 1),
+        "X-Page-Map": ",".join(str(p) for p in page_map),
+    }
+    return highlight_cache.put_bytes(cache_key, data, headers=headers, **meta), headers
+
+
+def _preview_task(job, source, auth_headers, user_id, key, dpi, fmt, clip):
+    path, headers = _highlighted_pdf_task(job, source, auth_headers, user_id)
+    page_number = int(headers.get("X-Page-Number", "1"))
+    image, fmt = job.cpu(render_pdf_file_preview, path, page_number, dpi, fmt, clip)
+    cached = fmt.encode("ascii") + b"\0" + image
+    preview_cache.set(key, cached, PREVIEW_CACHE_TTL)
+    return cached
+
+
+def _preview_response(cached, hit):
+    fmt, image = cached.split(b"\0", 1)
+    resp = Response(image, mimetype=PREVIEW_MIMETYPES[fmt.decode("ascii")])
+    resp.headers["Cache-Control"] = f"private, max-age={int(PREVIEW_CACHE_TTL)}"
+    resp.headers["X-Cache"] = "HIT" if hit else "MISS"
+    return resp
+
+
+@app.route("/highlight_jobs", methods=["POST"])
+def submit_highlight_job():
+    """Fetch a highlighted PDF into the cache ("pdf") or render a preview image ("preview") in the background.
+
+    Poll GET /highlight_jobs/<job_id>?wait=<seconds> until the status is final, then
+    fetch GET /highlight_jobs/<job_id>/result. DELETE cancels the job.
+    """
+    if not session.get("logged_in"):
+        return jsonify({"error": "Not authenticated"}), 401
+    data = request.get_json() or {}
+    source = data.get("source")
+    error = _source_error(source)
+    if error:
+        return error
+    kind = data.get("kind", "pdf")
+    try:
+        deadline = min(float(data.get("deadline", RENDER_DEFAULT_DEADLINE)), RENDER_MAX_DEADLINE)
+        if kind == "preview":
+            dpi = min(max(int(data.get("dpi", PREVIEW_DEFAULT_DPI)), 36), PREVIEW_MAX_DPI)
+            fmt = data.get("format", "png").lower()
+            if fmt not in PREVIEW_MIMETYPES:
+                return jsonify({"error": f"Unsupported format: {fmt}"}), 400
+            source, key = _preview_source(source, session.get("user_id"), dpi, fmt, bool(data.get("clip", True)))
+            args = (
+                _preview_task, source, _auth_headers(), session.get("user_id"), key, dpi, fmt,
+                bool(data.get("clip", True)),
+            )
+        elif kind == "pdf":
+            args = (_highlighted_pdf_task, source, _auth_headers(), session.get("user_id"))
+        else:
+            return jsonify({"error": f"Unknown job kind: {kind}"}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid job options: {str(e)}"}), 400
+    try:
+        job = render_jobs.submit(*args, owner=session.get("user_id"), deadline=deadline, kind=kind)
+    except QueueFull:
+        return jsonify({"error": "Render queue full"}), 503, {"Retry-After": "2"}
+    job.download_name = source.get("filename", "document.pdf")
+    body = dict(job.to_dict(), status_url=url_for("highlight_job_status", job_id=job.id))
+    return jsonify(body), 202
+
+
+@app.route("/highlight_jobs/<job_id>", methods=["GET", "DELETE"])
+def highlight_job_status(job_id):
+    if not session.get("logged_in"):
+        return jsonify({"error": "Not authenticated"}), 401
+    owner = session.get("user_id")
+    if request.method == "DELETE":
+        job = render_jobs.cancel(job_id, owner)
+    else:
+        job = render_jobs.get(job_id, owner)
+        if job is not None:
+            # Long-poll: hold the request until the job finishes or wait seconds pass
+            wait = request.args.get("wait", type=float) or 0
+            job.wait(min(max(wait, 0), RENDER_MAX_POLL_WAIT))
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    body = job.to_dict()
+    if job.status == "done":
+        body["result_url"] = url_for("highlight_job_result", job_id=job.id)
+    return jsonify(body)
+
+
+@app.route("/highlight_jobs/<job_id>/result", methods=["GET"])
+def highlight_job_result(job_id):
+    if not session.get("logged_in"):
+        return jsonify({"error": "Not authenticated"}), 401
+    job = render_jobs.get(job_id, session.get("user_id"))
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job.status != "done":
+        return jsonify(job.to_dict()), 409
+    if job.kind == "preview":
+        return _preview_response(job.result, hit=False)
+    path, headers = job.result
+    try:
+        return send_cached_pdf(path, job.download_name, headers)
+    except FileNotFoundError:
+        # Evicted from the disk cache since the job finished
+        return jsonify({"error": "Result expired"}), 410
+
+
+def _chat_body(data):
+    """Build the backend /chat payload from the client request"""
+    return {
+        "question": data.get("question", "").strip(),
+        "user_id": data.get("user_id", "").strip(),
+        "conversation_id": data.get("conversation_id", "").strip(),
+        "session_id": data.get("session_id", "").strip(),
+        "file_names": data.get("file_names", []),  # New parameter for selected files
+    }
+
+
+def _map_sources(references, source_documents):
+    """Extract and map references for UI highlighting support.
+
+    references is the reference text, or the {filename: pages} already extracted from it.
+    """
+    with metrics.phase("references"):
+        if isinstance(references, str):
+            references = extract_pdf_references(references)
+        return get_relevant_sources(result=references, response={"source_documents": source_documents})
 
 
 @app.route("/chat", methods=["POST"])
 def chat():
     """Handle chat requests"""
     try:
-        data = request.get_json()
-        question = data.get("question", "").strip()
-        user_id = data.get("user_id", "").strip()
-        conversation_id = data.get("conversation_id", "").strip()
-        session_id = data.get("session_id", "").strip()
-        file_names = data.get("file_names", [])  # New parameter for selected files
+        body = _chat_body(request.get_json())
+        question = body["question"]
 
         if not question:
             return jsonify({"error": "Please provide a question"}), 400
 
-        body = {
-            "question": question,
-            "user_id": user_id,
-            "conversation_id": conversation_id,
-            "session_id": session_id,
-            "file_names": file_names,
-        }
-        resp = requests.post(f"{BACKEND_BASE_URL}/chat", json=body, headers=_auth_headers(), timeout=120)
+        resp = backend_post("/chat", "chat", json=body, headers=_auth_headers())
+        # The backend records the exchange, so cached session lists are stale now
+        invalidate_user(session.get("user_id"))
         if resp.status_code != 200:
             return jsonify(resp.json()), resp.status_code
         response = resp.json()
-        # Extract and map references for UI highlighting support
-        references_text = response.get("references", "")
-        result_v2 = extract_pdf_references(references_text)
-        relevant_sources = get_relevant_sources(result=result_v2, response={"source_documents": response.get("source_documents", [])})
-        return jsonify(
-            {
-                "answer": response.get("answer", ""),
-                "question": question,
-                "timestamp": response.get("timestamp", ""),
-                "source_documents": relevant_sources,
-            }
+        relevant_sources = _map_sources(response.get("references", ""), response.get("source_documents", []))
+        _prefetch_sources(relevant_sources, _auth_headers(), session.get("user_id"))
+        with metrics.phase("serialize"):
+            return jsonify(
+                {
+                    "answer": response.get("answer", ""),
+                    "question": question,
+                    "timestamp": response.get("timestamp", ""),
+                    "source_documents": relevant_sources,
+                }
+            )
+    except Exception as e:
+        return (
+            jsonify({"error": f"Error processing request: {traceback.format_exc()}"}),
+            500,
+        )
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _iter_backend_events(resp):
+    """Yield JSON payloads from a streamed backend response.
+
+    Accepts Server-Sent Events ("data: {...}") as well as newline-delimited JSON;
+    plain-text data lines are treated as answer tokens.
+    """
+    for line in resp.iter_lines(chunk_size=1024, decode_unicode=True):
+        if not line or line.startswith((":", "event:", "id:", "retry:")):
+            continue
+        if line.startswith("data:"):
+            line = line[5:].strip()
+        if line == "[DONE]":
+            return
+        try:
+            payload = json.loads(line)
+        except ValueError:
+            payload = {"token": line}
+        yield payload if isinstance(payload, dict) else {"token": str(payload)}
+
+
+def _viewer_source(doc):
+    """The /view_highlights payload the chat UI sends when a reference is clicked"""
+    return dict(doc, cited_pages_only=True, context_pages=VIEWER_CONTEXT_PAGES)
+
+
+def _prefetch_sources(relevant_sources, auth_headers, user_id):
+    sources = [_viewer_source(doc) for doc in relevant_sources if all(doc.get(f) for f in _SOURCE_FIELDS)]
+    if sources and user_id:
+        prefetcher.schedule(
+            sources,
+            functools.partial(_highlighted_pdf_task, user_id=user_id),
+            functools.partial(_source_cache_key, user_id=user_id),
+            auth_headers,
+        )
+
+
+def _chat_event_stream(resp, question, user_id=None, auth_headers=None):
+    """Relay backend output as SSE: token/references events, then sources and done"""
+    extractor = IncrementalReferenceExtractor()
+    answer_parts = []
+    final = {}
+    try:
+        for payload in _iter_backend_events(resp):
+            if payload.get("error"):
+                yield _sse("error", {"error": payload["error"]})
+                return
+            token = payload.get("token") or payload.get("delta") or ""
+            if not token and payload.get("type") == "token":
+                token = payload.get("content", "")
+            if token:
+                answer_parts.append(token)
+                yield _sse("token", {"content": token})
+                new_refs = extractor.feed(token)
+                if new_refs:
+                    yield _sse("references", {"references": new_refs})
+            for key in ("answer", "references", "source_documents", "timestamp"):
+                if key in payload:
+                    final[key] = payload[key]
+
+        # The last reference line usually has no trailing newline
+        new_refs = extractor.close()
+        # Reference text the tokens did not carry: a separate list, or an answer sent whole
+        unseen = final.get("references") or ("" if answer_parts else final.get("answer", ""))
+        if unseen:
+            new_refs.update(extractor.feed(unseen))
+            new_refs.update(extractor.close())
+        if new_refs:
+            yield _sse("references", {"references": new_refs})
+        answer = final.get("answer") or "".join(answer_parts)
+        relevant_sources = _map_sources(extractor.references, final.get("source_documents", []))
+        yield _sse("sources", {"source_documents": relevant_sources})
+        if auth_headers is not None:
+            _prefetch_sources(relevant_sources, auth_headers, user_id)
+        yield _sse(
+            "done",
+            {"answer": answer, "question": question, "timestamp": final.get("timestamp", "")},
         )
     except Exception as e:
+        yield _sse("error", {"error": f"Error processing request: {str(e)}"})
+    finally:
+        resp.close()
+        invalidate_user(user_id)
+
+
+def _chat_fallback_stream(response, question, user_id=None, auth_headers=None):
+    """Emit a non-streaming backend /chat answer with the same SSE events"""
+    answer = response.get("answer", "")
+    if answer:
+        yield _sse("token", {"content": answer})
+    relevant_sources = _map_sources(response.get("references", ""), response.get("source_documents", []))
+    yield _sse("sources", {"source_documents": relevant_sources})
+    if auth_headers is not None:
+        _prefetch_sources(relevant_sources, auth_headers, user_id)
+    yield _sse("done", {"answer": answer, "question": question, "timestamp": response.get("timestamp", "")})
+
+
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """Handle chat requests, streaming the answer as Server-Sent Events"""
+    try:
+        body = _chat_body(request.get_json())
+        question = body["question"]
+
+        if not question:
+            return jsonify({"error": "Please provide a question"}), 400
+
+        user_id = session.get("user_id")
+        headers = _auth_headers()
+        headers["Accept"] = "text/event-stream"
+        resp = backend_post("/chat/stream", "chat", json=body, headers=headers, stream=True)
+        if resp.status_code in (404, 405, 501):
+            # Backend has no streaming endpoint: fall back to a single blocking call
+            resp.close()
+            resp = backend_post("/chat", "chat", json=body, headers=_auth_headers())
+            invalidate_user(user_id)
+            if resp.status_code != 200:
+                return jsonify(resp.json()), resp.status_code
+            events = _chat_fallback_stream(resp.json(), question, user_id=user_id, auth_headers=_auth_headers())
+        elif resp.status_code != 200:
+            return jsonify(resp.json()), resp.status_code
+        else:
+            events = _chat_event_stream(resp, question, user_id=user_id, auth_headers=_auth_headers())
+        return Response(
+            events,
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    except Exception:
         return (
             jsonify({"error": f"Error processing request: {traceback.format_exc()}"}),
             500,
         )
 
 
+def _forward_upload(f, form, authorization):
+    """Stream a single uploaded file to the backend and return (status, payload)"""
+    body = MultipartStream(fields=form, files=[("pdfs", f.filename, f.stream, f.mimetype)])
+    headers = {"Authorization": authorization, "Content-Type": body.content_type}
+    try:
+        resp = backend_post("/upload_pdf", "upload_pdf", data=body, headers=headers)
+        try:
+            payload = resp.json()
+        except ValueError:
+            payload = {"error": resp.text[:500]}
+        return resp.status_code, payload
+    except Exception as e:
+        return 500, {"error": str(e)}
+
+
+@app.errorhandler(413)
+def request_entity_too_large(e):
+    limit_mb = app.config["MAX_CONTENT_LENGTH"] / (1024 * 1024)
+    return jsonify({"error": f"Upload exceeds the {limit_mb:.0f} MB limit."}), 413
+
+
 @app.route("/upload_pdf", methods=["POST"])
 def upload_pdf():
     if "pdfs" not in request.files:
         return jsonify({"error": "No PDF files provided."}), 400
 
-    files = request.files.getlist("pdfs")
-    if len(files) == 0 or len(files) > 1:
-        return jsonify({"error": "You must upload only 1 files."}), 400
+    files = [f for f in request.files.getlist("pdfs") if f.filename]
+    if len(files) == 0 or len(files) > MAX_UPLOAD_FILES:
+        return jsonify({"error": f"You must upload between 1 and {MAX_UPLOAD_FILES} files."}), 400
 
-    # Forward the multipart form-data to backend
-    try:
-        files_payload = [("pdfs", (f.filename, f.stream, f.mimetype)) for f in files]
-        form = {
-            "field1": request.form.get("field1", ""),
-            "field2": request.form.get("field2", ""),
-            "field3": request.form.get("field3", ""),
-        }
-        headers = {"Authorization": _auth_headers().get("Authorization", "")}
-        resp = requests.post(f"{BACKEND_BASE_URL}/upload_pdf", files=files_payload, data=form, headers=headers, timeout=300)
-        return jsonify(resp.json()), resp.status_code
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    form = {
+        "field1": request.form.get("field1", ""),
+        "field2": request.form.get("field2", ""),
+        "field3": request.form.get("field3", ""),
+    }
+    authorization = _auth_headers().get("Authorization", "")
+    # New documents change the file list
+    invalidate_user(session.get("user_id"))
+
+    # A single file keeps the backend's response as-is
+    if len(files) == 1:
+        status, payload = _forward_upload(files[0], form, authorization)
+        return jsonify(payload), status
+
+    # Several files are forwarded in parallel, each as its own streamed backend upload
+    futures = [_upload_executor.submit(_forward_upload, f, form, authorization) for f in files]
+    results = []
+    for f, future in zip(files, futures):
+        status, payload = future.result()
+        results.append({"filename": f.filename, "status": status, "ok": 200 <= status < 300, "response": payload})
+    succeeded = sum(1 for r in results if r["ok"])
+    if succeeded == len(results):
+        status = 200
+    elif succeeded == 0:
+        status = 502
+    else:
+        status = 207
+    body = {"success": succeeded == len(results), "results": results}
+    if status != 200:
+        body["error"] = f"{len(results) - succeeded} of {len(results)} files failed to upload."
+    return jsonify(body), status
 
 
 @app.route("/view_pdf/<blob_name>")
 def view_pdf(blob_name):
     """Serve PDF files with proper content type for viewing in browser"""
+    cache_key = flight = None
+    user_id = session.get("user_id")
+    conditional = any(request.headers.get(name) for name in _FORWARDED_PDF_REQUEST_HEADERS)
+    if session.get("logged_in") and user_id and not conditional:
+        # Concurrent opens of one blob share a download, kept briefly in the disk cache
+        cache_key = blob_cache_key(user_id, blob_name)
+        with metrics.phase("cache"):
+            hit = highlight_cache.get(cache_key)
+        if not hit:
+            flight = coalescer.acquire(("view_pdf", cache_key), "view_pdf")
+            hit = highlight_cache.get(cache_key) if flight.waited else None
+            if hit:
+                flight.release(deduped=True)
+        if hit:
+            return send_cached_pdf(hit[0], blob_name, headers=hit[1].get("headers"))
     try:
-        headers = {"Authorization": _auth_headers().get("Authorization", "")}
-        resp = requests.get(f"{BACKEND_BASE_URL}/view_pdf/{blob_name}", headers=headers, timeout=60)
-        if resp.status_code != 200:
+        headers = _pdf_request_headers({"Authorization": _auth_headers().get("Authorization", "")})
+        resp = backend_get(f"/view_pdf/{blob_name}", "view_pdf", headers=headers, stream=True)
+        if resp.status_code not in (200, 206, 304):
             return jsonify(resp.json()), resp.status_code
-        return Response(
-            resp.content,
-            mimetype="application/pdf",
-            headers={"Content-Disposition": f'inline; filename="{blob_name}"'},
-        )
+        cache_writer = None
+        if cache_key and resp.status_code == 200 and not resp.headers.get("Content-Encoding"):
+            cache_writer = highlight_cache.writer(cache_key, ttl=BLOB_CACHE_TTL)
+        on_finish, flight = (flight.release if flight else None), None
+        return _stream_pdf_response(resp, blob_name, cache_writer=cache_writer, on_finish=on_finish)
 
     except Exception as e:
         return jsonify({"error": f"Error viewing PDF: {str(e)}"}), 500
+    finally:
+        if flight:
+            flight.release()
 
 
 @app.route("/health")
@@ -250,6 +904,55 @@ def health():
     return jsonify({"status": "healthy", "frontend": True})
 
 
+@app.route("/stats")
+def stats():
+    """Runtime statistics for this worker process"""
+    # Cache paths, pool state and timings are internal: not for anonymous callers
+    if not session.get("logged_in"):
+        return jsonify({"error": "Not authenticated"}), 401
+    return jsonify(
+        {
+            "backend_pool": get_pool_stats(),
+            "response_cache": response_cache.stats(),
+            "highlight_cache": highlight_cache.stats(),
+            "preview_cache": preview_cache.stats(),
+            "render_jobs": render_jobs.stats(),
+            "prefetch": prefetcher.stats(),
+            "singleflight": coalescer.stats(),
+            "speech_tokens": speech_tokens.stats(),
+            "assets": asset_manifest.stats(),
+            "startup": startup.stats(),
+            "admission": admission_control.stats(),
+        }
+    )
+
+
+def _stats_gauges():
+    """Expose the /stats gauges worth alerting on through /metrics"""
+    pool = get_pool_stats()
+    jobs = render_jobs.stats()
+    caches = {
+        "response": response_cache.stats(),
+        "highlight": highlight_cache.stats(),
+        "preview": preview_cache.stats(),
+    }
+    return [
+        ("frontend_backend_pool_connections_in_use", "gauge", "Backend connections checked out",
+         [({}, pool["connections_in_use"])]),
+        ("frontend_backend_pool_reuse_ratio", "gauge", "Share of backend requests on a reused connection",
+         [({}, pool["reuse_ratio"])]),
+        ("frontend_render_jobs", "gauge", "Render jobs by state",
+         [({"state": "queued"}, jobs["queued"]), ({"state": "running"}, jobs["running"])]),
+        ("frontend_cache_hit_ratio", "gauge", "Hit ratio per cache",
+         [({"cache": name}, cache["hit_ratio"]) for name, cache in caches.items() if "hit_ratio" in cache]),
+        ("frontend_cache_entries", "gauge", "Entries per cache",
+         [({"cache": name}, cache["entries"]) for name, cache in caches.items()]),
+    ]
+
+
+metrics.registry.register_collector(_stats_gauges)
+
+
 @app.route("/speech_token")
 def speech_token():
     """Return an Azure Speech service token or subscription key (short-lived token recommended).
@@ -263,23 +966,11 @@ def speech_token():
         if not speech_key or not speech_region:
             return jsonify({"error": "Speech key/region not configured on server"}), 500
 
-        # Acquire a token from Azure Cognitive Services token endpoint
-        # Docs: https://learn.microsoft.com/azure/cognitive-services/speech-service/rest-speech-to-text
-        token_url = (
-            f"https://{speech_region}.api.cognitive.microsoft.com/sts/v1.0/issueToken"
-        )
-        headers = {"Ocp-Apim-Subscription-Key": speech_key, "Content-Length": "0"}
-        resp = requests.post(token_url, headers=headers, timeout=10)
-        if resp.status_code != 200:
-            return (
-                jsonify(
-                    {"error": "Failed to acquire speech token", "detail": resp.text}
-                ),
-                502,
-            )
-
-        access_token = resp.text
+        # Tokens come from the shared store and are refreshed before they expire
+        access_token = speech_tokens.get_token(speech_region, speech_key)
         return jsonify({"token": access_token, "region": speech_region})
+    except SpeechTokenError as e:
+        return jsonify({"error": str(e), "detail": e.detail}), 502
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -317,6 +1008,7 @@ def delete_session():
         status = rag_pipeline.delete_cosmo_chat_message(
             user_id=user_id, session_id=session_id
         )
+        invalidate_user(user_id)
         if status:
             return jsonify({"success": True})
         else:
@@ -326,25 +1018,93 @@ def delete_session():
 
 
 @app.route("/available_files")
+@cached_view("available_files", ttl=float(os.environ.get("CACHE_TTL_AVAILABLE_FILES", "120")))
 def available_files():
     """Get all available files for authenticated user"""
     if not session.get("logged_in"):
         return jsonify({"error": "Not authenticated"}), 401
 
     try:
-        # Run the async get_available_files function
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        # Run the async get_available_files function on the shared event loop
+        files = run_coroutine(rag_pipeline.get_available_files())
+        # print(f"Available files from backend: {files}")
+        return jsonify({"files": files})
+    except Exception as e:
+        # print(f"Error in available_files endpoint: {str(e)}")
+        return jsonify({"error": str(e)}), 500
 
+
+def _dispatch_batch_part(path, headers, base_url):
+    """Run one read-only GET through the normal routing, so caching and coalescing apply"""
+    start = time.perf_counter()
+    try:
+        with app.test_request_context(path, base_url=base_url, method="GET", headers=headers):
+            resp = app.full_dispatch_request()
         try:
-            files = loop.run_until_complete(rag_pipeline.get_available_files())
-            # print(f"Available files from backend: {files}")
-            return jsonify({"files": files})
+            body = resp.get_json(silent=True)
+            part = {"status": resp.status_code, "body": body if body is not None else resp.get_data(as_text=True)}
+            if "X-Cache" in resp.headers:
+                part["cache"] = resp.headers["X-Cache"]
         finally:
-            loop.close()
+            # Releases the part's admission slot
+            resp.close()
     except Exception as e:
-        # print(f"Error in available_files endpoint: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+        part = {"status": 500, "body": {"error": str(e)}}
+    part["ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return part
+
+
+def _run_batch(parts):
+    """Run {name: path} sub-requests concurrently; return {name: {status, body, ms}}"""
+    # Sub-requests see the caller's session cookie and nothing else from the request
+    headers = {"Cookie": request.headers.get("Cookie", "")}
+    futures = {
+        name: _batch_executor.submit(_dispatch_batch_part, path, headers, request.host_url)
+        for name, path in parts.items()
+    }
+    return {name: future.result() for name, future in futures.items()}
+
+
+@app.route("/batch", methods=["POST"])
+def batch():
+    """Run several read-only GET endpoints in one round trip.
+
+    Body: {"requests": [{"id": "sessions", "path": "/user_sessions"}, ...]}. Each part
+    gets its own status, so one failing call does not fail the batch.
+    """
+    data = request.get_json(silent=True)
+    requests_ = (data.get("requests") or []) if isinstance(data, dict) else None
+    if not isinstance(requests_, list) or len(requests_) > BATCH_MAX_PARTS:
+        return jsonify({"error": f"Provide a list of up to {BATCH_MAX_PARTS} requests"}), 400
+    parts = {}
+    for idx, item in enumerate(requests_):
+        if not isinstance(item, dict) or not isinstance(item.get("path"), str):
+            return jsonify({"error": f"Request {idx} must be an object with a path"}), 400
+        part_id = item.get("id", idx)
+        if not isinstance(part_id, (str, int)) or isinstance(part_id, bool) or str(part_id) in parts:
+            return jsonify({"error": f"Request {idx} needs a unique string or integer id"}), 400
+        path = item["path"]
+        if path.split("?", 1)[0] not in BATCH_ALLOWED_PATHS:
+            return jsonify({"error": f"Path not allowed in a batch: {path}"}), 400
+        parts[str(part_id)] = path
+    return jsonify({"responses": _run_batch(parts)})
+
+
+@app.route("/bootstrap")
+def bootstrap():
+    """Everything the page needs on load: auth state, sessions and available files.
+
+    ?include=chat_history adds the full chat history.
+    """
+    auth = check_auth().get_json()
+    parts = {}
+    if auth.get("authenticated"):
+        parts = {"user_sessions": "/user_sessions", "available_files": "/available_files"}
+        if "chat_history" in request.args.get("include", "").split(","):
+            parts["chat_history"] = "/chat_history"
+    responses = _run_batch(parts) if parts else {}
+    responses["check_auth"] = {"status": 200, "body": auth}
+    return jsonify({"responses": responses})
 
 
 if __name__ == "__main__":
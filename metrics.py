@@ -0,0 +1,246 @@
+"""Request and phase timing, backend call accounting and Prometheus exposition.
+
+Metrics are kept per process; with several gunicorn workers each worker's
+/metrics shows its own share and the scraper sums them.
+"""
+import bisect
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers fast local routes up to multi-minute uploads
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = (1024, 16 * 1024, 128 * 1024, 1024 * 1024, 8 * 1024 * 1024, 64 * 1024 * 1024)
+
+# Fraction of requests run under cProfile, and the duration above which their profile is kept
+METRICS_PROFILE_SAMPLE_RATE = float(os.environ.get("METRICS_PROFILE_SAMPLE_RATE", "0"))
+METRICS_PROFILE_SLOW_MS = float(os.environ.get("METRICS_PROFILE_SLOW_MS", "1000"))
+METRICS_PROFILE_DIR = os.environ.get("METRICS_PROFILE_DIR")
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=None):
+    items = list(key) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in items)
+    return "{" + body + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._values = {}  # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 2)
+            if idx < len(self.buckets):
+                entry[idx] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, entry):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, {'le': bound})} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, {'le': '+Inf'})} {entry[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {round(entry[-2], 6)}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {entry[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text):
+        metric = Counter(name, help_text)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, fn):
+        """fn() returns [(name, type, help, [(labels dict, value), ...]), ...] at scrape time"""
+        self._collectors.append(fn)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception:
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(_label_key(labels))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+request_seconds = registry.histogram(
+    "frontend_request_duration_seconds", "Time to produce the response headers, by route, method and status"
+)
+phase_seconds = registry.histogram("frontend_phase_duration_seconds", "Time spent in named phases of a request")
+backend_requests = registry.counter("frontend_backend_requests_total", "Backend calls by route and status")
+backend_seconds = registry.histogram("frontend_backend_request_duration_seconds", "Backend time to response headers")
+backend_bytes = registry.histogram(
+    "frontend_backend_response_bytes", "Backend response sizes where known up front", SIZE_BUCKETS
+)
+slow_profiles = registry.counter("frontend_slow_request_profiles_total", "Profiles kept for slow sampled requests")
+
+_slow_request_hooks = []
+
+
+def _request_state():
+    """Per-request timing state on flask.g, or None outside a request"""
+    from flask import g, has_request_context
+
+    if not has_request_context():
+        return None
+    state = getattr(g, "_metrics", None)
+    if state is None:
+        state = g._metrics = {"start": time.perf_counter(), "phases": {}}
+    return state
+
+
+def _route_label():
+    from flask import has_request_context, request
+
+    if has_request_context():
+        return request.url_rule.rule if request.url_rule else "unmatched"
+    return "-"
+
+
+def record_phase(name, seconds):
+    """Add seconds to phase name of the current request (if any) and to the phase histogram"""
+    state = _request_state()
+    if state is not None:
+        state["phases"][name] = state["phases"].get(name, 0.0) + seconds
+    phase_seconds.observe(seconds, route=_route_label(), phase=name)
+
+
+@contextmanager
+def phase(name):
+    """Time a block as phase name: `with phase("references"): ...`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - start)
+
+
+def record_backend_call(route, status, seconds, size=None):
+    backend_requests.inc(route=route, status=status)
+    backend_seconds.observe(seconds, route=route)
+    if size is not None:
+        backend_bytes.observe(size, route=route)
+    record_phase("backend", seconds)
+
+
+def add_slow_request_hook(fn):
+    """fn(route, seconds, profile) is called for sampled requests slower than METRICS_PROFILE_SLOW_MS"""
+    _slow_request_hooks.append(fn)
+
+
+def _server_timing(state, total):
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in state["phases"].items()]
+    parts.append(f"app;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def _finish_profile(profile, route, seconds):
+    import pstats
+
+    profile.disable()
+    if seconds * 1000 < METRICS_PROFILE_SLOW_MS:
+        return
+    slow_profiles.inc(route=route)
+    if METRICS_PROFILE_DIR:
+        os.makedirs(METRICS_PROFILE_DIR, exist_ok=True)
+        name = f"{int(time.time() * 1000)}-{route.strip('/').replace('/', '_') or 'index'}.prof"
+        profile.dump_stats(os.path.join(METRICS_PROFILE_DIR, name))
+    stats = pstats.Stats(profile)
+    for hook in _slow_request_hooks:
+        hook(route, seconds, stats)
+
+
+def init_app(app):
+    """Time every request, add Server-Timing headers and serve /metrics"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        _request_state()
+        if METRICS_PROFILE_SAMPLE_RATE and random.random() < METRICS_PROFILE_SAMPLE_RATE:
+            import cProfile
+
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Only one profiler can run at a time (e.g. another sampled request)
+                return
+            g._metrics_profile = profile
+
+    @app.after_request
+    def _record(response):
+        state = _request_state()
+        total = time.perf_counter() - state["start"]
+        route = _route_label()
+        request_seconds.observe(total, route=route, method=request.method, status=response.status_code)
+        # Streamed bodies are still being sent; timings cover the work up to the headers
+        response.headers["Server-Timing"] = _server_timing(state, total)
+        profile = getattr(g, "_metrics_profile", None)
+        if profile is not None:
+            _finish_profile(profile, route, total)
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,118 @@
+from collections import deque
+
+# Polygon coordinates from OCR are in inches; PDF user space is in points
+POINTS_PER_INCH = 72
+# Selected lines closer than this fraction of a line height are merged into one rect
+MERGE_GAP_RATIO = 0.6
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher: finds every pattern occurring in a text in one scan"""
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for pid, pattern in enumerate(patterns):
+            if not pattern:
+                continue
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[node][ch] = nxt
+                node = nxt
+            self._out[node].append(pid)
+        self._build_links()
+
+    def _build_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find_all(self, text):
+        """Return the set of pattern ids that occur in text"""
+        found = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+class OcrPageLayout:
+    """OCR lines of one page: texts, an Aho-Corasick matcher and a (n, 4) rect array"""
+
+    def __init__(self, lines):
+        import numpy as np
+
+        self.texts = [line.content for line in lines]
+        polygons = np.array([list(line.polygon)[:8] for line in lines], dtype=float).reshape(-1, 8)
+        polygons *= POINTS_PER_INCH
+        xs, ys = polygons[:, 0::2], polygons[:, 1::2]
+        self.rects = np.column_stack([xs.min(axis=1), ys.min(axis=1), xs.max(axis=1), ys.max(axis=1)])
+        self._matcher = None
+
+    @property
+    def matcher(self):
+        if self._matcher is None:
+            self._matcher = AhoCorasick(self.texts)
+        return self._matcher
+
+    def match_lines(self, contents):
+        """Indexes of lines whose text occurs in any of the content chunks.
+
+        Chunks are joined with a NUL separator so the whole batch is one scan and no
+        match can span two chunks.
+        """
+        return sorted(self.matcher.find_all("\0".join(contents)))
+
+    def highlight_rects(self, contents):
+        """Merged rects covering every line matched by the content chunks"""
+        line_ids = self.match_lines(contents)
+        if not line_ids:
+            return []
+        rects = self.rects[line_ids]
+        rects = rects[rects[:, 1].argsort(kind="stable")]
+        merged = [list(rects[0])]
+        for x0, y0, x1, y1 in rects[1:]:
+            cur = merged[-1]
+            height = max(cur[3] - cur[1], y1 - y0)
+            overlaps_x = x0 <= cur[2] and x1 >= cur[0]
+            if overlaps_x and y0 - cur[3] <= height * MERGE_GAP_RATIO:
+                cur[0], cur[1] = min(cur[0], x0), min(cur[1], y0)
+                cur[2], cur[3] = max(cur[2], x1), max(cur[3], y1)
+            else:
+                merged.append([x0, y0, x1, y1])
+        return [tuple(float(v) for v in rect) for rect in merged]
+
+
+class OcrLayoutIndex:
+    """Lazily built per-page layouts for an OCR result (an object with .pages[i].lines)"""
+
+    def __init__(self, pages_content):
+        self.pages_content = pages_content
+        self._pages = {}
+
+    def page(self, page_no):
+        layout = self._pages.get(page_no)
+        if layout is None:
+            layout = OcrPageLayout(self.pages_content.pages[page_no].lines)
+            self._pages[page_no] = layout
+        return layout
@@ -0,0 +1,310 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+PDF_CACHE_DIR = os.environ.get("PDF_CACHE_DIR", os.path.join(tempfile.gettempdir(), "dot-rag-frontend-pdf-cache"))
+PDF_CACHE_MAX_BYTES = int(os.environ.get("PDF_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Entries whose key has no blob version can go stale when a document is re-uploaded
+PDF_CACHE_TTL = float(os.environ.get("PDF_CACHE_TTL", "3600"))
+# Original blobs from /view_pdf are kept only long enough to serve concurrent opens
+BLOB_CACHE_TTL = float(os.environ.get("BLOB_CACHE_TTL", "30"))
+# A .part file not written to for this long belongs to a writer that died (e.g. a killed worker)
+PDF_CACHE_PART_GRACE = float(os.environ.get("PDF_CACHE_PART_GRACE", "600"))
+
+
+def highlight_cache_key(filename, pages, content, blob_version=None, user_id=None, **options):
+    """Hash of everything that determines a highlighted PDF, scoped to user_id like blob_cache_key"""
+    payload = json.dumps(
+        {
+            "filename": filename,
+            "version": blob_version,
+            "user": user_id,
+            "pages": [str(p) for p in (pages if isinstance(pages, list) else [pages])],
+            "content": content if isinstance(content, list) else [content],
+            "options": options,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def blob_cache_key(user_id, blob_name):
+    """Per-user key for an original document, since blob access is authorized per user"""
+    payload = json.dumps({"blob": blob_name, "user": user_id}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _CacheWriter:
+    """Writes an entry to a temp file and publishes it atomically on commit().
+
+    Readers opened with reader() can follow() the entry while it is being written.
+    """
+
+    def __init__(self, cache, key, meta):
+        self.cache = cache
+        self.key = key
+        self.meta = meta
+        fd, self.tmp_path = tempfile.mkstemp(dir=cache.directory, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+        self._cond = threading.Condition()
+        self.size = 0
+        self.committed = False
+        self.finished = False
+
+    def write(self, data):
+        self._file.write(data)
+        self._file.flush()
+        with self._cond:
+            self.size += len(data)
+            self._cond.notify_all()
+
+    def commit(self):
+        self._file.close()
+        try:
+            self.cache._publish(self.key, self.tmp_path, self.size, self.meta)
+        except FileNotFoundError:
+            # Idle past part_grace and removed as an orphan
+            self._finish()
+            return
+        self.committed = True
+        self._finish()
+
+    def abort(self):
+        """Discard the temp file; a no-op once committed"""
+        if self.committed:
+            return
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+        self._finish()
+
+    def _finish(self):
+        with self._cond:
+            self.finished = True
+            self._cond.notify_all()
+
+    def reader(self):
+        """Open the entry for follow(); the handle stays valid after commit or abort"""
+        return open(self.tmp_path, "rb")
+
+    def follow(self, reader, chunk_size):
+        """Yield the entry's bytes as they are written, until it is committed.
+
+        Raises OSError if the writer aborts first. Closes reader when done.
+        """
+        sent = 0
+        try:
+            while True:
+                with self._cond:
+                    while sent >= self.size and not self.finished:
+                        self._cond.wait()
+                    available, finished, committed = self.size, self.finished, self.committed
+                while sent < available:
+                    chunk = reader.read(min(chunk_size, available - sent))
+                    if not chunk:
+                        raise OSError(f"cache entry {self.key} truncated")
+                    sent += len(chunk)
+                    yield chunk
+                if finished:
+                    if not committed:
+                        raise OSError(f"cache entry {self.key} was not completed")
+                    return
+        finally:
+            reader.close()
+
+
+class PDFDiskCache:
+    """Size-bounded, LRU-evicted on-disk cache of rendered PDF files.
+
+    Each entry is <key>.pdf plus a <key>.json sidecar with its metadata (creation
+    time and response headers). Reads touch the PDF's mtime, which is the LRU clock.
+    Files still being written (*.part) count against max_bytes; ones left idle for
+    part_grace seconds are deleted by evict(), which also runs at startup.
+    """
+
+    def __init__(self, directory=PDF_CACHE_DIR, max_bytes=PDF_CACHE_MAX_BYTES, ttl=PDF_CACHE_TTL,
+                 part_grace=PDF_CACHE_PART_GRACE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.part_grace = part_grace
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.orphans_removed = 0
+        self.evict()
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + ".pdf", base + ".json"
+
+    def get(self, key, ttl=None):
+        """Return (path, meta) for a fresh entry, or None.
+
+        An entry written with a "ttl" in its metadata (e.g. a speculative prefetch)
+        expires after that many seconds unless the caller passes ttl explicitly.
+        """
+        pdf_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as fh:
+                meta = json.load(fh)
+            if ttl is None:
+                ttl = meta.get("ttl") or self.ttl
+            if ttl and time.time() - meta.get("created", 0) > ttl:
+                self._remove(key)
+                raise FileNotFoundError(pdf_path)
+            os.utime(pdf_path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return pdf_path, meta
+
+    def peek(self, key):
+        """Metadata of an entry without touching it or counting a lookup, or None"""
+        try:
+            with open(self._paths(key)[1]) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def update_meta(self, key, **changes):
+        meta = self.peek(key)
+        if meta is None:
+            return
+        meta_path = self._paths(key)[1]
+        with open(meta_path + ".part", "w") as fh:
+            json.dump(dict(meta, **changes), fh)
+        os.replace(meta_path + ".part", meta_path)
+
+    def writer(self, key, **meta):
+        return _CacheWriter(self, key, meta)
+
+    def put_bytes(self, key, data, **meta):
+        writer = self.writer(key, **meta)
+        try:
+            writer.write(data)
+            writer.commit()
+        except Exception:
+            writer.abort()
+            raise
+        return self._paths(key)[0]
+
+    def _publish(self, key, tmp_path, size, meta):
+        pdf_path, meta_path = self._paths(key)
+        meta = dict(meta, created=time.time(), size=size)
+        os.replace(tmp_path, pdf_path)
+        with open(meta_path + ".part", "w") as fh:
+            json.dump(meta, fh)
+        os.replace(meta_path + ".part", meta_path)
+        with self._lock:
+            self.writes += 1
+        self.evict()
+
+    def _remove(self, key):
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _scan(self):
+        """([(mtime, size, key)] of entries, [(mtime, size, name)] of *.part files)"""
+        entries, parts = [], []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".pdf"):
+                    target, name = entries, entry.name[:-4]
+                elif entry.name.endswith(".part"):
+                    target, name = parts, entry.name
+                else:
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                target.append((st.st_mtime, st.st_size, name))
+        return entries, parts
+
+    def _remove_orphans(self, parts):
+        """Delete idle *.part files and return the size of the ones still being written"""
+        cutoff = time.time() - self.part_grace
+        live = 0
+        for mtime, size, name in parts:
+            if mtime >= cutoff:
+                live += size
+                continue
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            with self._lock:
+                self.orphans_removed += 1
+        return live
+
+    def evict(self):
+        """Remove orphaned temp files, then least recently used entries until the cache fits in max_bytes"""
+        entries, parts = self._scan()
+        total = sum(size for _, size, _ in entries) + self._remove_orphans(parts)
+        if total <= self.max_bytes:
+            return
+        for _, size, key in sorted(entries):
+            self._remove(key)
+            total -= size
+            with self._lock:
+                self.evictions += 1
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        entries, parts = self._scan()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "directory": self.directory,
+                "entries": len(entries),
+                "bytes": sum(size for _, size, _ in entries),
+                "partial_files": len(parts),
+                "partial_bytes": sum(size for _, size, _ in parts),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "orphans_removed": self.orphans_removed,
+            }
+
+
+def send_cached_pdf(path, download_name, headers=None):
+    """Serve a cached PDF with send_file, which uses the server's sendfile/file wrapper"""
+    from flask import send_file
+
+    resp = send_file(
+        path,
+        mimetype="application/pdf",
+        as_attachment=False,
+        download_name=download_name,
+        conditional=True,
+        etag=os.path.basename(path)[:-4],
+        max_age=0,
+    )
+    for name, value in (headers or {}).items():
+        resp.headers[name] = value
+    resp.headers["X-Cache"] = "HIT"
+    return resp
+
+
+highlight_cache = PDFDiskCache()
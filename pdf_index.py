@@ -0,0 +1,157 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from .startup import record_import
+    from .text_matcher import PageWords
+except ImportError:  # imported as a top-level module (main.py, gunicorn main:app)
+    from startup import record_import
+    from text_matcher import PageWords
+
+PDF_INDEX_CACHE_SIZE = int(os.environ.get("PDF_INDEX_CACHE_SIZE", "16"))
+_N_FEATURES = 2 ** 18
+
+_vectorizer = None
+
+
+def _get_vectorizer(by="first_use"):
+    """Stateless term counter tokenizing like TfidfVectorizer's defaults"""
+    global _vectorizer
+    if _vectorizer is None:
+        start = time.perf_counter()
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        record_import("sklearn", time.perf_counter() - start, by)
+        _vectorizer = HashingVectorizer(n_features=_N_FEATURES, alternate_sign=False, norm=None)
+    return _vectorizer
+
+
+class PageEntry:
+    __slots__ = ("text", "chunks", "offsets", "counts", "words")
+
+    def __init__(self, text, chunks, offsets, counts):
+        self.text = text
+        self.chunks = chunks
+        self.offsets = offsets
+        self.counts = counts
+        self.words = None
+
+
+class PageIndex:
+    """Per-document cache of page text, chunk lists, chunk offsets and term counts.
+
+    Pages are indexed lazily the first time they are requested and reused for every
+    later highlight request against the same document.
+    """
+
+    def __init__(self, doc_key=None):
+        self.doc_key = doc_key
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def page(self, doc, page_no, chunk_text):
+        entry = self._pages.get(page_no)
+        if entry is not None:
+            return entry
+        with self._lock:
+            entry = self._pages.get(page_no)
+            if entry is None:
+                entry = self._build(doc, page_no, chunk_text)
+                self._pages[page_no] = entry
+        return entry
+
+    def page_words(self, doc, page_no):
+        """Word boxes and normalized tokens of a page, for fuzzy highlight matching"""
+        entry = self._pages.get(page_no)
+        if entry is not None and entry.words is not None:
+            return entry.words
+        words = PageWords.from_page(doc[page_no])
+        if entry is not None:
+            entry.words = words
+        return words
+
+    @staticmethod
+    def _build(doc, page_no, chunk_text):
+        text = doc[page_no].get_text()
+        chunks = [c for c in chunk_text(text=text) if c and c.strip()] if text.strip() else []
+        offsets = []
+        pos = 0
+        for chunk in chunks:
+            found = text.find(chunk, pos)
+            offsets.append(found)
+            if found >= 0:
+                pos = found + len(chunk)
+        counts = _get_vectorizer().transform(chunks) if chunks else None
+        return PageEntry(text, chunks, offsets, counts)
+
+    def best_matches(self, doc, requests, chunk_text):
+        """Return the best matching chunk on its page for each (content, page_no) request.
+
+        All requests are scored in one pass: TF-IDF weights are computed over the
+        queries plus the chunks of every requested page, and one sparse product gives
+        every query/chunk similarity. Each query only considers its own page's chunks.
+        Returns None for requests whose page has no text.
+        """
+        import numpy as np
+        import scipy.sparse as sp
+        from sklearn.preprocessing import normalize
+
+        results = [None] * len(requests)
+        blocks = {}
+        matrices = []
+        row = 0
+        for _, page_no in requests:
+            if page_no in blocks:
+                continue
+            entry = self.page(doc, page_no, chunk_text)
+            if entry.counts is None:
+                blocks[page_no] = None
+                continue
+            blocks[page_no] = (row, row + len(entry.chunks), entry)
+            matrices.append(entry.counts)
+            row += len(entry.chunks)
+
+        live = [i for i, (_, page_no) in enumerate(requests) if blocks.get(page_no)]
+        if not live:
+            return results
+
+        queries = _get_vectorizer().transform([requests[i][0] for i in live])
+        stacked = sp.vstack([queries] + matrices, format="csr")
+        # Smoothed IDF as in TfidfVectorizer, computed over queries and chunks together
+        df = np.bincount(stacked.indices, minlength=_N_FEATURES)
+        idf = np.log((1.0 + stacked.shape[0]) / (1.0 + df)) + 1.0
+        stacked.data = stacked.data * idf[stacked.indices]
+        stacked = normalize(stacked)
+        similarities = (stacked[: len(live)] @ stacked[len(live):].T).toarray()
+
+        for q, i in enumerate(live):
+            start, end, entry = blocks[requests[i][1]]
+            best = int(similarities[q, start:end].argmax())
+            results[i] = entry.chunks[best]
+        return results
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def document_key(pdf_content):
+    data = pdf_content.getvalue() if hasattr(pdf_content, "getvalue") else pdf_content
+    return hashlib.sha1(data).hexdigest()
+
+
+def get_page_index(doc_key):
+    """Return the shared PageIndex for a document, keeping the most recent few"""
+    with _indexes_lock:
+        index = _indexes.get(doc_key)
+        if index is None:
+            index = PageIndex(doc_key)
+            _indexes[doc_key] = index
+            while len(_indexes) > PDF_INDEX_CACHE_SIZE:
+                _indexes.popitem(last=False)
+        else:
+            _indexes.move_to_end(doc_key)
+        return index
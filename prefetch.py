@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+PREFETCH_ENABLED = os.environ.get("PREFETCH_HIGHLIGHTS", "0").lower() in ("1", "true", "yes")
+# Sources prefetched per answer, in the order the answer cites them
+PREFETCH_TOP_N = int(os.environ.get("PREFETCH_TOP_N", "2"))
+# Budget: prefetches in flight per worker, and share of the render queue they may use
+PREFETCH_MAX_INFLIGHT = int(os.environ.get("PREFETCH_MAX_INFLIGHT", "4"))
+PREFETCH_MAX_QUEUE_SHARE = float(os.environ.get("PREFETCH_MAX_QUEUE_SHARE", "0.5"))
+PREFETCH_DEADLINE = float(os.environ.get("PREFETCH_DEADLINE", "60"))
+# Unused prefetched PDFs expire from the highlight cache after this long
+PREFETCH_TTL = float(os.environ.get("PREFETCH_TTL", "300"))
+_TRACKED = 1024
+
+
+class HighlightPrefetcher:
+    """Renders the highlighted PDFs an answer cites before the user clicks them.
+
+    fetch(job, source, auth_headers, **meta) is run as a render job and stores the
+    result in cache with the given meta. Prefetched entries are marked in their
+    metadata; the first cache hit on one sets "used", so hit rate and wasted work
+    are measured across workers sharing the cache directory.
+    """
+
+    def __init__(self, cache, jobs, enabled=PREFETCH_ENABLED, top_n=PREFETCH_TOP_N,
+                 max_inflight=PREFETCH_MAX_INFLIGHT, ttl=PREFETCH_TTL, deadline=PREFETCH_DEADLINE):
+        self.cache = cache
+        self.jobs = jobs
+        self.enabled = enabled
+        self.top_n = top_n
+        self.max_inflight = max_inflight
+        self.ttl = ttl
+        self.deadline = deadline
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._tracked = OrderedDict()  # cache key -> (time prefetched, size)
+        self.scheduled = 0
+        self.completed = 0
+        self.skipped_cached = 0
+        self.skipped_budget = 0
+        self.failed = 0
+
+    def schedule(self, sources, fetch, key_fn, auth_headers):
+        """Queue prefetches for the first top_n sources; never blocks the caller"""
+        if not self.enabled:
+            return 0
+        queued = 0
+        for source in sources[: self.top_n]:
+            key = key_fn(source)
+            if self.cache.peek(key) is not None:
+                with self._lock:
+                    self.skipped_cached += 1
+                continue
+            if not self._acquire():
+                with self._lock:
+                    self.skipped_budget += 1
+                continue
+            try:
+                job = self.jobs.submit(
+                    fetch, source, auth_headers, deadline=self.deadline, kind="prefetch",
+                    prefetched=True, ttl=self.ttl,
+                )
+            except Exception:
+                self._release()
+                with self._lock:
+                    self.skipped_budget += 1
+                continue
+            with self._lock:
+                self.scheduled += 1
+            job.add_done_callback(lambda job, key=key: self._finished(job, key))
+            queued += 1
+        return queued
+
+    def _acquire(self):
+        stats = self.jobs.stats()
+        if stats["queued"] + stats["running"] >= self.jobs.max_queue * PREFETCH_MAX_QUEUE_SHARE:
+            return False
+        with self._lock:
+            if self._inflight >= self.max_inflight:
+                return False
+            self._inflight += 1
+            return True
+
+    def _release(self):
+        with self._lock:
+            self._inflight -= 1
+
+    def _finished(self, job, key):
+        self._release()
+        meta = self.cache.peek(key) if job.status == "done" else None
+        with self._lock:
+            if meta is None:
+                self.failed += 1
+                return
+            self.completed += 1
+            self._tracked[key] = (time.time(), meta.get("size", 0))
+            while len(self._tracked) > _TRACKED:
+                self._tracked.popitem(last=False)
+
+    def record_hit(self, key, meta):
+        """Call on every highlight cache hit; marks the first use of a prefetched entry"""
+        if meta.get("prefetched") and not meta.get("used"):
+            # Used entries live for the normal cache TTL from here on
+            self.cache.update_meta(key, used=True, ttl=None)
+
+    def stats(self):
+        with self._lock:
+            tracked = list(self._tracked.items())
+            stats = {
+                "enabled": self.enabled,
+                "top_n": self.top_n,
+                "inflight": self._inflight,
+                "scheduled": self.scheduled,
+                "completed": self.completed,
+                "skipped_cached": self.skipped_cached,
+                "skipped_budget": self.skipped_budget,
+                "failed": self.failed,
+            }
+        hits = wasted = wasted_bytes = 0
+        now = time.time()
+        for key, (created, size) in tracked:
+            meta = self.cache.peek(key)
+            if meta and meta.get("used"):
+                hits += 1
+            elif meta is None or now - created > self.ttl:
+                wasted += 1
+                wasted_bytes += size
+        decided = hits + wasted
+        stats.update(
+            hits=hits,
+            wasted=wasted,
+            wasted_bytes=wasted_bytes,
+            hit_rate=round(hits / decided, 4) if decided else 0.0,
+        )
+        return stats
@@ -0,0 +1,161 @@
+"""Extraction of "<file>.pdf, Page(s) ..." references from LLM answers.
+
+The scan is linear in the input: ".pdf" occurrences are found with one regex
+pass, each filename is recovered by walking back at most to the start of its
+line (or the end of the previous reference), and the page list is matched with
+anchored patterns that cannot backtrack across lines. The page list may also
+start the line after the filename ("foo.pdf" then "Page 3").
+"""
+import re
+
+_PDF_EXT = re.compile(r"\.pdf\b", re.IGNORECASE)
+# ", Page 3" / " - Pages: 3" / ", Pg. 3" / ", pp 3-5" / ", p. 3" / ", Page No. 3"
+_PAGE_KEYWORD = re.compile(
+    r"[*_`'\"”]*[ \t]*[,:\-–—(]?[ \t]*(?:pages?|pgs?|pp|p)\.?[ \t]*(?:nos?\.?[ \t]*)?:?[ \t]*",
+    re.IGNORECASE,
+)
+# Rest of a line that ends right after a filename, up to the next line's first word
+_LINE_BREAK = re.compile(r"[*_`'\"”]*[ \t]*[,:\-–—]?[ \t]*\r?\n[ \t]*(?:[\-•*>]+[ \t]*)?")
+# A line ending in a filename with no page list after it
+_DANGLING_FILENAME = re.compile(r"\.pdf\b[*_`'\"”]*[ \t]*[,:\-–—]?[ \t]*\r?\n\Z", re.IGNORECASE)
+_PAGE_ITEM = re.compile(r"(\d{1,6})(?:[ \t]*(?:[-–—]|to)[ \t]*(\d{1,6}))?", re.IGNORECASE)
+_PAGE_SEPARATOR = re.compile(r"[ \t]*(?:,[ \t]*(?:and[ \t]+|&[ \t]*)?|and[ \t]+|&[ \t]*)", re.IGNORECASE)
+# Characters a filename may contain; "." only when not followed by whitespace ("v2.1.pdf")
+_FILENAME_CHARS = frozenset("-()&_' \t")
+# List markers stripped from the start of a recovered filename: "- ", "• ", "* ", "1. ", "2) "
+_LIST_MARKER = re.compile(r"^(?:[\-•*]+|\d{1,3}[.)])[ \t]+")
+# A filename listed after another one: "a.pdf and b.pdf, Page 2"
+_CONJUNCTION = re.compile(r"^(?:and|or|&)[ \t]+", re.IGNORECASE)
+
+# Longest filename recovered, which also bounds the backward scan per match
+MAX_FILENAME_LENGTH = 255
+
+# Largest range expanded from "a-b"; longer ranges are treated as noise
+MAX_PAGE_RANGE = 500
+
+
+def _filename_start(text, end, floor):
+    """Index where the filename ending at end begins, scanning back no further than floor"""
+    i = end
+    while i > floor:
+        ch = text[i - 1]
+        if ch.isalnum() or ch in _FILENAME_CHARS:
+            i -= 1
+        elif ch == "." and i < end and not text[i].isspace():
+            i -= 1
+        else:
+            break
+    return i
+
+
+def _clean_filename(raw):
+    name = _CONJUNCTION.sub("", _LIST_MARKER.sub("", raw.strip()).strip())
+    # An unbalanced "(" opens an inline citation: "... (foo.pdf, Page 3)"
+    depth = 0
+    for idx in range(len(name) - 1, -1, -1):
+        if name[idx] == ")":
+            depth += 1
+        elif name[idx] == "(":
+            if depth == 0:
+                return name[idx + 1:].strip()
+            depth -= 1
+    return name
+
+
+def _parse_pages(text, pos):
+    """Parse a page list at pos; return (pages, end) or (None, pos)"""
+    pages = []
+    m = _PAGE_ITEM.match(text, pos)
+    while m:
+        start = int(m.group(1))
+        end = int(m.group(2)) if m.group(2) else start
+        if start <= end <= start + MAX_PAGE_RANGE:
+            pages.extend(range(start, end + 1))
+        pos = m.end()
+        sep = _PAGE_SEPARATOR.match(text, pos)
+        if not sep:
+            break
+        m = _PAGE_ITEM.match(text, sep.end())
+    return (pages or None), pos
+
+
+def iter_references(text):
+    """Yield (filename, pages) for every reference in text, in order of appearance"""
+    floor = 0
+    for ext in _PDF_EXT.finditer(text):
+        line_start = text.rfind("\n", floor, ext.start()) + 1
+        start = _filename_start(text, ext.start(), max(floor, line_start, ext.start() - MAX_FILENAME_LENGTH))
+        keyword = _PAGE_KEYWORD.match(text, ext.end())
+        if not keyword:
+            # "foo.pdf" alone on its line, the page list on the next
+            brk = _LINE_BREAK.match(text, ext.end())
+            keyword = _PAGE_KEYWORD.match(text, brk.end()) if brk else None
+        pages, end = _parse_pages(text, keyword.end()) if keyword else (None, ext.end())
+        if pages is None:
+            # Later filenames must not extend back over this one
+            floor = ext.end()
+            continue
+        filename = _clean_filename(text[start:ext.end()])
+        if len(filename) > 4:
+            yield filename, pages
+        floor = end
+
+
+class ReferenceExtractor:
+    """Accumulates {filename: sorted pages} references, optionally from streamed text.
+
+    feed() buffers partial lines and only parses completed ones, so a streamed
+    answer is scanned once in total. A reference spans at most two lines, so a
+    completed line ending in a filename waits for the next one. Filenames are
+    deduplicated case-insensitively, keeping the first spelling seen.
+    """
+
+    def __init__(self):
+        self._pending = []
+        self._pages = {}  # casefolded filename -> set of pages
+        self._names = {}  # casefolded filename -> first spelling
+
+    @property
+    def references(self):
+        return {self._names[key]: sorted(pages) for key, pages in self._pages.items()}
+
+    def _merge(self, text):
+        changed = {}  # ordered set: references are reported in order of appearance
+        for filename, pages in iter_references(text):
+            key = filename.casefold()
+            known = self._pages.setdefault(key, set())
+            self._names.setdefault(key, filename)
+            before = len(known)
+            known.update(pages)
+            if len(known) != before:
+                changed[key] = None
+        return {self._names[key]: sorted(self._pages[key]) for key in changed}
+
+    def feed(self, text):
+        """Add streamed text; return {filename: pages} for references that changed"""
+        cut = text.rfind("\n")
+        if cut < 0:
+            self._pending.append(text)
+            return {}
+        self._pending.append(text[: cut + 1])
+        complete = "".join(self._pending)
+        self._pending = [text[cut + 1:]]
+        last_line = complete.rfind("\n", 0, len(complete) - 1) + 1
+        if _DANGLING_FILENAME.search(complete, last_line):
+            # Its page list may start the next line
+            self._pending.insert(0, complete[last_line:])
+            complete = complete[:last_line]
+        return self._merge(complete) if complete else {}
+
+    def close(self):
+        """Parse whatever is left after the stream ends"""
+        pending, self._pending = "".join(self._pending), []
+        return self._merge(pending) if pending.strip() else {}
+
+
+def extract_references(text):
+    """Return {filename: sorted unique pages} for all references in text"""
+    extractor = ReferenceExtractor()
+    extractor.feed(text)
+    extractor.close()
+    return extractor.references
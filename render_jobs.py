@@ -0,0 +1,261 @@
+import collections
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+RENDER_PROCESSES = int(os.environ.get("RENDER_PROCESSES", str(max(1, min(4, (os.cpu_count() or 2) // 2)))))
+# Jobs driving fetch + render steps; only the render step holds a process
+RENDER_JOB_THREADS = int(os.environ.get("RENDER_JOB_THREADS", str(RENDER_PROCESSES * 2)))
+RENDER_MAX_QUEUE = int(os.environ.get("RENDER_MAX_QUEUE", "64"))
+RENDER_DEFAULT_DEADLINE = float(os.environ.get("RENDER_DEFAULT_DEADLINE", "60"))
+# Finished jobs are kept this long for polling
+RENDER_JOB_RETENTION = float(os.environ.get("RENDER_JOB_RETENTION", "300"))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED, EXPIRED = "queued", "running", "done", "failed", "cancelled", "expired"
+FINAL_STATES = (DONE, FAILED, CANCELLED, EXPIRED)
+
+
+class QueueFull(Exception):
+    """Raised by submit() when RENDER_MAX_QUEUE jobs are already pending"""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobExpired(Exception):
+    pass
+
+
+class Job:
+    """One render request. Its task runs on a job thread and calls job.cpu() for CPU work."""
+
+    def __init__(self, task, args, kwargs, owner, deadline, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.owner = owner
+        self.task = task
+        self.args = args
+        self.kwargs = kwargs
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.exception = None
+        self.submitted = time.monotonic()
+        self.started = None
+        self.finished = None
+        self.deadline = self.submitted + deadline
+        self._done = threading.Event()
+        self._callbacks = []
+        self._cpu_future = None
+        self._pool = None
+
+    def remaining(self):
+        return self.deadline - time.monotonic()
+
+    def check(self):
+        """Raise if the job was cancelled or ran past its deadline"""
+        if self.status == CANCELLED:
+            raise JobCancelled(self.id)
+        if self.remaining() <= 0:
+            raise JobExpired(self.id)
+
+    def cpu(self, fn, *args, **kwargs):
+        """Run fn in the render process pool, waiting at most until the job's deadline.
+
+        A running process call cannot be interrupted; on cancel or expiry its result
+        is discarded when it completes.
+        """
+        self.check()
+        self._cpu_future = self._pool.submit_cpu(fn, *args, **kwargs)
+        try:
+            return self._cpu_future.result(timeout=max(self.remaining(), 0))
+        except FutureTimeout:
+            self._cpu_future.cancel()
+            raise JobExpired(self.id) from None
+        finally:
+            self.check()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def add_done_callback(self, fn):
+        """Call fn(job) on the job thread once the job reaches a final state"""
+        if self._done.is_set():
+            fn(self)
+        else:
+            self._callbacks.append(fn)
+
+    def to_dict(self):
+        now = time.monotonic()
+        started = self.started or now
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "error": self.error,
+            "queued_ms": round((started - self.submitted) * 1000, 1),
+            "run_ms": round(((self.finished or now) - started) * 1000, 1) if self.started else 0.0,
+            "deadline_in_ms": round(max(self.remaining(), 0) * 1000, 1),
+        }
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))], 1)
+
+
+class RenderJobs:
+    """Bounded executor for highlight jobs: a backend fetch, then CPU-heavy PDF work.
+
+    Highlighting itself happens in the backend; the CPU step here is rasterizing
+    previews, which holds the GIL, so it runs in worker processes rather than on
+    request threads. Jobs and their results live in the web worker that accepted
+    them; pools are created lazily and recreated after fork.
+    """
+
+    def __init__(self, processes=RENDER_PROCESSES, threads=RENDER_JOB_THREADS, max_queue=RENDER_MAX_QUEUE):
+        self.processes = processes
+        self.threads = threads
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._pid = None
+        self._procs = None
+        self._threads = None
+        self._jobs = {}
+        self._cpu_pending = 0
+        self._latencies = collections.deque(maxlen=512)
+        self.counts = collections.Counter()
+
+    def _pools(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    # spawn: forking a threaded web worker can copy held locks into the child
+                    context = multiprocessing.get_context("spawn")
+                    self._procs = ProcessPoolExecutor(max_workers=self.processes, mp_context=context)
+                    self._threads = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="render-job")
+                    self._jobs = {}
+                    self._cpu_pending = 0
+                    self._pid = pid
+        return self._procs, self._threads
+
+    def submit_cpu(self, fn, *args, **kwargs):
+        procs, _ = self._pools()
+        with self._lock:
+            self._cpu_pending += 1
+        future = procs.submit(fn, *args, **kwargs)
+        future.add_done_callback(self._cpu_done)
+        return future
+
+    def _cpu_done(self, _future):
+        with self._lock:
+            self._cpu_pending -= 1
+
+    def submit(self, task, *args, owner=None, deadline=None, kind=None, **kwargs):
+        """Queue task(job, *args, **kwargs) on a job thread and return the Job"""
+        _, threads = self._pools()
+        job = Job(task, args, kwargs, owner, deadline or RENDER_DEFAULT_DEADLINE, kind)
+        job._pool = self
+        with self._lock:
+            self._prune()
+            pending = sum(1 for j in self._jobs.values() if j.status in (QUEUED, RUNNING))
+            if pending >= self.max_queue:
+                self.counts["rejected"] += 1
+                raise QueueFull(f"{pending} render jobs pending")
+            self._jobs[job.id] = job
+            self.counts["submitted"] += 1
+        threads.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        try:
+            with self._lock:
+                if job.status == CANCELLED:
+                    return
+                job.status, job.started = RUNNING, time.monotonic()
+            job.check()
+            job.result = job.task(job, *job.args, **job.kwargs)
+            with self._lock:
+                job.check()
+                job.status = DONE
+        except JobCancelled:
+            job.status, job.result = CANCELLED, None
+        except JobExpired:
+            job.status, job.result, job.error = EXPIRED, None, "deadline exceeded"
+        except Exception as e:
+            job.status, job.error, job.exception = FAILED, str(e), e
+        finally:
+            job.finished = time.monotonic()
+            with self._lock:
+                self.counts[job.status] += 1
+                if job.started:
+                    self._latencies.append(
+                        ((job.started - job.submitted) * 1000, (job.finished - job.submitted) * 1000)
+                    )
+            job._done.set()
+            for fn in job._callbacks:
+                fn(job)
+
+    def run(self, task, *args, deadline=None, kind=None, **kwargs):
+        """Submit a job and wait for it; return its result or raise what the task raised"""
+        job = self.submit(task, *args, deadline=deadline, kind=kind, **kwargs)
+        job.wait(max(job.remaining(), 0) + 1)
+        if job.status == DONE:
+            return job.result
+        if job.status in (QUEUED, RUNNING, EXPIRED):
+            self.cancel(job.id)
+            raise JobExpired(job.id)
+        raise job.exception or JobCancelled(job.id)
+
+    def get(self, job_id, owner=None):
+        job = self._jobs.get(job_id)
+        if job is None or (owner is not None and job.owner != owner):
+            return None
+        return job
+
+    def cancel(self, job_id, owner=None):
+        job = self.get(job_id, owner)
+        if job is None:
+            return None
+        with self._lock:
+            if job.status not in (QUEUED, RUNNING):
+                return job
+            job.status = CANCELLED
+        if job._cpu_future is not None:
+            job._cpu_future.cancel()
+        return job
+
+    def _prune(self):
+        cutoff = time.monotonic() - RENDER_JOB_RETENTION
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished < cutoff]:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+            queue_ms = [q for q, _ in self._latencies]
+            total_ms = [t for _, t in self._latencies]
+            return {
+                "processes": self.processes,
+                "max_queue": self.max_queue,
+                "queued": sum(1 for j in jobs if j.status == QUEUED),
+                "running": sum(1 for j in jobs if j.status == RUNNING),
+                "cpu_pending": self._cpu_pending,
+                "counts": dict(self.counts),
+                "queue_ms_p50": _percentile(queue_ms, 50),
+                "queue_ms_p95": _percentile(queue_ms, 95),
+                "latency_ms_p50": _percentile(total_ms, 50),
+                "latency_ms_p95": _percentile(total_ms, 95),
+                "latency_ms_p99": _percentile(total_ms, 99),
+            }
+
+
+render_jobs = RenderJobs()
@@ -0,0 +1,354 @@
+import functools
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, make_response, request, session
+
+from singleflight import coalescer
+
+# CACHE_BACKEND: "memory" (per worker), "sqlite" (shared by the workers on one host;
+# gunicorn.conf.py picks it when it starts several) or "redis" (shared by every
+# instance; requires the optional redis package and REDIS_URL)
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory").lower()
+CACHE_DEFAULT_TTL = float(os.environ.get("CACHE_DEFAULT_TTL", "30"))
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "2048"))
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Defaults to a file in a per-user directory under the temp dir (see private_temp_dir)
+CACHE_SQLITE_PATH = os.environ.get("CACHE_SQLITE_PATH")
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+
+class MemoryCacheBackend:
+    """In-process LRU store with per-entry TTL and a total size bound"""
+
+    name = "memory"
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._counters = {}
+        self._bytes = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def get_counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def _remove(self, key):
+        _, value = self._entries.pop(key)
+        self._bytes -= len(key) + len(value)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "evictions": self.evictions}
+
+
+def private_temp_dir(name="dot-rag-frontend"):
+    """Return a directory under the temp dir that only the current user can enter"""
+    path = os.path.join(tempfile.gettempdir(), f"{name}-{os.getuid()}")
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    # Refuse a directory someone else created (or loosened) in the shared temp dir
+    if not os.path.isdir(path) or os.path.islink(path) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise RuntimeError(f"{path} must be a directory owned by this user with mode 0700")
+    return path
+
+
+class SQLiteCacheBackend:
+    """Cache store in a local SQLite file, shared by all workers on the same host.
+
+    Also serves as a local stand-in for a shared cache such as Redis.
+    """
+
+    name = "sqlite"
+
+    _EVICT_EVERY = 64
+
+    def __init__(self, path=CACHE_SQLITE_PATH, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.path = path or os.path.join(private_temp_dir(), "cache.sqlite")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._writes = 0
+        self.evictions = 0
+        # The store holds session data and speech tokens: keep it readable by this user
+        # only. SQLite gives the -wal and -shm files the database file's permissions.
+        os.close(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600))
+        os.chmod(self.path, 0o600)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value BLOB, size INTEGER, expires_at REAL, accessed_at REAL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER)")
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return bytes(row[0])
+
+    def set(self, key, value, ttl):
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, value, size, now + ttl, now),
+        )
+        self._writes += 1
+        if self._writes % self._EVICT_EVERY == 0:
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        while count > self.max_entries or total > self.max_bytes:
+            row = conn.execute("SELECT key, size FROM cache ORDER BY accessed_at LIMIT 1").fetchone()
+            if row is None:
+                break
+            conn.execute("DELETE FROM cache WHERE key = ?", (row[0],))
+            count, total = count - 1, total - row[1]
+            self.evictions += 1
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def get_counter(self, key):
+        row = self._conn().execute("SELECT value FROM counters WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def incr(self, key):
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO counters (key, value) VALUES (?, 1) ON CONFLICT(key) DO UPDATE SET value = value + 1",
+            (key,),
+        )
+        return self.get_counter(key)
+
+    def stats(self):
+        count, total = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        return {"entries": count, "bytes": total, "evictions": self.evictions, "path": self.path}
+
+
+class RedisCacheBackend:
+    """Cache store in Redis; eviction is left to the server's maxmemory policy"""
+
+    name = "redis"
+
+    def __init__(self, url=REDIS_URL):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def set(self, key, value, ttl):
+        self._client.set(key, value, px=int(ttl * 1000))
+
+    def delete(self, key):
+        self._client.delete(key)
+
+    def get_counter(self, key):
+        value = self._client.get(key)
+        return int(value) if value else 0
+
+    def incr(self, key):
+        return self._client.incr(key)
+
+    def stats(self):
+        return {}
+
+
+def _create_backend(name):
+    if name == "sqlite":
+        return SQLiteCacheBackend()
+    if name == "redis":
+        try:
+            return RedisCacheBackend()
+        except ImportError:
+            print("redis package not installed; falling back to in-memory response cache")
+    return MemoryCacheBackend()
+
+
+class ResponseCache:
+    """Caches read-endpoint responses per (user, endpoint, query).
+
+    Entries for a user are invalidated by bumping that user's generation number,
+    which is part of every key, so invalidation is O(1) on every backend.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def key(self, user_id, endpoint, query=""):
+        """Key of an entry under the user's current generation.
+
+        A caller that builds the entry itself should take the key before reading
+        the data and store under that key, so an invalidation in between is not lost.
+        """
+        generation = self.backend.get_counter(f"gen:{user_id}")
+        return f"resp:{user_id}:{generation}:{endpoint}:{query}"
+
+    def get(self, user_id, endpoint, query=""):
+        return self.get_entry(self.key(user_id, endpoint, query))
+
+    def set(self, user_id, endpoint, query, entry, ttl):
+        self.set_entry(self.key(user_id, endpoint, query), entry, ttl)
+
+    def get_entry(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return json.loads(value) if value is not None else None
+
+    def set_entry(self, key, entry, ttl):
+        self.backend.set(key, json.dumps(entry).encode("utf-8"), ttl)
+
+    def invalidate_user(self, user_id):
+        if not user_id:
+            return
+        self.backend.incr(f"gen:{user_id}")
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            data = {
+                "backend": self.backend.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+        data.update(self.backend.stats())
+        return data
+
+
+response_cache = ResponseCache(_create_backend(CACHE_BACKEND))
+
+
+def cached_view(endpoint, ttl=None):
+    """Cache successful JSON responses of a read-only view per authenticated user.
+
+    The TTL defaults to CACHE_TTL_<ENDPOINT>, then CACHE_DEFAULT_TTL.
+    """
+    if ttl is None:
+        ttl = float(os.environ.get(f"CACHE_TTL_{endpoint.upper()}", CACHE_DEFAULT_TTL))
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            user_id = session.get("user_id")
+            if not session.get("logged_in") or not user_id:
+                return view(*args, **kwargs)
+            query = request.query_string.decode("utf-8", "replace")
+            key = response_cache.key(user_id, endpoint, query)
+            entry = response_cache.get_entry(key)
+            if entry is not None:
+                resp = Response(entry["body"], status=entry["status"], mimetype=entry["mimetype"])
+                resp.headers["X-Cache"] = "HIT"
+                return resp
+            # Concurrent identical misses (page-load bursts) share one backend call
+            flight = coalescer.acquire(("cached_view", user_id, endpoint, query), endpoint)
+            try:
+                if flight.waited:
+                    # The generation may have moved on while we waited
+                    key = response_cache.key(user_id, endpoint, query)
+                    entry = response_cache.get_entry(key)
+                    if entry is not None:
+                        flight.release(deduped=True)
+                        resp = Response(entry["body"], status=entry["status"], mimetype=entry["mimetype"])
+                        resp.headers["X-Cache"] = "HIT"
+                        return resp
+                resp = make_response(view(*args, **kwargs))
+                if resp.status_code == 200 and not resp.is_streamed:
+                    # Stored under the generation the view started from: if the user's
+                    # data changed meanwhile the entry is already stale and never read
+                    response_cache.set_entry(
+                        key,
+                        {"status": resp.status_code, "mimetype": resp.mimetype, "body": resp.get_data(as_text=True)},
+                        ttl,
+                    )
+            finally:
+                flight.release()
+            resp.headers["X-Cache"] = "MISS"
+            return resp
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate_user(user_id):
+    response_cache.invalidate_user(user_id)
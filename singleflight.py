@@ -0,0 +1,125 @@
+import collections
+import hashlib
+import os
+import threading
+import time
+
+# Directory for cross-worker lock files; unset keeps coalescing within each worker
+SINGLEFLIGHT_LOCK_DIR = os.environ.get("SINGLEFLIGHT_LOCK_DIR")
+# Longest a request waits for an identical in-flight one before fetching itself
+SINGLEFLIGHT_WAIT = float(os.environ.get("SINGLEFLIGHT_WAIT", "120"))
+_POLL_INTERVAL = 0.05
+
+
+class Flight:
+    """Held by the request doing the fetch for a key; release() lets waiters re-check"""
+
+    def __init__(self, coalescer, key, route, waited, lock=None, lock_file=None):
+        self._coalescer = coalescer
+        self.key = key
+        self.route = route
+        self.waited = waited
+        self._lock = lock
+        self._lock_file = lock_file
+        self._released = False
+
+    def release(self, deduped=False):
+        """Let the next waiter go; deduped=True when this request reused another's result"""
+        if self._released:
+            return
+        self._released = True
+        if self._lock_file is not None:
+            import fcntl
+
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+        if self._lock is not None:
+            self._coalescer._release_local(self.key, self._lock)
+        if deduped:
+            self._coalescer._count(self.route, "deduped")
+
+
+class SingleFlight:
+    """Coalesces identical concurrent fetches: one request fetches, the rest wait.
+
+    acquire(key) returns a Flight once no other request holds the key. A request
+    that had to wait (flight.waited) re-checks the cache the first one filled and
+    only fetches itself on a miss. Keys are locked per worker with threading locks
+    (cooperative under gevent) and, with a lock directory, across workers with
+    flock()ed files. Callers release the flight when their result is stored.
+    """
+
+    def __init__(self, lock_dir=SINGLEFLIGHT_LOCK_DIR, wait=SINGLEFLIGHT_WAIT):
+        self.lock_dir = lock_dir
+        self.wait = wait
+        if lock_dir:
+            os.makedirs(lock_dir, exist_ok=True)
+        self._mutex = threading.Lock()
+        self._locks = {}  # key -> [lock, holders and waiters]
+        self._counts = collections.defaultdict(collections.Counter)
+
+    def _count(self, route, name):
+        with self._mutex:
+            self._counts[route][name] += 1
+
+    def _release_local(self, key, lock=None):
+        if lock is not None:
+            lock.release()
+        with self._mutex:
+            entry = self._locks[key]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    def acquire(self, key, route="default", timeout=None):
+        """Block until this request may fetch key; returns a Flight to release afterwards"""
+        timeout = self.wait if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._mutex:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        lock = entry[0]
+        waited = not lock.acquire(blocking=False)
+        if waited and not lock.acquire(timeout=max(deadline - time.monotonic(), 0)):
+            self._release_local(key)
+            self._count(route, "timed_out")
+            return Flight(self, key, route, waited=True)
+        lock_file = None
+        if self.lock_dir:
+            lock_file, file_waited = self._lock_file(key, deadline)
+            if lock_file is None:
+                self._release_local(key, lock)
+                self._count(route, "timed_out")
+                return Flight(self, key, route, waited=True)
+            waited = waited or file_waited
+        self._count(route, "waited" if waited else "leaders")
+        return Flight(self, key, route, waited, lock=lock, lock_file=lock_file)
+
+    def _lock_file(self, key, deadline):
+        import fcntl
+
+        name = hashlib.sha1(repr(key).encode("utf-8")).hexdigest() + ".lock"
+        fh = open(os.path.join(self.lock_dir, name), "a")
+        waited = False
+        while True:
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fh, waited
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    fh.close()
+                    return None, True
+                waited = True
+                time.sleep(_POLL_INTERVAL)
+
+    def stats(self):
+        with self._mutex:
+            routes = {route: dict(counts) for route, counts in self._counts.items()}
+            in_flight = len(self._locks)
+        for counts in routes.values():
+            total = counts.get("leaders", 0) + counts.get("waited", 0) + counts.get("timed_out", 0)
+            counts["dedup_ratio"] = round(counts.get("deduped", 0) / total, 4) if total else 0.0
+        return {"cross_worker": bool(self.lock_dir), "in_flight": in_flight, "routes": routes}
+
+
+coalescer = SingleFlight()
@@ -0,0 +1,216 @@
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from response_cache import MemoryCacheBackend, SQLiteCacheBackend
+from singleflight import coalescer
+
+SPEECH_TOKEN_ISSUER_URL = os.environ.get(
+    "SPEECH_TOKEN_ISSUER_URL", "https://{region}.api.cognitive.microsoft.com/sts/v1.0/issueToken"
+)
+# Issuer timeouts: "<read>" or "<connect>,<read>" seconds
+SPEECH_TOKEN_TIMEOUT = tuple(float(p) for p in os.environ.get("SPEECH_TOKEN_TIMEOUT", "5,10").split(",") if p.strip())
+# Azure speech tokens are valid for 10 minutes; treat them as expired a minute early
+SPEECH_TOKEN_TTL = float(os.environ.get("SPEECH_TOKEN_TTL", "540"))
+# Tokens older than TTL - REFRESH_AHEAD are still served but replaced in the background
+SPEECH_TOKEN_REFRESH_AHEAD = float(os.environ.get("SPEECH_TOKEN_REFRESH_AHEAD", "180"))
+# "sqlite" shares tokens between the workers on a host; "memory" keeps one per worker
+SPEECH_TOKEN_STORE = os.environ.get("SPEECH_TOKEN_STORE", "sqlite").lower()
+# Keep refreshing in the background once a region's token has been requested
+SPEECH_TOKEN_BACKGROUND_REFRESH = os.environ.get("SPEECH_TOKEN_BACKGROUND_REFRESH", "1").lower() in ("1", "true", "yes")
+
+
+class SpeechTokenError(Exception):
+    def __init__(self, message, detail=None):
+        super().__init__(message)
+        self.detail = detail
+
+
+def _create_store():
+    if SPEECH_TOKEN_STORE == "sqlite":
+        return SQLiteCacheBackend()
+    return MemoryCacheBackend(max_entries=64)
+
+
+class SpeechTokenManager:
+    """Issues Azure speech tokens per region and subscription key and serves them from a shared store.
+
+    A fresh token is returned straight from the store. In the last REFRESH_AHEAD
+    seconds of its life it is still returned while one background refresh replaces
+    it (stale-while-revalidate), so a slow issuer only delays the refresh. Only a
+    missing or expired token makes the caller wait for the issuer; concurrent
+    callers then share one issuance.
+
+    The issuer is called through a session of its own, without the backend's
+    pool, retries and timeouts. Store keys carry a hash of the subscription key,
+    so a rotated key never gets a token issued for the old one.
+    """
+
+    def __init__(self, store=None, issuer_url=SPEECH_TOKEN_ISSUER_URL, ttl=SPEECH_TOKEN_TTL,
+                 refresh_ahead=SPEECH_TOKEN_REFRESH_AHEAD, background=SPEECH_TOKEN_BACKGROUND_REFRESH,
+                 timeout=SPEECH_TOKEN_TIMEOUT):
+        self._store = store
+        self.issuer_url = issuer_url
+        self.timeout = timeout[0] if len(timeout) == 1 else timeout
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.background = background
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._refreshers = {}  # region -> (pid, store key, thread)
+        self._session = None
+        self._session_pid = None
+        self._issued_at = collections.deque(maxlen=1024)
+        self.counts = collections.Counter()
+        self.last_issue_ms = None
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = _create_store()
+        return self._store
+
+    def _get_session(self):
+        # Per process, like the backend session: never share sockets across a fork
+        pid = os.getpid()
+        with self._lock:
+            if self._session is None or self._session_pid != pid:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=0)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session, self._session_pid = session, pid
+            return self._session
+
+    def _key(self, region, key):
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+        return f"speech_token:{region}:{digest}"
+
+    def _load(self, region, key):
+        raw = self.store.get(self._key(region, key))
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        return entry if time.time() - entry["issued_at"] < self.ttl else None
+
+    def _issue(self, region, key):
+        start = time.perf_counter()
+        try:
+            resp = self._get_session().post(
+                self.issuer_url.format(region=region),
+                headers={"Ocp-Apim-Subscription-Key": key, "Content-Length": "0"},
+                timeout=self.timeout,
+            )
+        except Exception as e:
+            self._count("issue_failures")
+            raise SpeechTokenError("Failed to acquire speech token", str(e)) from e
+        if resp.status_code != 200:
+            self._count("issue_failures")
+            raise SpeechTokenError("Failed to acquire speech token", resp.text)
+        entry = {"token": resp.text, "issued_at": time.time()}
+        self.store.set(self._key(region, key), json.dumps(entry).encode("utf-8"), self.ttl)
+        with self._lock:
+            self.counts["issued"] += 1
+            self._issued_at.append(time.time())
+            self.last_issue_ms = round((time.perf_counter() - start) * 1000, 1)
+        return entry
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def get_token(self, region, key):
+        """Return a valid token for region, issuing one with the subscription key if needed"""
+        if self.background:
+            self._ensure_refresher(region, key)
+        entry = self._load(region, key)
+        if entry is not None:
+            if time.time() - entry["issued_at"] < self.ttl - self.refresh_ahead:
+                self._count("hits")
+            else:
+                self._count("stale_served")
+                self._refresh_async(region, key)
+            return entry["token"]
+        self._count("misses")
+        flight = coalescer.acquire(("speech_token", self._key(region, key)), "speech_token")
+        try:
+            if flight.waited:
+                entry = self._load(region, key)
+                if entry is not None:
+                    flight.release(deduped=True)
+                    return entry["token"]
+            return self._issue(region, key)["token"]
+        finally:
+            flight.release()
+
+    def _refresh_async(self, region, key):
+        store_key = self._key(region, key)
+        with self._lock:
+            if store_key in self._refreshing:
+                return
+            self._refreshing.add(store_key)
+        threading.Thread(target=self._refresh, args=(region, key), name="speech-token-refresh", daemon=True).start()
+
+    def _refresh(self, region, key):
+        try:
+            entry = self._load(region, key)
+            # Another worker may have refreshed it already
+            if entry is None or time.time() - entry["issued_at"] >= self.ttl - self.refresh_ahead:
+                self._issue(region, key)
+        except SpeechTokenError:
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(self._key(region, key))
+
+    def _ensure_refresher(self, region, key):
+        pid = os.getpid()
+        store_key = self._key(region, key)
+        with self._lock:
+            current = self._refreshers.get(region)
+            if current and current[0] == pid and current[1] == store_key and current[2].is_alive():
+                return
+            # A refresher for a replaced subscription key stops at its next check
+            thread = threading.Thread(
+                target=self._refresh_loop, args=(region, key), name="speech-token-refresher", daemon=True
+            )
+            self._refreshers[region] = (pid, store_key, thread)
+        thread.start()
+
+    def _refresh_loop(self, region, key):
+        interval = max(self.refresh_ahead / 2, 1.0)
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                current = self._refreshers.get(region)
+            if current is None or current[2] is not threading.current_thread():
+                return
+            entry = self._load(region, key)
+            if entry is not None and time.time() - entry["issued_at"] >= self.ttl - self.refresh_ahead:
+                self._refresh(region, key)
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            counts = dict(self.counts)
+            recent = sum(1 for t in self._issued_at if now - t < 3600)
+            last_issue_ms = self.last_issue_ms
+        served = counts.get("hits", 0) + counts.get("stale_served", 0)
+        lookups = served + counts.get("misses", 0)
+        return {
+            "store": getattr(self._store, "name", SPEECH_TOKEN_STORE),
+            "counts": counts,
+            "hit_ratio": round(served / lookups, 4) if lookups else 0.0,
+            "issued_last_hour": recent,
+            "issue_rate_per_min": round(recent / 60, 3),
+            "last_issue_ms": last_issue_ms,
+        }
+
+
+speech_tokens = SpeechTokenManager()
@@ -0,0 +1,94 @@
+"""Worker startup: lazy heavy imports, master pre-warming and boot timing.
+
+STARTUP_MODE selects where PyMuPDF and scikit-learn get loaded:
+  lazy    - on first use in each worker (default), so workers that only proxy
+            chat never load them
+  preload - once in the gunicorn master (preload_app), exercised by prewarm()
+            and frozen out of the GC, so forked workers share those pages
+            copy-on-write and the first highlight pays no import
+"""
+import gc
+import importlib
+import os
+import threading
+import time
+import types
+
+STARTUP_MODE = os.environ.get("STARTUP_MODE", "lazy").lower()
+
+_lock = threading.Lock()
+_loads = {}  # module name -> {"ms": import time, "by": "first_use" | "prewarm"}
+_state = {"boot_seconds": None, "prewarm_ms": None}
+
+
+class LazyModule(types.ModuleType):
+    """Stands in for a module and imports it on first attribute access"""
+
+    def __getattr__(self, attr):
+        return getattr(self._load("first_use"), attr)
+
+    def _load(self, by):
+        name = self.__name__
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        record_import(name, time.perf_counter() - start, by)
+        # Later lookups hit the copied attributes without going through __getattr__
+        self.__dict__.update(module.__dict__)
+        return module
+
+
+def record_import(name, seconds, by="first_use"):
+    """Note the first (cold) import of a heavy dependency in this process"""
+    with _lock:
+        _loads.setdefault(name, {"ms": round(seconds * 1000, 1), "by": by})
+
+
+def lazy_import(name):
+    """Module proxy for name; the real import happens on first use"""
+    return LazyModule(name)
+
+
+def prewarm():
+    """Import and exercise the PDF/ML stack once, then freeze it out of the GC.
+
+    Meant for the gunicorn master with preload_app: everything loaded here is
+    inherited by the forked workers.
+    """
+    try:
+        from . import utility
+        from .pdf_index import _get_vectorizer
+    except ImportError:  # imported as a top-level module (gunicorn.conf.py)
+        import utility
+        from pdf_index import _get_vectorizer
+
+    start = time.perf_counter()
+    fitz = utility.fitz
+    if isinstance(fitz, LazyModule):
+        fitz._load("prewarm")
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "prewarm highlight text", fontsize=10)
+    for rect in page.search_for("highlight"):
+        page.add_highlight_annot(rect)
+    doc.tobytes()
+    doc.close()
+
+    vectorizer = _get_vectorizer(by="prewarm")
+    from sklearn.preprocessing import normalize
+
+    normalize(vectorizer.transform(["prewarm highlight text"]))
+    _state["prewarm_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    # Keep the collector from touching (and so copying) the inherited objects
+    gc.collect()
+    gc.freeze()
+
+
+def record_boot(seconds):
+    """Called in each worker once it has loaded the app"""
+    _state["boot_seconds"] = round(seconds, 4)
+
+
+def stats():
+    with _lock:
+        loads = {name: dict(info) for name, info in _loads.items()}
+    return {"mode": STARTUP_MODE, "pid": os.getpid(), **_state, "heavy_imports": loads}
@@ -0,0 +1,1494 @@
+// Cache busting: UI changes applied - Categories field and filename display
+// Global variables
+let currentUser = null;
+let currentSessionId = null;
+let currentConversationId = null;
+let isAuthenticated = false;
+let sidebarCollapsed = false; // New state for sidebar collapse
+let activeSessionId = null; // New variable to track the currently active session
+// Add a global isAdmin flag
+let isAdmin = false;
+// File selection variables
+let selectedFiles = []; // Changed to multiple file selection (max 2)
+let availableFiles = [];
+let availableFilesPreloaded = false;
+
+// DOM elements
+const sidebar = document.getElementById('sidebar');
+const sidebarResizer = document.getElementById('sidebarResizer');
+const newChatBtn = document.getElementById('newChatBtn');
+const chatHistory = document.getElementById('chatHistory');
+const userSection = document.getElementById('userSection');
+const userAvatar = document.getElementById('userAvatar');
+const userEmail = document.getElementById('userEmail');
+const userStatus = document.getElementById('userStatus');
+const logoutBtn = document.getElementById('logoutBtn');
+const uploadBtn = document.getElementById('uploadBtn');
+const deleteAllBtn = document.getElementById('deleteAllBtn');
+const messagesContainer = document.getElementById('messagesContainer');
+const chatForm = document.getElementById('chatForm');
+const messageInput = document.getElementById('messageInput');
+const sendButton = document.getElementById('sendButton');
+const micButton = document.getElementById('micButton');
+const loading = document.getElementById('loading');
+const loginModal = document.getElementById('loginModal');
+const loginForm = document.getElementById('loginForm');
+const loginEmail = document.getElementById('loginEmail');
+const loginPassword = document.getElementById('loginPassword');
+const loginError = document.getElementById('loginError');
+const uploadModal = document.getElementById('uploadModal');
+const uploadForm = document.getElementById('uploadForm');
+const pdfFiles = document.getElementById('pdfFiles');
+const filename = document.getElementById('filename');
+const projectCode = document.getElementById('projectCode');
+const labelTag = document.getElementById('labelTag');
+const uploadSubmitBtn = document.getElementById('uploadSubmitBtn');
+const progressFill = document.getElementById('progressFill');
+const uploadStatus = document.getElementById('uploadStatus');
+const uploadFileList = document.getElementById('uploadFileList');
+const toggleSidebar = document.getElementById('toggleSidebar'); // This element is removed from HTML
+const hamburgerBtn = document.getElementById('hamburgerBtn'); // New hamburger button
+// File selection elements
+const selectFilesBtn = document.getElementById('selectFilesBtn');
+const fileSelectionModal = document.getElementById('fileSelectionModal');
+const fileList = document.getElementById('fileList');
+const confirmFileSelectionBtn = document.getElementById('confirmFileSelectionBtn');
+const cancelFileSelectionBtn = document.getElementById('cancelFileSelectionBtn');
+const closeFileSelectionModalBtn = document.getElementById('closeFileSelectionModalBtn');
+const selectedFilesDisplay = document.getElementById('selectedFilesDisplay');
+
+// Initialize
+document.addEventListener('DOMContentLoaded', function() {
+    checkAuthStatus();
+    setupEventListeners();
+    autoResizeTextarea();
+    // Render initial bot message using addMessage for correct avatar
+    clearMessages();
+    addMessage('Hi, I am the DoT chatbot. How can I help you?', false);
+    if (typeof initSpeech === 'function') initSpeech();
+});
+
+// Auth state, sessions and available files in one round trip
+async function fetchBootstrap() {
+    const response = await fetch('/bootstrap');
+    const data = await response.json();
+    return data.responses || {};
+}
+
+// Use the sessions and files that came with /bootstrap
+function applyBootstrapParts(parts) {
+    const sessions = parts.user_sessions;
+    if (sessions && sessions.status === 200) {
+        displayChatHistory(sessions.body.sessions);
+    } else {
+        loadChatHistory();
+    }
+    const files = parts.available_files;
+    if (files && files.status === 200) {
+        availableFiles = files.body.files || [];
+        availableFilesPreloaded = true;
+    }
+}
+
+// Check authentication status
+async function checkAuthStatus() {
+    try {
+        const parts = await fetchBootstrap();
+        const data = parts.check_auth ? parts.check_auth.body : {};
+
+        if (data.authenticated) {
+            currentUser = {
+                user_id: data.user_id,
+                email: data.email
+            };
+            isAuthenticated = true;
+
+            if (data.isadmin) {
+                isAdmin = true;
+            }
+            updateUIForAuthenticatedUser();
+            applyBootstrapParts(parts);
+        } else {
+            updateUIForUnauthenticatedUser();
+        }
+    } catch (error) {
+        console.error('Error checking auth status:', error);
+        updateUIForUnauthenticatedUser();
+    }
+}
+
+// Update UI for authenticated user
+function updateUIForAuthenticatedUser() {
+    userEmail.textContent = currentUser.email;
+    userStatus.textContent = 'Logged in';
+    userAvatar.textContent = currentUser.email.charAt(0).toUpperCase();
+    logoutBtn.style.display = 'block';
+    // Show file selection button for all authenticated users
+    selectFilesBtn.style.display = 'flex';
+    // Only show uploadBtn for admin
+    if (isAdmin) {
+        uploadBtn.classList.remove('hidden');
+        uploadBtn.style.display = 'flex';
+    } else {
+        uploadBtn.classList.add('hidden');
+        uploadBtn.style.display = 'none';
+    }
+
+    userSection.style.cursor = 'default';
+    newChatBtn.style.display = 'flex';
+    chatHistory.style.display = '';
+
+    deleteAllBtn.classList.remove('hidden');
+    deleteAllBtn.style.display = 'flex';
+}
+
+// Update UI for unauthenticated user
+function updateUIForUnauthenticatedUser() {
+    userEmail.textContent = 'Not logged in';
+    userStatus.textContent = 'Click to login';
+    userAvatar.textContent = 'U';
+    logoutBtn.style.display = 'none';
+    uploadBtn.classList.add('hidden');
+    uploadBtn.style.display = 'none';
+    selectFilesBtn.style.display = 'none';
+    userSection.style.cursor = 'pointer';
+    newChatBtn.style.display = 'none';
+    chatHistory.style.display = 'none';
+    clearMessages();
+    deleteAllBtn.classList.add('hidden');
+    deleteAllBtn.style.display = 'none';
+}
+
+// Setup event listeners
+function setupEventListeners() {
+    // Sidebar toggle
+    // toggleSidebar.addEventListener('click', toggleSidebarView); // Removed from HTML
+
+    // New chat button
+    newChatBtn.addEventListener('click', startNewChat);
+
+    // User section click
+    userSection.addEventListener('click', handleUserSectionClick);
+
+    // Logout button
+    logoutBtn.addEventListener('click', logout);
+
+    // Upload button
+    uploadBtn.addEventListener('click', showUploadModal);
+
+    // File selection button
+    selectFilesBtn.addEventListener('click', showFileSelectionModal);
+
+    // Mic toggle (speech-to-text)
+    if (micButton) {
+        micButton.addEventListener('click', toggleSpeechRecognition);
+    }
+
+    // Chat form
+    chatForm.addEventListener('submit', handleChatSubmit);
+
+    // Message input
+    messageInput.addEventListener('input', autoResizeTextarea);
+    messageInput.addEventListener('keydown', handleKeyDown);
+
+    // Login form
+    loginForm.addEventListener('submit', handleLogin);
+
+    // Upload form
+    uploadForm.addEventListener('submit', handleUpload);
+
+    // Modal close handlers
+    document.addEventListener('click', handleModalClose);
+
+    // Form validation
+    pdfFiles.addEventListener('change', validateUploadForm);
+    filename.addEventListener('input', validateUploadForm);
+    projectCode.addEventListener('input', validateUploadForm);
+
+    // Sidebar resizing logic (improved)
+    let isResizing = false;
+    let lastDownX = 0;
+    let startWidth = 0;
+    sidebarResizer.addEventListener('mousedown', function(e) {
+        isResizing = true;
+        lastDownX = e.clientX;
+        startWidth = sidebar.offsetWidth;
+        document.body.style.cursor = 'ew-resize';
+        document.body.style.userSelect = 'none';
+    });
+    document.addEventListener('mousemove', function(e) {
+        if (!isResizing) return;
+        let newWidth = startWidth + (e.clientX - lastDownX);
+        if (newWidth < 200) newWidth = 200;
+        if (newWidth > 400) newWidth = 400;
+        sidebar.style.width = newWidth + 'px';
+    });
+    document.addEventListener('mouseup', function(e) {
+        if (isResizing) {
+            isResizing = false;
+            document.body.style.cursor = '';
+            document.body.style.userSelect = '';
+        }
+    });
+
+    // Hamburger button
+    hamburgerBtn.addEventListener('click', function() {
+        sidebar.classList.toggle('collapsed');
+    });
+
+    // Add Delete All Sessions button handler
+    const deleteAllBtn = document.getElementById('deleteAllBtn');
+    deleteAllBtn.addEventListener('click', async function() {
+        if (!isAuthenticated) return;
+        if (!confirm('Are you sure you want to delete ALL chat sessions? This cannot be undone.')) return;
+        // Get all session IDs from the current chatHistory
+        const sessionDivs = Array.from(document.querySelectorAll('.chat-session'));
+        for (const div of sessionDivs) {
+            const sessionId = div.onclick && div.onclick.session_id;
+            if (sessionId) {
+                await fetch('/delete_session', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ session_id: sessionId })
+                });
+            }
+        }
+        await loadChatHistory();
+        clearMessages();
+    });
+
+    // Close upload modal on click
+    document.getElementById('closeUploadModalBtn').addEventListener('click', hideUploadModal);
+
+    // File selection modal event listeners
+    confirmFileSelectionBtn.addEventListener('click', confirmFileSelection);
+    cancelFileSelectionBtn.addEventListener('click', hideFileSelectionModal);
+    closeFileSelectionModalBtn.addEventListener('click', hideFileSelectionModal);
+
+    // Add logic for login tabs
+    const adminLoginTab = document.getElementById('adminLoginTab');
+    const userLoginTab = document.getElementById('userLoginTab');
+    adminLoginTab.addEventListener('click', function(e) {
+        e.preventDefault();
+        adminLoginTab.classList.add('active');
+        userLoginTab.classList.remove('active');
+        loginEmail.value = 'admin@xyz.com';
+        loginPassword.value = '';
+        isAdmin = true;
+    });
+    userLoginTab.addEventListener('click', function(e) {
+        e.preventDefault();
+        userLoginTab.classList.add('active');
+        adminLoginTab.classList.remove('active');
+        loginEmail.value = 'user1@xyz.com';
+        loginPassword.value = '';
+        isAdmin = false;
+    });
+}
+
+// Toggle sidebar
+let isResizing = false;
+let lastDownX = 0;
+function toggleSidebarView() {
+    sidebarCollapsed = !sidebarCollapsed;
+    if (sidebarCollapsed) {
+        sidebar.style.display = 'none';
+    } else {
+        sidebar.style.display = 'flex';
+    }
+}
+
+// --- New Chat logic ---
+let newChatPending = false;
+async function startNewChat() {
+    if (!isAuthenticated) {
+        showLoginModal();
+        return;
+    }
+
+    // Only allow one new chat at a time
+    if (newChatPending) return;
+    newChatPending = true;
+
+    // Create new session and conversation IDs
+    currentSessionId = generateUUID();
+    currentConversationId = generateUUID();
+    activeSessionId = currentSessionId;
+
+    // Clear selected files for new chat
+    selectedFiles = [];
+    updateSelectedFilesDisplay();
+
+    clearMessages();
+    addMessage('Hi, I am the DoT chatbot. How can I help you?', false);
+
+    logEvent('New chat/session created: ' + currentSessionId);
+
+    // Update chat history to show new session
+    await loadChatHistory();
+    highlightActiveSession();
+
+    setTimeout(() => { newChatPending = false; }, 500); // Prevent double click
+}
+
+// --- Chat history logic ---
+function formatISTDateTime(ts) {
+    if (!ts) return '';
+    const utc = new Date(ts);
+    // IST is UTC+5:30
+    const istOffset = 5.5 * 60; // in minutes
+    const ist = new Date(utc.getTime() + istOffset * 60000);
+    const yyyy = ist.getFullYear();
+    const mm = String(ist.getMonth() + 1).padStart(2, '0');
+    const dd = String(ist.getDate()).padStart(2, '0');
+    const hh = String(ist.getHours()).padStart(2, '0');
+    const min = String(ist.getMinutes()).padStart(2, '0');
+    const ss = String(ist.getSeconds()).padStart(2, '0');
+    return `${yyyy}-${mm}-${dd} ${hh}:${min}:${ss}`;
+}
+function displayChatHistory(sessions) {
+    chatHistory.innerHTML = '';
+    sessions.forEach(session => {
+        const sessionDiv = document.createElement('div');
+        sessionDiv.className = 'chat-session';
+        if (activeSessionId === session.session_id) sessionDiv.classList.add('active');
+
+        // Session label (left-aligned, no icon)
+        const label = document.createElement('span');
+        label.style.textAlign = 'left';
+        label.style.flex = '1';
+        label.textContent = `${session.question}`;
+
+        // Actions container (only delete button)
+        const actions = document.createElement('div');
+        actions.className = 'chat-session-actions';
+
+        // Delete button
+        const delBtn = document.createElement('button');
+        delBtn.className = 'chat-session-action-btn';
+        delBtn.title = 'Delete chat';
+        delBtn.setAttribute('aria-label', 'Delete chat');
+        delBtn.innerHTML = `<svg xmlns="http://www.w3.org/2000/svg" x="0px" y="0px" width="20" height="20" viewBox="0 0 48 48"><path d="M 20.5 4 A 1.50015 1.50015 0 0 0 19.066406 6 L 14.640625 6 C 12.803372 6 11.082924 6.9194511 10.064453 8.4492188 L 7.6972656 12 L 7.5 12 A 1.50015 1.50015 0 1 0 7.5 15 L 8.2636719 15 A 1.50015 1.50015 0 0 0 8.6523438 15.007812 L 11.125 38.085938 C 11.423352 40.868277 13.795836 43 16.59375 43 L 31.404297 43 C 34.202211 43 36.574695 40.868277 36.873047 38.085938 L 39.347656 15.007812 A 1.50015 1.50015 0 0 0 39.728516 15 L 40.5 15 A 1.50015 1.50015 0 1 0 40.5 12 L 40.302734 12 L 37.935547 8.4492188 C 36.916254 6.9202798 35.196001 6 33.359375 6 L 28.933594 6 A 1.50015 1.50015 0 0 0 27.5 4 L 20.5 4 z M 14.640625 9 L 33.359375 9 C 34.196749 9 34.974746 9.4162203 35.439453 10.113281 L 36.697266 12 L 11.302734 12 L 12.560547 10.113281 A 1.50015 1.50015 0 0 0 12.5625 10.111328 C 13.025982 9.4151428 13.801878 9 14.640625 9 z M 11.669922 15 L 36.330078 15 L 33.890625 37.765625 C 33.752977 39.049286 32.694383 40 31.404297 40 L 16.59375 40 C 15.303664 40 14.247023 39.049286 14.109375 37.765625 L 11.669922 15 z"></path></svg>`;
+        delBtn.onclick = async (e) => {
+            e.stopPropagation();
+            if (confirm('Delete this chat session?')) {
+                await fetch('/delete_session', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ session_id: session.session_id })
+                });
+                await loadChatHistory();
+                // If we deleted the active session, clear messages
+                if (activeSessionId === session.session_id) {
+                    clearMessages();
+                    activeSessionId = null;
+                    currentSessionId = null;
+                    currentConversationId = null;
+                }
+            }
+        };
+        actions.appendChild(delBtn);
+
+        // Click to load session
+        sessionDiv.onclick = async () => {
+            await loadSessionMessages(session.session_id);
+        };
+        sessionDiv.onclick.session_id = session.session_id;
+
+        sessionDiv.appendChild(label);
+        sessionDiv.appendChild(actions);
+        chatHistory.appendChild(sessionDiv);
+    });
+}
+async function loadSessionMessages(sessionId) {
+    try {
+        const response = await fetch(`/session_messages?session_id=${encodeURIComponent(sessionId)}`);
+        const data = await response.json();
+
+        if (response.ok) {
+            clearMessages();
+
+            data.messages.forEach(msg => {
+                addMessage(msg.question, true);
+                addMessage(msg.answer, false, msg.timestamp, msg.source_documents);
+            });
+            // Set the loaded session as current and active
+            currentSessionId = sessionId;
+            currentConversationId = generateUUID(); // New conversation in this session
+            activeSessionId = sessionId;
+
+            // Clear selected files when loading existing session
+            selectedFiles = [];
+            updateSelectedFilesDisplay();
+
+            highlightActiveSession();
+            logEvent('Loaded existing session: ' + sessionId);
+        }
+    } catch (e) {
+        addErrorMessage('Failed to load chat session.');
+    }
+}
+
+// Handle user section click
+function handleUserSectionClick() {
+    if (!isAuthenticated) {
+        showLoginModal();
+    }
+}
+
+// Show login modal
+function showLoginModal() {
+    loginModal.classList.add('show');
+    loginEmail.focus();
+}
+
+// Hide login modal
+function hideLoginModal() {
+    loginModal.classList.remove('show');
+    loginForm.reset();
+    loginError.textContent = '';
+}
+
+// Handle login
+async function handleLogin(e) {
+    e.preventDefault();
+
+    const email = loginEmail.value.trim();
+    const password = loginPassword.value.trim();
+
+    if (!email || !password) {
+        loginError.textContent = 'Please enter both email and password';
+        return;
+    }
+
+    try {
+        const response = await fetch('/login', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ email, password })
+        });
+
+        const data = await response.json();
+
+        if (response.ok) {
+            currentUser = {
+                user_id: data.user_id,
+                email: data.email
+            };
+            isAuthenticated = true;
+            // Set isAdmin flag before updating UI
+            if (email === 'admin@xyz.com') {
+                isAdmin = true;
+            } else {
+                isAdmin = false;
+            }
+            updateUIForAuthenticatedUser();
+            hideLoginModal();
+            applyBootstrapParts(await fetchBootstrap());
+        } else {
+            loginError.textContent = data.error || 'Login failed';
+        }
+    } catch (error) {
+        loginError.textContent = 'Network error. Please try again.';
+        console.error('Login error:', error);
+    }
+}
+
+// Logout
+async function logout() {
+    try {
+        await fetch('/logout', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            }
+        });
+
+        currentUser = null;
+        isAuthenticated = false;
+        selectedFiles = [];
+        updateSelectedFilesDisplay();
+        updateUIForUnauthenticatedUser();
+        clearMessages();
+        deleteAllBtn.classList.add('hidden');
+        deleteAllBtn.style.display = 'none';
+        addMessage('Hi, I am the DoT chatbot. How can I help you?', false);
+    } catch (error) {
+        console.error('Logout error:', error);
+    }
+}
+
+// Show upload modal
+function showUploadModal() {
+    if (!isAuthenticated) {
+        alert('Please login to upload PDFs');
+        return;
+    }
+    uploadModal.classList.add('show');
+}
+
+// Hide upload modal
+function hideUploadModal() {
+    uploadModal.classList.remove('show');
+    uploadForm.reset();
+    uploadStatus.textContent = '';
+    uploadFileList.innerHTML = '';
+    progressFill.style.width = '0%';
+    uploadSubmitBtn.disabled = true;
+}
+
+// Show file selection modal
+function showFileSelectionModal() {
+    if (!isAuthenticated) {
+        alert('Please login to select files');
+        return;
+    }
+    loadAvailableFiles();
+    fileSelectionModal.classList.add('show');
+}
+
+// Hide file selection modal
+function hideFileSelectionModal() {
+    fileSelectionModal.classList.remove('show');
+    fileList.innerHTML = '';
+}
+
+// Load available files
+async function loadAvailableFiles() {
+    // The list from /bootstrap is used for the first opening of the picker
+    if (availableFilesPreloaded) {
+        availableFilesPreloaded = false;
+        displayAvailableFiles();
+        return;
+    }
+    try {
+        const response = await fetch('/available_files');
+        const data = await response.json();
+
+        if (response.ok) {
+            availableFiles = data.files || [];
+            console.log('Available files:', availableFiles);
+            displayAvailableFiles();
+        } else {
+            console.error('Failed to load available files:', data.error);
+            alert('Failed to load available files');
+        }
+    } catch (error) {
+        console.error('Error loading available files:', error);
+        alert('Error loading available files');
+    }
+}
+
+// Display available files in the modal
+function displayAvailableFiles() {
+    fileList.innerHTML = '';
+
+    if (availableFiles.length === 0) {
+        fileList.innerHTML = '<div style="color: #ececf1; text-align: center; padding: 20px;">No files available</div>';
+        return;
+    }
+
+    availableFiles.forEach((file, index) => {
+        const fileItem = document.createElement('div');
+        fileItem.className = 'file-item';
+        fileItem.dataset.filename = file.value;
+
+        const checkbox = document.createElement('input');
+        checkbox.type = 'checkbox';
+        checkbox.className = 'file-checkbox';
+        checkbox.checked = selectedFiles.includes(file.value);
+
+        const fileName = document.createElement('span');
+        fileName.className = 'file-name';
+        console.log('Full file path:', file.value);
+        console.log('Filename only:', getFilenameOnly(file.value));
+        fileName.textContent = getFilenameOnly(file.value);
+
+        fileItem.appendChild(checkbox);
+        fileItem.appendChild(fileName);
+
+        // Add click handler for multiple selection
+        fileItem.addEventListener('click', (e) => {
+            if (e.target === checkbox) {
+                // Checkbox was clicked directly
+                if (checkbox.checked) {
+                    // Unchecking
+                    checkbox.checked = false;
+                    selectedFiles = selectedFiles.filter(f => f !== file.value);
+                    fileItem.classList.remove('selected');
+                } else {
+                    // Checking
+                    if (selectedFiles.length < 3) {
+                        checkbox.checked = true;
+                        selectedFiles.push(file.value);
+                        fileItem.classList.add('selected');
+                    }
+                }
+            } else {
+                // File item was clicked (not checkbox)
+                if (checkbox.checked) {
+                    // Unchecking
+                    checkbox.checked = false;
+                    selectedFiles = selectedFiles.filter(f => f !== file.value);
+                    fileItem.classList.remove('selected');
+                } else {
+                    // Checking
+                    if (selectedFiles.length < 3) {
+                        checkbox.checked = true;
+                        selectedFiles.push(file.value);
+                        fileItem.classList.add('selected');
+                    }
+                }
+            }
+
+            // Update disabled state for all files
+            updateFileSelectionState();
+        });
+
+        fileList.appendChild(fileItem);
+    });
+
+    // Initial state update
+    updateFileSelectionState();
+}
+
+// Update file selection state (enable/disable files based on selection count)
+function updateFileSelectionState() {
+    const fileItems = document.querySelectorAll('.file-item');
+    const maxSelection = 3;
+    const selectionCountElement = document.getElementById('selectionCount');
+
+    // Update selection count display
+    if (selectionCountElement) {
+        selectionCountElement.textContent = selectedFiles.length;
+    }
+
+    fileItems.forEach(item => {
+        const checkbox = item.querySelector('.file-checkbox');
+        const isSelected = checkbox.checked;
+
+        if (selectedFiles.length >= maxSelection && !isSelected) {
+            // Disable unselected files when max is reached
+            item.classList.add('disabled');
+            checkbox.disabled = true;
+        } else {
+            // Enable files when under max or if already selected
+            item.classList.remove('disabled');
+            checkbox.disabled = false;
+        }
+    });
+}
+
+// Confirm file selection
+function confirmFileSelection() {
+    hideFileSelectionModal();
+    updateSelectedFilesDisplay();
+}
+
+// Update the display of selected files
+function updateSelectedFilesDisplay() {
+    if (selectedFiles.length === 0) {
+        selectedFilesDisplay.style.display = 'none';
+        return;
+    }
+
+    selectedFilesDisplay.innerHTML = '';
+    selectedFiles.forEach((file, index) => {
+        const fileTag = document.createElement('div');
+        fileTag.className = 'selected-file-tag';
+        const filenameOnly = getFilenameOnly(file);
+        fileTag.innerHTML = `
+            <span title="${file}">${filenameOnly}</span>
+            <button class="remove-file-btn" onclick="removeSelectedFile('${file}')">&times;</button>
+        `;
+        selectedFilesDisplay.appendChild(fileTag);
+    });
+    selectedFilesDisplay.style.display = 'flex';
+}
+
+// Remove selected file
+function removeSelectedFile(fileToRemove) {
+    selectedFiles = selectedFiles.filter(f => f !== fileToRemove);
+    updateSelectedFilesDisplay();
+
+    // Update the checkbox state in the modal
+    const fileItems = document.querySelectorAll('.file-item');
+    fileItems.forEach(item => {
+        const checkbox = item.querySelector('.file-checkbox');
+        if (item.dataset.filename === fileToRemove) {
+            checkbox.checked = false;
+            item.classList.remove('selected');
+        }
+    });
+
+    // Update disabled state
+    updateFileSelectionState();
+}
+
+// Validate upload form
+function validateUploadForm() {
+    const files = pdfFiles.files;
+    const filenameValue = filename.value.trim();
+    const projectCodeValue = projectCode.value.trim();
+
+    if (files.length > 0 && files.length <= 3 && filenameValue && projectCodeValue) {
+        uploadSubmitBtn.disabled = false;
+    } else {
+        uploadSubmitBtn.disabled = true;
+    }
+}
+
+// Render one progress row per selected file
+function renderUploadFileRows(files) {
+    uploadFileList.innerHTML = '';
+    return Array.from(files).map(file => {
+        const row = document.createElement('div');
+        row.className = 'upload-file-row';
+        row.innerHTML = '<div class="upload-file-meta"><span class="upload-file-name"></span><span class="upload-file-state">Waiting...</span></div>' +
+            '<div class="progress-bar"><div class="progress-fill"></div></div>';
+        row.querySelector('.upload-file-name').textContent = file.name;
+        uploadFileList.appendChild(row);
+        return {
+            file,
+            row,
+            fill: row.querySelector('.progress-fill'),
+            state: row.querySelector('.upload-file-state')
+        };
+    });
+}
+
+// Files are sent in order in one multipart body, so the bytes sent so far
+// tell us how far along each individual file is.
+function updateUploadFileRows(rows, loaded) {
+    let offset = 0;
+    rows.forEach(r => {
+        const size = r.file.size || 1;
+        const sent = Math.min(Math.max(loaded - offset, 0), size);
+        const pct = Math.round((sent / size) * 100);
+        r.fill.style.width = pct + '%';
+        r.state.textContent = pct >= 100 ? 'Indexing...' : (sent > 0 ? pct + '%' : 'Waiting...');
+        offset += r.file.size;
+    });
+}
+
+function sendUploadRequest(formData, onProgress) {
+    return new Promise((resolve, reject) => {
+        const xhr = new XMLHttpRequest();
+        xhr.open('POST', '/upload_pdf');
+        xhr.upload.onprogress = (evt) => onProgress(evt.loaded);
+        xhr.onload = () => {
+            let data = {};
+            try {
+                data = JSON.parse(xhr.responseText);
+            } catch (err) {
+                data = { error: 'Upload failed.' };
+            }
+            resolve({ ok: xhr.status >= 200 && xhr.status < 300, status: xhr.status, data });
+        };
+        xhr.onerror = () => reject(new Error('Network error'));
+        xhr.send(formData);
+    });
+}
+
+// Handle upload
+async function handleUpload(e) {
+    e.preventDefault();
+
+    const formData = new FormData();
+    const files = pdfFiles.files;
+
+    for (let i = 0; i < files.length; i++) {
+        formData.append('pdfs', files[i]);
+    }
+
+    formData.append('field1', filename.value.trim());
+    formData.append('field2', projectCode.value.trim());
+    formData.append('field3', labelTag.value.trim());
+
+    uploadSubmitBtn.disabled = true;
+    uploadStatus.textContent = 'Uploading...';
+    progressFill.style.width = '0%';
+    const rows = renderUploadFileRows(files);
+    const totalBytes = Array.from(files).reduce((sum, f) => sum + f.size, 0) || 1;
+
+    try {
+        const { ok, status, data } = await sendUploadRequest(formData, (loaded) => {
+            updateUploadFileRows(rows, loaded);
+            progressFill.style.width = Math.min(Math.round((loaded / totalBytes) * 100), 100) + '%';
+            if (loaded >= totalBytes) {
+                uploadStatus.textContent = 'Indexing your document, please wait...';
+            }
+        });
+        progressFill.style.width = '100%';
+
+        // Per-file results are returned for multi-file uploads
+        const results = data.results || rows.map(r => ({ filename: r.file.name, ok }));
+        rows.forEach((r, i) => {
+            const result = results[i] || { ok };
+            r.fill.style.width = '100%';
+            r.state.textContent = result.ok ? 'Done' : ((result.response && result.response.error) || 'Failed');
+            r.row.classList.toggle('failed', !result.ok);
+        });
+
+        if (ok && status === 200) {
+            uploadStatus.textContent = 'Your PDF has been successfully processed. You can now ask questions based on its content.';
+            setTimeout(() => {
+                hideUploadModal();
+            }, 2000);
+            logEvent('PDF uploaded and indexed for user: ' + (currentUser?.email || 'unknown'));
+        } else {
+            uploadStatus.textContent = data.error || 'Upload failed.';
+            uploadSubmitBtn.disabled = false;
+        }
+    } catch (error) {
+        uploadStatus.textContent = 'Network error. Please try again.';
+        uploadSubmitBtn.disabled = false;
+        console.error('Upload error:', error);
+    }
+}
+
+// Handle modal close
+function handleModalClose(e) {
+    if (e.target === loginModal) {
+        hideLoginModal();
+    } else if (e.target === uploadModal) {
+        hideUploadModal();
+    } else if (e.target === fileSelectionModal) {
+        hideFileSelectionModal();
+    }
+}
+
+// Handle chat submit
+async function handleChatSubmit(e) {
+    e.preventDefault();
+
+    const message = messageInput.value.trim();
+    if (!message) return;
+
+    // If speech recognizer is active, stop it and finalize current text.
+    try {
+        if (listening) {
+            // stop recognition but keep the final text as the message being sent
+            stopRecognition();
+        }
+    } catch (err) {
+        console.warn('Error stopping recognition before submit', err);
+    }
+
+    // Clear lastFinalText so the next speech session starts fresh
+    lastFinalText = "";
+
+    // Check if user is authenticated
+    if (!isAuthenticated) {
+        showLoginModal();
+        return;
+    }
+
+    // If no current session exists, check if user has any existing sessions
+    if (!currentSessionId) {
+        try {
+            const response = await fetch('/user_sessions');
+            const data = await response.json();
+
+            if (response.ok && data.sessions && data.sessions.length > 0) {
+                // User has existing sessions, use the most recent one
+                currentSessionId = data.sessions[0].session_id;
+                currentConversationId = generateUUID(); // New conversation in existing session
+                logEvent('Using existing session: ' + currentSessionId);
+            } else {
+                // New user with no sessions, create first session
+                currentSessionId = generateUUID();
+                currentConversationId = generateUUID();
+                logEvent('Created first session for new user: ' + currentSessionId);
+            }
+        } catch (error) {
+            console.error('Error checking user sessions:', error);
+            // Fallback: create new session
+            currentSessionId = generateUUID();
+            currentConversationId = generateUUID();
+            logEvent('Created fallback session: ' + currentSessionId);
+        }
+    }
+
+    // If no conversation ID exists, create one for the current session
+    if (!currentConversationId) {
+        currentConversationId = generateUUID();
+    }
+
+    // Add user message
+    addMessage(message, true);
+    messageInput.value = '';
+    autoResizeTextarea();
+
+    showLoading();
+
+    try {
+        const payload = {
+            question: message,
+            user_id: currentUser?.user_id || '',
+            conversation_id: currentConversationId,
+            session_id: currentSessionId,
+            file_names: selectedFiles  // Add selected files to the payload
+        };
+
+        const result = await streamChatAnswer(payload);
+
+        if (result.ok) {
+            // Only update chat history after first message in a new session
+            if (!activeSessionId) {
+                await loadChatHistory();
+                activeSessionId = currentSessionId;
+                highlightActiveSession();
+            }
+        } else {
+            addErrorMessage(result.error || 'An error occurred while processing your request.');
+        }
+    } catch (error) {
+        addErrorMessage('Network error. Please try again.');
+        console.error('Chat error:', error);
+    } finally {
+        hideLoading();
+    }
+}
+
+// Handle key down
+function handleKeyDown(e) {
+    if (e.key === 'Enter' && !e.shiftKey) {
+        e.preventDefault();
+        chatForm.dispatchEvent(new Event('submit'));
+    }
+}
+
+// Auto resize textarea
+function autoResizeTextarea() {
+    messageInput.style.height = 'auto';
+    messageInput.style.height = Math.min(messageInput.scrollHeight, 200) + 'px';
+}
+
+// Add message
+// Inline thumbnails of the highlighted region of the first few sources. They are only
+// fetched once the answer is on screen, and the server renders them from the same
+// highlighted PDF a reference click opens, so the click is then served from its cache.
+const MAX_SOURCE_PREVIEWS = 3;
+function renderSourcePreviews(container, sourceDocuments, links) {
+    const previews = document.createElement('div');
+    previews.className = 'source-previews';
+    container.appendChild(previews);
+    if (!('IntersectionObserver' in window)) {
+        loadSourcePreviews(previews, sourceDocuments, links);
+        return;
+    }
+    const observer = new IntersectionObserver((entries) => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            observer.disconnect();
+            loadSourcePreviews(previews, sourceDocuments, links);
+        }
+    });
+    observer.observe(container);
+}
+
+function loadSourcePreviews(previews, sourceDocuments, links) {
+    sourceDocuments.slice(0, MAX_SOURCE_PREVIEWS).forEach(async (doc, idx) => {
+        const img = document.createElement('img');
+        img.className = 'source-preview';
+        img.alt = getFilenameOnly(doc.filename);
+        img.title = 'Open highlighted PDF';
+        img.addEventListener('click', () => links[idx] && links[idx].click());
+        previews.appendChild(img);
+        try {
+            const response = await fetch('/highlight_preview', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ source: doc, dpi: 96, format: 'png' })
+            });
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            img.src = URL.createObjectURL(await response.blob());
+            img.onload = () => URL.revokeObjectURL(img.src);
+        } catch (error) {
+            console.warn('No preview for', doc.filename, error);
+            img.remove();
+        }
+    });
+}
+
+// withPreviews: inline source previews, for new answers only (not history replays)
+function addMessage(content, isUser = false, timestamp = null, sourceDocuments = null, withPreviews = false) {
+    const messageDiv = document.createElement('div');
+    messageDiv.className = `message ${isUser ? 'user' : 'bot'}`;
+
+    const contentDiv = document.createElement('div');
+    contentDiv.className = 'message-content';
+
+    if (!isUser) {
+        // Add SVG logo avatar for bot
+        const botAvatar = document.createElement('div');
+        botAvatar.className = 'message-avatar';
+        botAvatar.style.width = '40px';
+        botAvatar.style.height = '80px';
+        botAvatar.style.display = 'flex';
+        botAvatar.style.alignItems = 'center';
+        botAvatar.style.justifyContent = 'center';
+        botAvatar.style.marginRight = '-50px';
+        botAvatar.style.marginLeft = '40px';
+        botAvatar.innerHTML = `<svg version="1.0" xmlns="http://www.w3.org/2000/svg" width="32" height="32" viewBox="0 0 512 512" preserveAspectRatio="xMidYMid meet"><g transform="translate(0,512) scale(0.1,-0.1)" fill="#000" stroke="none"><path d="M2487 4900 c-177 -31 -320 -179 -348 -363 -28 -177 73 -360 241 -439 l70 -33 0 -217 0 -217 -687 -3 c-749 -4 -709 -1 -834 -62 -114 -56 -208 -164 -258 -296 -23 -60 -25 -81 -29 -282 l-4 -217 -206 -3 c-193 -3 -210 -5 -250 -26 -66 -35 -119 -88 -149 -150 l-28 -57 0 -560 0 -560 24 -53 c29 -65 113 -143 178 -168 38 -14 89 -18 240 -22 l193 -4 0 -186 c0 -277 31 -372 160 -503 71 -72 173 -128 268 -148 37 -8 487 -11 1495 -11 1584 0 1503 -3 1629 61 90 46 186 145 230 239 50 105 58 155 58 365 l0 183 193 4 c151 4 202 8 240 22 65 25 149 103 178 168 l24 53 0 560 0 560 -28 57 c-30 62 -83 115 -149 150 -40 21 -57 23 -250 26 l-206 3 -4 217 c-4 201 -6 222 -29 282 -62 164 -173 271 -344 333 -59 22 -70 22 -747 25 l-688 3 0 217 0 217 70 33 c126 59 215 175 241 316 20 109 -19 248 -96 342 -88 108 -257 169 -398 144z m187 -240 c20 -14 49 -43 64 -64 24 -35 27 -49 27 -116 0 -67 -3 -81 -27 -116 -15 -21 -44 -50 -65 -64 -31 -21 -48 -25 -113 -25 -65 0 -82 4 -113 25 -21 14 -50 43 -65 64 -24 35 -27 49 -27 117 0 70 3 81 30 120 45 64 104 91 186 87 50 -3 75 -10 103 -28z m1390 -1271 c70 -26 139 -92 174 -167 l27 -57 0 -1190 0 -1190 -26 -55 c-37 -80 -81 -125 -157 -162 l-67 -33 -1455 0 -1455 0 -67 33 c-76 37 -120 82 -157 162 l-26 55 0 1190 c0 1123 1 1192 18 1230 42 94 108 158 195 190 31 11 284 14 1489 14 1443 1 1453 1 1507 -20z m-3424 -1414 l0 -585 -178 0 c-198 0 -212 4 -238 66 -18 44 -21 982 -3 1033 22 62 52 71 247 71 l172 0 0 -585z m4211 569 c58 -30 59 -36 59 -569 0 -521 -1 -534 -51 -569 -20 -13 -53 -16 -201 -16 l-178 0 0 585 0 585 170 0 c136 0 177 -3 201 -16z"/><path d="M1824 2760 c-50 -16 -125 -71 -161 -118 -154 -204 -1 -506 257 -506 121 0 242 78 291 186 35 80 34 193 -4 270 -31 62 -84 116 -149 149 -48 25 -180 36 -234 19z m147 -216 c93 -48 55 -194 -50 -194 -104 0 -146 137 -57 191 38 23 67 24 107 3z"/><path d="M3104 2760 c-50 -16 -125 -71 -161 -118 -154 -204 -1 -506 257 -506 121 0 242 78 291 186 35 80 34 193 -4 270 -31 62 -84 116 -149 149 -48 25 -180 36 -234 19z m147 -216 c93 -48 55 -194 -50 -194 -104 0 -146 137 -57 191 38 23 67 24 107 3z"/><path d="M1958 1487 c-52 -49 -47 -125 10 -163 50 -34 176 -84 279 -110 206 -52 420 -52 626 0 115 29 241 79 284 112 38 29 51 79 33 125 -30 70 -90 75 -230 16 -243 -102 -557 -102 -800 0 -114 48 -166 53 -202 20z"/></g></svg>`;
+        messageDiv.appendChild(botAvatar);
+        // Render markdown for bot messages
+        contentDiv.innerHTML = marked.parse(content);
+
+        // Add inline references if available
+        if (sourceDocuments && sourceDocuments.length > 0) {
+            const noInfoPatterns = [
+                'The context documents provided do not contain any information',
+                'The context documents provided do not include any information',
+                'no information found',
+                'cannot be found in the context',
+                'no relevant information'
+            ];
+            const hasNoInfo = noInfoPatterns.some(pattern =>
+                content.toLowerCase().includes(pattern.toLowerCase())
+            );
+            if (!hasNoInfo) {
+                // Inline references at the end of the answer
+                const refsSpan = document.createElement('div');
+                refsSpan.style.marginTop = '12px';
+                refsSpan.style.fontSize = '14px';
+                refsSpan.style.color = '#1a3a5d';
+                refsSpan.innerHTML = '<strong>References:</strong> ';
+                sourceDocuments.forEach((doc, idx) => {
+                    console.log(JSON.stringify(doc));
+
+                    // Create a link that will open the highlighted PDF
+                    const link = document.createElement('a');
+                    link.href = '#';
+                    link.target = '_blank';
+                    link.style.color = '#1a3a5d';
+                    link.style.textDecoration = 'underline';
+                    link.style.marginRight = '12px';
+                    link.style.cursor = 'pointer';
+                    link.textContent = getFilenameOnly(doc.filename);
+
+                    // Add click handler to fetch and display highlighted PDF
+                    link.addEventListener('click', async (e) => {
+                        e.preventDefault();
+
+                        console.log('Opening highlighted PDF for:', doc);
+                        console.log('Request payload:', JSON.stringify(doc));
+
+                        // Show loading state
+                        const originalText = link.textContent;
+                        link.textContent = 'Loading...';
+                        link.style.opacity = '0.7';
+
+                        try {
+                            // Only the cited pages (plus one page of context) are sent back; the PDF's
+                            // page labels keep their original numbers (X-Page-Map lists them too)
+                            const response = await fetch('/view_highlights', {
+                                method: 'POST',
+                                headers: {
+                                    'Content-Type': 'application/json',
+                                },
+                                body: JSON.stringify({ ...doc, cited_pages_only: true, context_pages: 1 })
+                            });
+
+                            console.log('Response status:', response.status);
+
+                                                                    if (response.ok) {
+                                    // Check if the response is actually a PDF
+                                    const contentType = response.headers.get('content-type');
+                                    if (contentType && contentType.includes('application/pdf')) {
+                                        // Create a blob from the PDF response
+                                        const blob = await response.blob();
+                                        const url = window.URL.createObjectURL(blob);
+
+                                        // Get the page number from response headers
+                                        const pageNumber = response.headers.get('X-Page-Number');
+                                        console.log('Page number from response:', pageNumber);
+
+                                        // Add page number to URL if available
+                                        let finalUrl = url;
+                                        if (pageNumber) {
+                                            finalUrl = url + '#page=' + pageNumber;
+                                            console.log('Final URL with page number:', finalUrl);
+                                        }
+
+                                        console.log('Created blob URL:', url);
+
+                                        // Open the PDF in a new window/tab
+                                        const newWindow = window.open(finalUrl, '_blank');
+
+                                        if (!newWindow) {
+                                            alert('Please allow pop-ups to view the highlighted PDF');
+                                        } else {
+                                            // Add a small delay to ensure the window opens properly
+                                            setTimeout(() => {
+                                                if (newWindow.closed) {
+                                                    console.log('PDF window was closed');
+                                                }
+                                            }, 100);
+                                        }
+
+                                        // Clean up the blob URL after a delay
+                                        setTimeout(() => {
+                                            window.URL.revokeObjectURL(url);
+                                        }, 1000);
+                                    } else {
+                                        // Response is not a PDF, try to get error message
+                                        const text = await response.text();
+                                        console.error('Response is not a PDF:', text);
+                                        alert('Failed to load highlighted PDF: Response is not a PDF file');
+                                    }
+                            } else {
+                                // Try to get error message from response
+                                let errorMessage = 'Unknown error';
+                                try {
+                                    const errorData = await response.json();
+                                    errorMessage = errorData.error || 'Unknown error';
+                                } catch (e) {
+                                    // If JSON parsing fails, try to get text
+                                    try {
+                                        const text = await response.text();
+                                        errorMessage = text.substring(0, 100) + '...';
+                                    } catch (e2) {
+                                        errorMessage = `HTTP ${response.status}: ${response.statusText}`;
+                                    }
+                                }
+                                console.error('Failed to fetch highlighted PDF:', errorMessage);
+                                alert('Failed to load highlighted PDF: ' + errorMessage);
+                            }
+                        } catch (error) {
+                            console.error('Error fetching highlighted PDF:', error);
+                            alert('Error loading highlighted PDF: ' + error.message);
+                        } finally {
+                            // Restore original state
+                            link.textContent = originalText;
+                            link.style.opacity = '1';
+                        }
+                    });
+
+                    refsSpan.appendChild(link);
+
+                    if (idx < sourceDocuments.length - 1) {
+                        const comma = document.createElement('span');
+                        comma.textContent = ', ';
+                        refsSpan.appendChild(comma);
+                    }
+                });
+                contentDiv.appendChild(refsSpan);
+                if (withPreviews) {
+                    renderSourcePreviews(contentDiv, sourceDocuments, refsSpan.querySelectorAll('a'));
+                }
+            }
+        }
+    } else {
+        // User messages as plain text
+        contentDiv.textContent = content;
+    }
+
+    if (timestamp) {
+        const timestampDiv = document.createElement('div');
+        timestampDiv.style.fontSize = '12px';
+        timestampDiv.style.color = '#8e8ea0';
+        timestampDiv.style.marginTop = '8px';
+        timestampDiv.textContent = formatISTDateTime(timestamp);
+        contentDiv.appendChild(timestampDiv);
+    }
+
+    messageDiv.appendChild(contentDiv);
+    messagesContainer.appendChild(messageDiv);
+
+    // Auto scroll to bottom
+    messagesContainer.scrollTop = messagesContainer.scrollHeight;
+    return messageDiv;
+}
+
+// Read a text/event-stream response and call onEvent(name, data) per event
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+            const raw = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let eventName = 'message';
+            let data = '';
+            raw.split('\n').forEach(line => {
+                if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            if (data) onEvent(eventName, JSON.parse(data));
+        }
+    }
+}
+
+// Send a question to /chat/stream and render the answer as it arrives
+async function streamChatAnswer(payload) {
+    const response = await fetch('/chat/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(payload)
+    });
+
+    const contentType = response.headers.get('content-type') || '';
+    if (!response.ok || !contentType.includes('text/event-stream')) {
+        const data = await response.json();
+        return { ok: false, error: data.error };
+    }
+
+    let streamDiv = null;
+    let answer = '';
+    let sources = [];
+    let result = { ok: false, error: 'The answer stream ended unexpectedly.' };
+    await readEventStream(response, (eventName, data) => {
+        if (eventName === 'token') {
+            if (!streamDiv) {
+                hideLoading();
+                streamDiv = addMessage('', false);
+            }
+            answer += data.content;
+            streamDiv.querySelector('.message-content').innerHTML = marked.parse(answer);
+            messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        } else if (eventName === 'sources') {
+            sources = data.source_documents || [];
+        } else if (eventName === 'done') {
+            // Re-render the finished answer with its references and timestamp
+            if (streamDiv) streamDiv.remove();
+            addMessage(data.answer || answer, false, data.timestamp, sources, true);
+            result = { ok: true };
+        } else if (eventName === 'error') {
+            if (streamDiv) streamDiv.remove();
+            result = { ok: false, error: data.error };
+        }
+    });
+    return result;
+}
+
+// Add error message
+function addErrorMessage(message) {
+    const errorDiv = document.createElement('div');
+    errorDiv.className = 'error';
+    errorDiv.textContent = message;
+    messagesContainer.appendChild(errorDiv);
+    messagesContainer.scrollTop = messagesContainer.scrollHeight;
+}
+
+// Clear messages
+function clearMessages() {
+    messagesContainer.innerHTML = '';
+}
+
+// Show loading
+function showLoading() {
+    loading.classList.add('show');
+    sendButton.disabled = true;
+    messageInput.disabled = true;
+}
+
+// Hide loading
+function hideLoading() {
+    loading.classList.remove('show');
+    sendButton.disabled = false;
+    messageInput.disabled = false;
+}
+
+// Load chat history
+async function loadChatHistory() {
+    if (!isAuthenticated) return;
+
+    try {
+        const response = await fetch('/user_sessions');
+        const data = await response.json();
+        console.log(data)
+
+        if (response.ok) {
+            displayChatHistory(data.sessions);
+        }
+    } catch (error) {
+        console.error('Error loading chat history:', error);
+    }
+}
+
+// Utility functions
+function generateUUID() {
+    return 'xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx'.replace(/[xy]/g, function(c) {
+        const r = Math.random() * 16 | 0;
+        const v = c == 'x' ? r : (r & 0x3 | 0x8);
+        return v.toString(16);
+    });
+}
+
+
+
+function getFilenameOnly(fullPath) {
+    const parts = fullPath.split('/');
+    return parts[parts.length - 1];
+}
+
+// ------- Azure Speech SDK integration (en-IN) -------
+let speechRecognizer = null;
+let speechToken = null;
+let speechRegion = null;
+let listening = false;
+let lastFinalText = ""; // preserve final transcript until mic stopped
+
+async function initSpeech() {
+    // Hide mic if browser doesn't support getUserMedia
+    if (!navigator.mediaDevices || !navigator.mediaDevices.getUserMedia) {
+        if (micButton) micButton.style.display = 'none';
+    }
+}
+
+async function fetchSpeechToken() {
+    try {
+        const res = await fetch('/speech_token');
+        const data = await res.json();
+        if (!res.ok) {
+            console.error('Failed to get speech token', data);
+            return null;
+        }
+        return data;
+    } catch (e) {
+        console.error('Error fetching speech token', e);
+        return null;
+    }
+}
+
+async function toggleSpeechRecognition() {
+    if (listening) {
+        stopRecognition();
+    } else {
+        startRecognition();
+    }
+}
+
+function stopRecognition() {
+    if (speechRecognizer) {
+        try { speechRecognizer.stopContinuousRecognitionAsync(); } catch (e) {}
+        speechRecognizer = null;
+    }
+    listening = false;
+    if (micButton) micButton.style.backgroundColor = '';
+}
+
+async function startRecognition() {
+    // fetch token if not present
+    if (!speechToken || !speechRegion) {
+        const tokenResp = await fetchSpeechToken();
+        if (!tokenResp) return;
+        speechToken = tokenResp.token;
+        speechRegion = tokenResp.region;
+    }
+
+    // Preserve current input as base for transcription
+    try {
+        const existing = (messageInput && messageInput.value) ? messageInput.value.trim() : "";
+        if (existing) lastFinalText = existing;
+    } catch (e) {
+        lastFinalText = lastFinalText || "";
+    }
+
+    try {
+        const SpeechSDK = window.SpeechSDK;
+        if (!SpeechSDK) {
+            alert('Speech SDK failed to load');
+            return;
+        }
+
+        const speechConfig = SpeechSDK.SpeechConfig.fromAuthorizationToken(speechToken, speechRegion);
+        speechConfig.speechRecognitionLanguage = 'en-IN';
+
+        const audioConfig = SpeechSDK.AudioConfig.fromDefaultMicrophoneInput();
+        speechRecognizer = new SpeechSDK.SpeechRecognizer(speechConfig, audioConfig);
+
+        if (micButton) micButton.style.backgroundColor = '#f2f2f2';
+        listening = true;
+
+        // interim/final handling: preserve last final text during pauses
+        speechRecognizer.recognizing = (s, e) => {
+            try {
+                const interimText = (e.result && e.result.text) ? e.result.text : "";
+                // If interimText is empty (pause), keep lastFinalText
+                if (interimText && interimText.trim().length > 0) {
+                    // show last final + interim
+                    messageInput.value = (lastFinalText ? (lastFinalText + ' ') : '') + interimText;
+                } else {
+                    // keep last final text unchanged
+                    messageInput.value = lastFinalText;
+                }
+                autoResizeTextarea();
+            } catch (err) {
+                console.error('Error in recognizing handler', err);
+            }
+        };
+
+        speechRecognizer.recognized = (s, e) => {
+            try {
+                if (e.result.reason === SpeechSDK.ResultReason.RecognizedSpeech) {
+                    const finalText = (e.result && e.result.text) ? e.result.text.trim() : '';
+                    if (finalText.length > 0) {
+                        // Append the recognized final text to lastFinalText
+                        lastFinalText = (lastFinalText ? (lastFinalText + ' ') : '') + finalText;
+                        messageInput.value = lastFinalText;
+                        autoResizeTextarea();
+                    }
+                } else if (e.result.reason === SpeechSDK.ResultReason.NoMatch) {
+                    console.log('No speech could be recognized.');
+                    // do not clear messageInput on NoMatch; keep lastFinalText
+                    messageInput.value = lastFinalText;
+                    autoResizeTextarea();
+                }
+            } catch (err) {
+                console.error('Error in recognized handler', err);
+            }
+        };
+
+        speechRecognizer.canceled = (s, e) => {
+            console.log('Recognition canceled:', e);
+            stopRecognition();
+        };
+
+        speechRecognizer.sessionStopped = (s, e) => {
+            console.log('Session stopped');
+            stopRecognition();
+        };
+
+        speechRecognizer.startContinuousRecognitionAsync();
+
+    } catch (e) {
+        console.error('Error starting speech recognition', e);
+        alert('Unable to start speech recognition: ' + e.message);
+    }
+}
+
+// Focus on input when page loads
+messageInput.focus();
+
+// Add highlightActiveSession function
+function highlightActiveSession() {
+    // Remove 'active' class from all chat sessions
+    document.querySelectorAll('.chat-session').forEach(div => div.classList.remove('active'));
+    // Add 'active' class to the current session
+    if (activeSessionId) {
+        const activeDiv = Array.from(document.querySelectorAll('.chat-session')).find(div => {
+            // Find the label span and match session id
+            return div.onclick && div.onclick.session_id === activeSessionId;
+        });
+        if (activeDiv) activeDiv.classList.add('active');
+    }
+}
+
+// Add logging for new chat/session creation and data upload to Cosmos DB
+function logEvent(message) {
+    if (window.console) {
+        console.log('[LOG]', message);
+    }
+    // Optionally, send logs to backend via fetch('/log', ...)
+}
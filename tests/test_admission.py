@@ -0,0 +1,153 @@
+import multiprocessing
+import os
+import runpy
+import threading
+import time
+from unittest import mock
+
+import flask
+import pytest
+from werkzeug.test import EnvironBuilder
+
+import admission
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _app(tmp_path, controller):
+    app = flask.Flask(__name__)
+    app.secret_key = "test"
+    pdf = tmp_path / "doc.pdf"
+    pdf.write_bytes(b"%PDF-1.4\n")
+
+    @app.route("/view_pdf/<blob_name>")
+    def view_pdf(blob_name):
+        return flask.send_file(str(pdf), mimetype="application/pdf")
+
+    @app.route("/highlight_preview", methods=["POST"])
+    def highlight_preview():
+        return flask.request.remote_addr
+
+    admission.init_app(app, controller)
+    return app
+
+
+def _call(app, path, method="GET", **kwargs):
+    env = EnvironBuilder(path=path, method=method, **kwargs).get_environ()
+    status = []
+    body = app(env, lambda s, h, e=None: status.append(s))
+    return status[0], body
+
+
+def test_send_file_response_releases_its_slot_when_closed(tmp_path):
+    controller = admission.AdmissionController(lock_dir=str(tmp_path / "locks"))
+    app = _app(tmp_path, controller)
+    pdf = controller._get_bulkheads()["pdf"]
+    for _ in range(pdf.limit + 1):
+        status, body = _call(app, "/view_pdf/doc.pdf")
+        assert status == "200 OK"
+        assert pdf.in_flight == 1
+        b"".join(body)
+        body.close()
+        assert pdf.in_flight == 0
+
+
+def test_anonymous_requests_are_not_capped_as_one_user(tmp_path, monkeypatch):
+    monkeypatch.setenv("ADMISSION_PREVIEW_LIMIT", "4")
+    monkeypatch.setenv("ADMISSION_PREVIEW_PER_USER", "1")
+    controller = admission.AdmissionController(lock_dir=str(tmp_path / "locks"))
+    app = _app(tmp_path, controller)
+    # A login storm behind the proxy: every request comes from its address
+    bodies = []
+    for _ in range(3):
+        status, body = _call(app, "/highlight_preview", method="POST", environ_base={"REMOTE_ADDR": "10.0.0.1"})
+        assert status == "200 OK"
+        bodies.append(body)
+    for body in bodies:
+        body.close()
+    ticket = controller.admit("/highlight_preview", "alice")
+    try:
+        with pytest.raises(admission.Rejected) as excinfo:
+            controller.admit("/highlight_preview", "alice")
+        assert excinfo.value.status == 429
+    finally:
+        ticket.release()
+
+
+def _hold_and_die(lock_dir, count):
+    controller = admission.AdmissionController(lock_dir=lock_dir)
+    for i in range(count):
+        controller.admit("/view_highlights", f"user{i}")
+    os._exit(0)
+
+
+def test_slots_are_shared_across_workers_and_reclaimed_from_dead_ones(tmp_path):
+    lock_dir = str(tmp_path / "locks")
+    controller = admission.AdmissionController(lock_dir=lock_dir)
+    pdf = controller._get_bulkheads()["pdf"]
+    worker = multiprocessing.get_context("spawn").Process(target=_hold_and_die, args=(lock_dir, pdf.limit))
+    worker.start()
+    worker.join(30)
+    assert worker.exitcode == 0
+    # The dead worker's slots are counted until a limit is hit, then reclaimed
+    assert pdf.stats()["instance_in_flight"] == pdf.limit
+    ticket = controller.admit("/view_highlights", "alice")
+    assert pdf.stats()["instance_in_flight"] == 1
+    ticket.release()
+
+
+def test_queued_request_wakes_when_a_slot_is_released(tmp_path, monkeypatch):
+    monkeypatch.setenv("ADMISSION_PDF_LIMIT", "1")
+    monkeypatch.setenv("ADMISSION_PDF_TIMEOUT", "10")
+    controller = admission.AdmissionController(lock_dir=str(tmp_path / "locks"))
+    held = controller.admit("/view_highlights", "alice")
+    threading.Timer(0.3, held.release).start()
+    start = time.monotonic()
+    ticket = controller.admit("/view_highlights", "bob")
+    assert 0.25 < time.monotonic() - start < 2
+    pdf = controller._get_bulkheads()["pdf"]
+    assert (pdf.stats()["instance_in_flight"], pdf.stats()["instance_queued"]) == (1, 0)
+    # Nothing released in time: the queued request gives up and leaves the queue
+    monkeypatch.setattr(pdf, "timeout", 0.2)
+    with pytest.raises(admission.Rejected) as excinfo:
+        controller.admit("/view_highlights", "alice")
+    assert excinfo.value.reason == "timeout"
+    assert pdf.stats()["instance_queued"] == 0
+    ticket.release()
+    assert pdf.stats()["instance_in_flight"] == 0
+
+
+def test_clicks_do_not_share_slots_with_previews_or_job_polls(tmp_path, monkeypatch):
+    # Sync workers: a capacity of 3 and no queues
+    monkeypatch.setattr(admission, "ADMISSION_CAPACITY", 3)
+    monkeypatch.setattr(admission, "ADMISSION_QUEUE_FACTOR", 0)
+    controller = admission.AdmissionController(lock_dir=str(tmp_path / "locks"))
+    assert controller.route_class("/highlight_preview") == "preview"
+    assert controller.route_class("/highlight_jobs/<job_id>") == "jobs"
+    assert controller.route_class("/highlight_jobs/<job_id>/result") == "jobs"
+
+    bulkheads = controller._get_bulkheads()
+    # Previews fill their class and a user long-polls several jobs
+    previews = [controller.admit("/highlight_preview", f"user{i}") for i in range(bulkheads["preview"].limit)]
+    polls = [controller.admit("/highlight_jobs/<job_id>", "user0") for _ in range(4)]
+    pdf = bulkheads["pdf"]
+    assert (pdf.limit, pdf.queue) == (2, 2)
+    clicks = [controller.admit("/view_highlights", f"user{i}") for i in range(pdf.limit)]
+    for ticket in previews + polls + clicks:
+        ticket.release()
+
+
+def _gunicorn_env(**env):
+    with mock.patch.dict(os.environ, env):
+        for name in ("ADMISSION_CAPACITY", "BATCH_CONCURRENCY"):
+            os.environ.pop(name, None)
+        runpy.run_path(os.path.join(ROOT, "gunicorn.conf.py"))
+        return dict(os.environ)
+
+
+def test_batch_pool_is_sized_for_the_serving_mode():
+    assert _gunicorn_env(SERVING_MODE="sync", GUNICORN_WORKERS="4")["BATCH_CONCURRENCY"] == "8"
+    env = _gunicorn_env(SERVING_MODE="threaded", GUNICORN_WORKERS="4", GUNICORN_THREADS="4")
+    assert env["BATCH_CONCURRENCY"] == "32"
+    env = _gunicorn_env(SERVING_MODE="async", GUNICORN_WORKERS="2", GUNICORN_WORKER_CONNECTIONS="100")
+    assert env["BATCH_CONCURRENCY"] == "800"
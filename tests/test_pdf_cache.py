@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+
+import pytest
+
+from pdf_cache import PDFDiskCache
+
+
+def _part(directory, name, size, age):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as fh:
+        fh.write(b"x" * size)
+    past = time.time() - age
+    os.utime(path, (past, past))
+    return path
+
+
+def test_orphaned_part_files_are_removed_at_startup(tmp_path):
+    orphan = _part(str(tmp_path), "tmpdead.part", 100, age=3600)
+    live = _part(str(tmp_path), "tmplive.part", 100, age=1)
+    cache = PDFDiskCache(str(tmp_path), max_bytes=10_000, part_grace=600)
+    assert not os.path.exists(orphan)
+    assert os.path.exists(live)
+    assert cache.stats()["orphans_removed"] == 1
+
+
+def test_part_files_count_against_the_size_budget(tmp_path):
+    cache = PDFDiskCache(str(tmp_path), max_bytes=1000, part_grace=600)
+    cache.put_bytes("old", b"a" * 400)
+    cache.put_bytes("new", b"b" * 400)
+    writer = cache.writer("streaming")
+    writer.write(b"c" * 400)
+    writer._file.flush()
+    cache.evict()
+    assert cache.get("old") is None
+    assert cache.get("new") is not None
+    writer.commit()
+    assert cache.get("streaming") is not None
+    assert cache.stats()["partial_files"] == 0
+
+
+def _write_slowly(writer, chunks, finish):
+    for chunk in chunks:
+        time.sleep(0.01)
+        writer.write(chunk)
+    finish()
+
+
+def test_readers_follow_an_entry_while_it_is_written(tmp_path):
+    cache = PDFDiskCache(str(tmp_path))
+    writer = cache.writer("key")
+    reader = writer.reader()
+    chunks = [bytes([i]) * 1000 for i in range(20)]
+    threading.Thread(target=_write_slowly, args=(writer, chunks, writer.commit)).start()
+    assert b"".join(writer.follow(reader, 256)) == b"".join(chunks)
+    assert reader.closed
+    assert cache.get("key") is not None
+
+
+def test_readers_of_an_aborted_entry_fail(tmp_path):
+    cache = PDFDiskCache(str(tmp_path))
+    writer = cache.writer("key")
+    reader = writer.reader()
+    threading.Thread(target=_write_slowly, args=(writer, [b"x" * 100] * 3, writer.abort)).start()
+    with pytest.raises(OSError):
+        b"".join(writer.follow(reader, 256))
+    assert cache.stats()["partial_files"] == 0
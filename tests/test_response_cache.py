@@ -0,0 +1,73 @@
+import multiprocessing
+import os
+import runpy
+from unittest import mock
+
+import flask
+
+import response_cache
+from response_cache import MemoryCacheBackend, ResponseCache, SQLiteCacheBackend, cached_view
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY = {"status": 200, "mimetype": "application/json", "body": "[]"}
+
+
+def _invalidate_in_worker(path, user_id):
+    ResponseCache(SQLiteCacheBackend(path)).invalidate_user(user_id)
+
+
+def test_invalidation_reaches_other_workers(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(SQLiteCacheBackend(path))
+    cache.set("alice", "user_sessions", "", ENTRY, ttl=60)
+    cache.set("bob", "user_sessions", "", ENTRY, ttl=60)
+    assert cache.get("alice", "user_sessions") == ENTRY
+
+    # Another worker handles alice's chat and invalidates her entries
+    worker = multiprocessing.get_context("spawn").Process(target=_invalidate_in_worker, args=(path, "alice"))
+    worker.start()
+    worker.join(30)
+    assert worker.exitcode == 0
+
+    assert cache.get("alice", "user_sessions") is None
+    assert cache.get("bob", "user_sessions") == ENTRY
+
+
+def _gunicorn_env(**env):
+    with mock.patch.dict(os.environ, env):
+        if "CACHE_BACKEND" not in env:
+            os.environ.pop("CACHE_BACKEND", None)
+        runpy.run_path(os.path.join(ROOT, "gunicorn.conf.py"))
+        return dict(os.environ)
+
+
+def test_gunicorn_shares_the_cache_between_workers():
+    assert _gunicorn_env(GUNICORN_WORKERS="4")["CACHE_BACKEND"] == "sqlite"
+    assert "CACHE_BACKEND" not in _gunicorn_env(GUNICORN_WORKERS="1")
+    assert _gunicorn_env(GUNICORN_WORKERS="4", CACHE_BACKEND="redis")["CACHE_BACKEND"] == "redis"
+
+
+def test_invalidation_during_the_view_is_not_undone(monkeypatch):
+    monkeypatch.setattr(response_cache, "response_cache", ResponseCache(MemoryCacheBackend()))
+    app = flask.Flask(__name__)
+    app.secret_key = "test"
+    calls = []
+
+    @app.route("/user_sessions")
+    @cached_view("user_sessions", ttl=60)
+    def user_sessions():
+        calls.append(1)
+        if len(calls) == 1:
+            # A chat in another request lands while this list is being read
+            response_cache.invalidate_user("alice")
+        return flask.jsonify(len(calls))
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess.update(user_id="alice", logged_in=True)
+    first = client.get("/user_sessions")
+    assert (first.json, first.headers["X-Cache"]) == (1, "MISS")
+    second = client.get("/user_sessions")
+    assert (second.json, second.headers["X-Cache"]) == (2, "MISS")
+    third = client.get("/user_sessions")
+    assert (third.json, third.headers["X-Cache"]) == (2, "HIT")
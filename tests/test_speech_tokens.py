@@ -0,0 +1,163 @@
+import os
+import stat
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from response_cache import MemoryCacheBackend, SQLiteCacheBackend
+from speech_tokens import SpeechTokenError, SpeechTokenManager
+
+
+class _Issuer(ThreadingHTTPServer):
+    """Local stand-in for the Azure token issuer: hands out token-1, token-2, ..."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _IssuerHandler)
+        self.issued = 0
+        self.delay = 0.0
+        self.fail = False
+        self.keys = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/{{region}}/sts/v1.0/issueToken"
+
+
+class _IssuerHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        time.sleep(server.delay)
+        with server.lock:
+            server.keys.append(self.headers.get("Ocp-Apim-Subscription-Key"))
+            if server.fail:
+                status, body = 401, b"invalid subscription key"
+            else:
+                server.issued += 1
+                status, body = 200, f"token-{server.issued}".encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def issuer():
+    server = _Issuer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _manager(issuer, store=None, **kwargs):
+    return SpeechTokenManager(store=store or MemoryCacheBackend(), issuer_url=issuer.url, background=False, **kwargs)
+
+
+def test_token_is_issued_once_and_served_from_the_store(issuer):
+    manager = _manager(issuer)
+    assert manager.get_token("westeurope", "key") == "token-1"
+    assert manager.get_token("westeurope", "key") == "token-1"
+    assert issuer.issued == 1
+    assert issuer.keys == ["key"]
+    assert manager.counts["misses"] == 1 and manager.counts["hits"] == 1
+
+
+def test_regions_get_their_own_token(issuer):
+    manager = _manager(issuer)
+    assert manager.get_token("westeurope", "key") == "token-1"
+    assert manager.get_token("eastus", "key") == "token-2"
+
+
+def test_tokens_are_not_shared_across_subscription_keys(issuer):
+    manager = _manager(issuer)
+    assert manager.get_token("westeurope", "key") == "token-1"
+    # A rotated key gets its own token at once instead of the old key's until it expires
+    assert manager.get_token("westeurope", "rotated-key") == "token-2"
+    assert manager.get_token("westeurope", "rotated-key") == "token-2"
+    assert issuer.keys == ["key", "rotated-key"]
+
+
+def test_issuer_calls_do_not_use_the_backend_pool(issuer):
+    from backend_client import get_pool_stats
+
+    before = get_pool_stats()["requests"]
+    _manager(issuer).get_token("westeurope", "key")
+    assert get_pool_stats()["requests"] == before
+
+
+def test_concurrent_misses_share_one_issuance(issuer):
+    issuer.delay = 0.3
+    manager = _manager(issuer)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(manager.get_token("westeurope", "key")))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert results == ["token-1"] * 8
+    assert issuer.issued == 1
+
+
+def test_stale_token_is_served_while_it_is_replaced(issuer):
+    manager = _manager(issuer, ttl=10, refresh_ahead=9.9)
+    assert manager.get_token("westeurope", "key") == "token-1"
+    time.sleep(0.2)
+    # Past TTL - REFRESH_AHEAD: the old token comes back at once, the refresh runs behind it
+    issuer.delay = 0.3
+    assert manager.get_token("westeurope", "key") == "token-1"
+    assert manager.counts["stale_served"] == 1
+    deadline = time.time() + 5
+    while issuer.issued < 2 and time.time() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.1)
+    assert manager._load("westeurope", "key")["token"] == "token-2"
+
+
+def test_issuer_failure_raises(issuer):
+    issuer.fail = True
+    manager = _manager(issuer)
+    with pytest.raises(SpeechTokenError) as excinfo:
+        manager.get_token("westeurope", "bad-key")
+    assert excinfo.value.detail == "invalid subscription key"
+    assert manager.counts["issue_failures"] == 1
+
+
+def test_workers_share_tokens_through_sqlite(issuer, tmp_path):
+    path = str(tmp_path / "tokens.sqlite")
+    assert _manager(issuer, SQLiteCacheBackend(path)).get_token("westeurope", "key") == "token-1"
+    assert _manager(issuer, SQLiteCacheBackend(path)).get_token("westeurope", "key") == "token-1"
+    assert issuer.issued == 1
+
+
+def test_sqlite_store_is_private(issuer, tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    old_umask = os.umask(0o022)
+    try:
+        store = SQLiteCacheBackend(None)
+        _manager(issuer, store).get_token("westeurope", "key")
+    finally:
+        os.umask(old_umask)
+    assert os.path.dirname(store.path) == str(tmp_path / f"dot-rag-frontend-{os.getuid()}")
+    assert stat.S_IMODE(os.stat(os.path.dirname(store.path)).st_mode) == 0o700
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(store.path + suffix):
+            assert stat.S_IMODE(os.stat(store.path + suffix).st_mode) == 0o600
+
+
+def test_shared_temp_dir_open_to_others_is_refused(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    os.mkdir(tmp_path / f"dot-rag-frontend-{os.getuid()}", 0o777)
+    os.chmod(tmp_path / f"dot-rag-frontend-{os.getuid()}", 0o777)
+    with pytest.raises(RuntimeError):
+        SQLiteCacheBackend(None)
@@ -0,0 +1,86 @@
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from werkzeug.formparser import parse_form_data
+
+from upload_stream import MultipartStream
+
+
+class _Unseekable(io.RawIOBase):
+    """A request stream that can only be read forward, like a socket"""
+
+    def __init__(self, data):
+        self._data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self._data.readinto(buffer)
+
+
+class _Recorder(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            body = b""
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                chunk = self.rfile.read(size + 2)[:size]
+                if not size:
+                    break
+                body += chunk
+        else:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.received.append((dict(self.headers), body))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def backend():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Recorder)
+    server.received = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _post(backend, body):
+    url = f"http://127.0.0.1:{backend.server_address[1]}/upload_pdf"
+    with requests.Session() as http:
+        http.post(url, data=body, headers={"Content-Type": body.content_type})
+    headers, raw = backend.received[-1]
+    environ = {
+        "REQUEST_METHOD": "POST",
+        "CONTENT_TYPE": headers["Content-Type"],
+        "CONTENT_LENGTH": str(len(raw)),
+        "wsgi.input": io.BytesIO(raw),
+    }
+    _, form, files = parse_form_data(environ)
+    return headers, form, files
+
+
+@pytest.mark.parametrize("seekable", [True, False])
+def test_file_parts_reach_the_backend(backend, seekable):
+    data = b"%PDF-1.4\n" + bytes(range(256)) * 1000
+    stream = io.BytesIO(data) if seekable else io.BufferedReader(_Unseekable(data))
+    body = MultipartStream(
+        fields={"user_id": "u1"}, files=[("pdfs", "a.pdf", stream, "application/pdf")], chunk_size=4096
+    )
+    headers, form, files = _post(backend, body)
+    if seekable:
+        assert int(headers["Content-Length"]) == body.len
+    else:
+        assert body.len is None
+        assert headers["Transfer-Encoding"] == "chunked"
+    assert form["user_id"] == "u1"
+    assert files["pdfs"].filename == "a.pdf"
+    assert files["pdfs"].read() == data
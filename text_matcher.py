@@ -0,0 +1,137 @@
+import re
+import unicodedata
+from collections import defaultdict
+
+_TOKEN = re.compile(r"\w+")
+# Line-end hyphenation in extracted text ("infor-\nmation")
+_HYPHEN_BREAK = re.compile(r"(\w)[-\u00ad\u2010]\s*\n\s*(\w)")
+_HYPHENS = ("-", "\u00ad", "\u2010")
+
+# n-grams occurring more often than this on a page carry no position information
+_MAX_POSTINGS = 8
+
+
+def normalize_text(text):
+    """NFKC (expands ligatures such as "ﬁ"), casefold, and undo line-end hyphenation"""
+    text = unicodedata.normalize("NFKC", text)
+    return _HYPHEN_BREAK.sub(r"\1\2", text).casefold()
+
+
+def tokenize(text):
+    return _TOKEN.findall(normalize_text(text))
+
+
+class PageWords:
+    """Normalized token stream of a page with a map from tokens back to word boxes.
+
+    Built once per page from page.get_text("words"). Each token records the indexes
+    of the words it came from; a word hyphenated across a line break becomes one
+    token mapped to both halves.
+    """
+
+    def __init__(self, words):
+        self.words = words
+        self.tokens = []
+        self.token_words = []
+        pending = None  # (prefix, word indexes) of a word hyphenated at a line end
+        for i, w in enumerate(words):
+            raw = unicodedata.normalize("NFKC", w[4])
+            parts = _TOKEN.findall(raw.casefold())
+            if not parts:
+                continue
+            if pending is not None:
+                prefix, indexes = pending
+                pending = None
+                self.tokens.append(prefix + parts[0])
+                self.token_words.append(indexes + (i,))
+                parts = parts[1:]
+            for part in parts:
+                self.tokens.append(part)
+                self.token_words.append((i,))
+            if raw.endswith(_HYPHENS) and self._ends_line(i):
+                pending = (self.tokens.pop(), self.token_words.pop())
+        if pending is not None:
+            self.tokens.append(pending[0])
+            self.token_words.append(pending[1])
+        self._postings = {}
+
+    @classmethod
+    def from_page(cls, page):
+        return cls(page.get_text("words"))
+
+    def _ends_line(self, i):
+        return i + 1 < len(self.words) and self.words[i + 1][5:7] != self.words[i][5:7]
+
+    def postings(self, n):
+        index = self._postings.get(n)
+        if index is None:
+            index = defaultdict(list)
+            tokens = self.tokens
+            for i in range(len(tokens) - n + 1):
+                index[tuple(tokens[i:i + n])].append(i)
+            self._postings[n] = index
+        return index
+
+    def line_rects(self, start, end):
+        """Union rect per (block, line) of the words covering tokens start..end"""
+        lines = {}
+        order = []
+        for t in range(start, end + 1):
+            for wi in self.token_words[t]:
+                x0, y0, x1, y1, _, block, line = self.words[wi][:7]
+                key = (block, line)
+                rect = lines.get(key)
+                if rect is None:
+                    lines[key] = [x0, y0, x1, y1]
+                    order.append(key)
+                else:
+                    rect[0], rect[1] = min(rect[0], x0), min(rect[1], y0)
+                    rect[2], rect[3] = max(rect[2], x1), max(rect[3], y1)
+        return [tuple(lines[key]) for key in order]
+
+
+def find_span(page_words, text, min_ratio=0.5, max_skew=3):
+    """Locate text in the page token stream; return (start, end, score) or None.
+
+    Shared n-grams vote for a diagonal (page position minus text position). The
+    winning diagonal, widened by max_skew to absorb inserted or dropped tokens,
+    gives the matched span. Runs in time linear in page plus text length.
+    """
+    query = tokenize(text)
+    if not query or not page_words.tokens:
+        return None
+    n = 3 if len(query) >= 6 else (2 if len(query) >= 3 else 1)
+    postings = page_words.postings(n)
+    anchors = []
+    votes = defaultdict(int)
+    for j in range(len(query) - n + 1):
+        positions = postings.get(tuple(query[j:j + n]))
+        if not positions or len(positions) > _MAX_POSTINGS:
+            continue
+        for i in positions:
+            anchors.append((i, i - j))
+            votes[i - j] += 1
+    if not votes:
+        return None
+
+    # Best diagonal, counting votes from neighbouring diagonals within max_skew
+    best_diag, best_votes = None, 0
+    for diag in votes:
+        total = sum(votes.get(diag + k, 0) for k in range(-max_skew, max_skew + 1))
+        if total > best_votes:
+            best_diag, best_votes = diag, total
+    grams = len(query) - n + 1
+    score = best_votes / grams
+    if score < min_ratio:
+        return None
+    hits = [i for i, diag in anchors if abs(diag - best_diag) <= max_skew]
+    return min(hits), max(hits) + n - 1, min(score, 1.0)
+
+
+def match_rects(page_words, text, min_ratio=0.5):
+    """Line rects (x0, y0, x1, y1) covering the best match of text on the page"""
+    span = find_span(page_words, text, min_ratio=min_ratio)
+    if span is None:
+        return []
+    start, end, _ = span
+    return page_words.line_rects(start, end)
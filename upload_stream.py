@@ -0,0 +1,83 @@
+import os
+import uuid
+
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(256 * 1024)))
+
+
+def _quote(value):
+    return str(value).replace("\\", "\\\\").replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+
+
+def _stream_size(stream):
+    """Return the remaining size of a seekable stream, or None if unknown"""
+    try:
+        pos = stream.tell()
+        end = stream.seek(0, os.SEEK_END)
+        stream.seek(pos)
+        return end - pos
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+class MultipartStream:
+    """multipart/form-data request body encoded on the fly.
+
+    File parts are read from their streams UPLOAD_CHUNK_SIZE bytes at a time while
+    the request is being sent, so the body is never materialised in memory. When
+    every part has a known size the object also reports its total length, which
+    lets requests send a Content-Length instead of chunked transfer encoding.
+    """
+
+    def __init__(self, fields=None, files=None, chunk_size=UPLOAD_CHUNK_SIZE, boundary=None):
+        self.boundary = boundary or uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self._parts = []
+        for name, value in (fields or {}).items():
+            header = (
+                f"--{self.boundary}\r\n"
+                f'Content-Disposition: form-data; name="{_quote(name)}"\r\n\r\n'
+            ).encode("utf-8")
+            self._parts.append((header, str(value).encode("utf-8"), None))
+        for name, filename, stream, mimetype in files or []:
+            header = (
+                f"--{self.boundary}\r\n"
+                f'Content-Disposition: form-data; name="{_quote(name)}"; filename="{_quote(filename)}"\r\n'
+                f"Content-Type: {mimetype or 'application/octet-stream'}\r\n\r\n"
+            ).encode("utf-8")
+            self._parts.append((header, stream, _stream_size(stream)))
+        self._closing = f"--{self.boundary}--\r\n".encode("utf-8")
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    @property
+    def len(self):
+        """Total body length, or None when a file part's size is unknown.
+
+        requests reads len when the body has no __len__; None makes it fall back to
+        chunked encoding. A __len__ of 0 would instead make the body falsy, and
+        Session.request replaces a falsy body with an empty form.
+        """
+        total = len(self._closing)
+        for header, body, size in self._parts:
+            if isinstance(body, bytes):
+                size = len(body)
+            elif size is None:
+                return None
+            total += len(header) + size + 2
+        return total
+
+    def __iter__(self):
+        for header, body, _ in self._parts:
+            yield header
+            if isinstance(body, bytes):
+                yield body
+            else:
+                while True:
+                    chunk = body.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+            yield b"\r\n"
+        yield self._closing
@@ -1,9 +1,25 @@
 import hashlib
-import fitz
-import re
 from collections import defaultdict
 from io import BytesIO
 
+try:
+    from .metrics import phase
+    from .ocr_index import OcrLayoutIndex
+    from .pdf_index import PageIndex, document_key, get_page_index
+    from .references import ReferenceExtractor, extract_references
+    from .startup import lazy_import
+    from .text_matcher import match_rects
+except ImportError:  # imported as a top-level module (main.py, gunicorn main:app)
+    from metrics import phase
+    from ocr_index import OcrLayoutIndex
+    from pdf_index import PageIndex, document_key, get_page_index
+    from references import ReferenceExtractor, extract_references
+    from startup import lazy_import
+    from text_matcher import match_rects
+
+# Loaded on first use, or in the gunicorn master by startup.prewarm() (STARTUP_MODE=preload)
+fitz = lazy_import("fitz")
+
 def authenticate_user(email, password):
     """Simple authentication - in production, use proper auth"""
     # For now, hardcoded credentials as requested
@@ -19,243 +35,271 @@ def generate_user_id(email):
     return hashlib.md5(email.encode()).hexdigest()
 
 
-def higlight_pdf_content(full_content, all_pages, doc, rag_pipeline):
-    from sklearn.metrics.pairwise import cosine_similarity
-    from sklearn.feature_extraction.text import TfidfVectorizer
-    found = False
+def _page_index_of(page_number):
+    """0-based page index from a source page number (an int, str, or [n])"""
+    if isinstance(page_number, list):
+        page_number = page_number[0]
+    return int(page_number) - 1
+
+
+def higlight_pdf_content(full_content, all_pages, doc, rag_pipeline, page_index=None):
+    """Highlight the best matching chunk of each content item on its cited page.
+
+    Page text, chunks and term counts come from page_index (built on demand when
+    not given), and all (content, page) pairs are scored in one batched pass.
+    """
+    if page_index is None:
+        page_index = PageIndex()
+    requests = []
     for idx, content in enumerate(full_content):
-        target_page = int(all_pages[idx]) - 1
         try:
-            for page_num, page in enumerate(doc):
-                if target_page is not None and page_num != target_page:
-                    continue
-
-                # Get page text
-                page_text = page.get_text()
-                if not page_text.strip():
-                    continue
-
-                # Try to find and highlight the content
-                try:
-                    chunks = [content] + rag_pipeline.chunk_text(text=page_text)
-                    vectorizer = TfidfVectorizer()
-                    vect_text = vectorizer.fit_transform(chunks)
-                    similarities = cosine_similarity(vect_text[0:1], vect_text[1:]).flatten()
-                    best_match_index = similarities.argmax() + 1
-                    similar_text = chunks[best_match_index]
-
-                    # Search for the text in the page
-                    text_instances = page.search_for(similar_text)
-                    if text_instances:
-                        for inst in text_instances:
-                            highlight = page.add_highlight_annot(inst)
-                            highlight.update()
-                        found = True
-                        #print(f"Successfully highlighted text on page {page_num + 1}")
-                        break
-                    else:
-                        print(f"No text instances found on page {page_num + 1}")
-                except Exception as e:
-                    print(f"Error highlighting on page {page_num + 1}: {str(e)}")
-                    # Continue to next page if highlighting fails
-                    continue
-        except Exception as e:
+            target_page = _page_index_of(all_pages[idx])
+        except (IndexError, TypeError, ValueError) as e:
             print(f"Error in highlighting process: {str(e)}")
-            # Continue without highlighting
+            continue
+        if 0 <= target_page < doc.page_count:
+            requests.append((content, target_page))
+
+    try:
+        matches = page_index.best_matches(doc, requests, rag_pipeline.chunk_text)
+    except Exception as e:
+        print(f"Error in highlighting process: {str(e)}")
+        return doc, False
+
+    found = False
+    for (content, target_page), similar_text in zip(requests, matches):
+        if similar_text is None:
+            continue
+        page = doc[target_page]
+        try:
+            # Search for the text in the page
+            text_instances = page.search_for(similar_text)
+            if text_instances:
+                for inst in text_instances:
+                    highlight = page.add_highlight_annot(inst)
+                    highlight.update()
+                found = True
+                continue
+            # Exact search misses on hyphenation, ligatures and spacing; align on words instead
+            page_words = page_index.page_words(doc, target_page)
+            rects = match_rects(page_words, similar_text) or match_rects(page_words, content)
+            if rects:
+                highlight = page.add_highlight_annot([fitz.Rect(r) for r in rects])
+                highlight.update()
+                found = True
+            else:
+                print(f"No text instances found on page {target_page + 1}")
+        except Exception as e:
+            print(f"Error highlighting on page {target_page + 1}: {str(e)}")
     return doc, found
 
-def highlight_scanned_pdf_content(full_content, all_pages, doc, page_content):
+def highlight_scanned_pdf_content(full_content, all_pages, doc, page_content, layout_index=None):
+    """Highlight OCR lines contained in the content chunks of each cited page.
+
+    Chunks are grouped per page and resolved in one batched match against that
+    page's line index; adjacent matched lines become a single annotation.
+    """
+    if layout_index is None:
+        layout_index = OcrLayoutIndex(page_content)
+    contents_by_page = defaultdict(list)
     for idx, content in enumerate(full_content):
-        target_page = int(all_pages[idx]) - 1
         try:
-            for page_num, page in enumerate(doc):
-                if target_page is not None and page_num != target_page:
-                    continue
-
-                page_text = page_content.pages[target_page].lines
-                for line in page_text:
-                    if line.content in content:
-                        x_coords = [line.polygon[i] * 72 for i in range(0, 8, 2)]
-                        y_coords = [line.polygon[i] * 72 for i in range(1, 8, 2)]
-                        x0, x1 = min(x_coords), max(x_coords)
-                        y0, y1 = min(y_coords), max(y_coords)
-
-                        rect = fitz.Rect(x0, y0, x1, y1)
-                        page.add_highlight_annot(rect)
+            contents_by_page[_page_index_of(all_pages[idx])].append(content)
+        except (IndexError, TypeError, ValueError) as e:
+            print(f"Error in highlighting process: {str(e)}")
+    for target_page, contents in contents_by_page.items():
+        try:
+            page = doc[target_page]
+            for rect in layout_index.page(target_page).highlight_rects(contents):
+                page.add_highlight_annot(fitz.Rect(rect))
         except Exception as e:
             print(f"Error highlighting on page {target_page + 1}: {str(e)}")
     return doc
 
 
 def get_highlighted_pdf_content(rag_pipeline, source, try_highlight=True):
+    # Download the PDF content from blob storage
+    with phase("fetch_blob"):
+        pdf_content = rag_pipeline.get_pdf_content_from_blob(blob_name=source["filename"])
+    return _render_highlighted_pdf(rag_pipeline, source, pdf_content, try_highlight=try_highlight)
+
+
+def _render_highlighted_pdf(rag_pipeline, source, pdf_content, try_highlight=True):
     all_content = source["content"]
     all_pages = source["page_number"]
-    # Download the PDF content from blob storage
-    pdf_content = rag_pipeline.get_pdf_content_from_blob(blob_name=source["filename"])
     # Create a BytesIO object to read the PDF content
     doc = fitz.open(stream=pdf_content, filetype="pdf")
     found = False
     if try_highlight:
-
-        if "pages_content" in source.keys():
-            doc = highlight_scanned_pdf_content(
-                full_content=all_content,
-                all_pages=all_pages,
-                doc=doc,
-                page_content=source["pages_content"]
-            )
-            found = True
-        else:
-            doc, found = higlight_pdf_content(
-                full_content=all_content,
-                all_pages=all_pages,
-                doc=doc,
-                rag_pipeline=rag_pipeline
-            )
+        with phase("highlight"):
+            if "pages_content" in source.keys():
+                doc = highlight_scanned_pdf_content(
+                    full_content=all_content,
+                    all_pages=all_pages,
+                    doc=doc,
+                    page_content=source["pages_content"]
+                )
+                found = True
+            else:
+                doc, found = higlight_pdf_content(
+                    full_content=all_content,
+                    all_pages=all_pages,
+                    doc=doc,
+                    rag_pipeline=rag_pipeline,
+                    page_index=get_page_index(document_key(pdf_content)),
+                )
     output_pdf_io = BytesIO()
-    doc.save(output_pdf_io)
+    with phase("save"):
+        doc.save(output_pdf_io)
     doc.close()
     output_pdf_io.seek(0)
     return output_pdf_io, found
 
+
+def cited_pages_pdf_file(path, cited_pages, context_pages=1):
+    """Keep only the cited pages of the PDF at path, plus context_pages on each side.
+
+    Runs in the render pool, so only the path and the (small) result cross process
+    boundaries. Returns (pdf_bytes, page_map) where page_map lists the original
+    1-based page number of every page in the output; the output's page labels are
+    set to those numbers so viewers show them too.
+    """
+    doc = fitz.open(path)
+    try:
+        keep = set()
+        for page_number in cited_pages if isinstance(cited_pages, list) else [cited_pages]:
+            try:
+                target = _page_index_of(page_number)
+            except (TypeError, ValueError):
+                continue
+            keep.update(p for p in range(target - context_pages, target + context_pages + 1) if 0 <= p < doc.page_count)
+        keep = sorted(keep) or [0]
+        page_map = [p + 1 for p in keep]
+        doc.select(keep)
+        _label_original_pages(doc, page_map)
+        # garbage=3 drops the objects only the removed pages used
+        return doc.tobytes(garbage=3, deflate=True), page_map
+    finally:
+        doc.close()
+
+
+def _label_original_pages(doc, page_map):
+    labels = []
+    for idx, original in enumerate(page_map):
+        if idx == 0 or original != page_map[idx - 1] + 1:
+            labels.append({"startpage": idx, "prefix": "", "style": "D", "firstpagenum": original})
+    try:
+        doc.set_page_labels(labels)
+    except Exception as e:
+        print(f"Could not set page labels: {str(e)}")
+
+
+def render_pdf_file_preview(path, page_number=1, dpi=96, fmt="png", clip_to_highlights=True):
+    """render_pdf_preview for a PDF on disk, so only the path crosses process boundaries"""
+    with open(path, "rb") as fh:
+        return render_pdf_preview(fh.read(), page_number, dpi, fmt, clip_to_highlights)
+
+
+def render_pdf_preview(pdf_content, page_number=1, dpi=96, fmt="png", clip_to_highlights=True, padding=24):
+    """Rasterize one page of a PDF, cropped to its highlights; returns (image_bytes, fmt)"""
+    doc = fitz.open(stream=pdf_content, filetype="pdf")
+    try:
+        page = doc[min(max(page_number - 1, 0), doc.page_count - 1)]
+        clip = None
+        if clip_to_highlights:
+            rects = [annot.rect for annot in page.annots(types=[fitz.PDF_ANNOT_HIGHLIGHT])]
+            if rects:
+                clip = fitz.Rect(rects[0])
+                for rect in rects[1:]:
+                    clip |= rect
+                clip = (clip + (-padding, -padding, padding, padding)) & page.rect
+        pix = page.get_pixmap(dpi=dpi, clip=clip, annots=True)
+        return _encode_pixmap(pix, fmt)
+    finally:
+        doc.close()
+
+
+def _encode_pixmap(pix, fmt):
+    """PNG via PyMuPDF; JPEG/WebP via Pillow when installed, else PNG"""
+    if fmt in ("jpeg", "webp"):
+        try:
+            from PIL import Image
+
+            image = Image.frombytes("RGBA" if pix.alpha else "RGB", (pix.width, pix.height), pix.samples)
+            out = BytesIO()
+            image.save(out, format=fmt.upper(), quality=80)
+            return out.getvalue(), fmt
+        except ImportError:
+            pass
+    return pix.tobytes("png"), "png"
+
+
 def extract_refs_dict(text: str) -> dict[str, list[int]]:
     """
     Return {filename: [pages, …], …} from
     • in-line refs like “… (foo.pdf, Page 3)”
     • bulleted refs like “- foo.pdf, Pages 3 and 20.”
     """
-    pattern = re.compile(
-        r"(?:\(\s*|^\s*-\s*)"  # “( …”  or  “- …” at line start
-        r"(?P<file>[^,()]+?\.pdf)"  # filename ending in .pdf
-        r"\s*,\s*Page(?:s)?\s*"  # “, Page ” / “, Pages ”
-        r"(?P<nums>[^)\n\.]+)",  # everything up to “)” / eol / period
-        flags=re.I | re.M,
-    )
+    return extract_references(text)
+
+def extract_refs_dict_v2(text: str) -> dict[str, list[int]]:
+    return extract_references(text)
 
-    refs = defaultdict(list)
+def extract_pdf_references(text: str) -> dict[str, list[int]]:
+    """References with ranges ("7-10"), "and" lists and Page/Pg/pp variants; see references.py"""
+    return extract_references(text)
 
-    for m in pattern.finditer(text):
-        filename = m.group("file").strip()
-        pages = [int(n) for n in re.findall(r"\d+", m.group("nums"))]
-        refs[filename].extend(pages)
 
-    # deduplicate & sort each page list
-    return {f: sorted(set(ps)) for f, ps in refs.items()}
+# Streamed answers: feed() chunks, close() at the end
+IncrementalReferenceExtractor = ReferenceExtractor
 
-def extract_refs_dict_v2(text: str) -> dict[str, list[int]]:
-    result = defaultdict(list)
-
-    # Regex: match lines with .pdf filename and flexible Page/Pages declaration
-    pattern = re.compile(
-        r'[\s\-•]*'  # optional leading dash, bullet, or whitespace
-        r'(?P<filename>[\w\s\-()&_]+\.pdf)\s*,?\s*'  # PDF filename
-        r'Pages?\s*:?\s*'  # "Page" or "Pages", with optional colon
-        r'(?P<pages>[\d\s, and]+)',  # page numbers
-        re.IGNORECASE
-    )
-
-    for match in pattern.finditer(text):
-        filename = match.group('filename').strip().lstrip('-• ').strip()
-        pages_raw = match.group('pages')
-        # Normalize: "and" → "," and split
-        pages_clean = re.sub(r'\band\b', ',', pages_raw, flags=re.IGNORECASE)
-        pages = [int(p.strip()) for p in pages_clean.split(',') if p.strip().isdigit()]
-        result[filename].extend(pages)
-
-    return dict(result)
 
-def extract_pdf_references(text: str) -> dict[str, list[int]]:
-    def _expand_pages(pages_str: str):
-        # Normalize separators
-        s = re.sub(r'\band\b', ',', pages_str, flags=re.IGNORECASE)
-        s = s.replace('–', '-').replace('—', '-')
-        tokens = [t.strip() for t in s.split(',') if t.strip()]
-
-        out = []
-        for t in tokens:
-            m = _PAGE_TOKEN.fullmatch(t)
-            if not m:
-                continue
-            start = int(m.group(1))
-            end = int(m.group(2)) if m.group(2) else start
-            if end >= start:
-                out.extend(range(start, end + 1))
-        return out
-
-    # Matches a single page "7" or a range "7-10" (also supports en/em dashes)
-    _PAGE_TOKEN = re.compile(r'(\d+)\s*(?:[-–—]\s*(\d+))?$')
-
-    result = defaultdict(list)
-
-    # Anchor per line; don't let pages bleed to the next line
-    # line_pattern = re.compile(
-    #     r'^\s*(?:[-•\u2022]|\d+[.)])?\s*'          # optional bullet or "1." / "1)"
-    #     r'(?P<filename>[\w\s\-()&_]+\.pdf)\s*,?\s*'
-    #     r'(?:Pages?|Pg|PP|Pgs?)\s*:?\s*'
-    #     r'(?P<pages>[^\r\n]+?)\s*$',               # capture up to end of line (no newline)
-    #     re.IGNORECASE | re.MULTILINE
-    # )
-
-    line_pattern = re.compile(
-        r'[\s\-•]*'  # optional leading dash, bullet, or whitespace
-        r'(?P<filename>[\w\s\-()&_]+\.pdf)\s*,?\s*'  # PDF filename
-        r'Pages?\s*:?\s*'  # "Page" or "Pages", with optional colon
-        r'(?P<pages>[\d\s, and]+)',  # page numbers
-        re.IGNORECASE
-    )
-
-
-    for m in line_pattern.finditer(text):
-        filename = m.group('filename').strip()
-        pages = _expand_pages(m.group('pages'))
-        if pages:
-            # dedupe & sort
-            result[filename] = sorted(set(pages))
-    return dict(result)
-
-
-def get_relevant_sources(result, response):
-    relevant_sources = {}
+def _source_filename_key(filename):
+    """Basename, lowercased, for joining answer references with retrieved documents"""
+    name = filename.rsplit("/", 1)[-1].replace("--\n\n\nReferences:\n- ", "")
+    return name.strip().lower()
 
-    for filename in result:
-        cleaned_source_filename = filename.split("/")[-1].strip()
-        cleaned_source_filename = cleaned_source_filename.replace("--\n\n\nReferences:\n- ", "").strip()
-        allowed_pages = result[filename]
-        for doc in response["source_documents"]:
-            cleaned_retrieved_filename = doc["filename"].split("/")[-1].strip()
-            if isinstance(doc["page_number"], list):
-                page_number = int(doc["page_number"][0])
-            else:
-                page_number = int(doc["page_number"])
-
-            if (
-                    (cleaned_retrieved_filename.lower() == cleaned_source_filename.lower()) and (page_number in allowed_pages)
-            ):
-                if cleaned_retrieved_filename in relevant_sources:
-                    relevant_sources[cleaned_retrieved_filename]["content"].append(doc["content"])
-                    relevant_sources[cleaned_retrieved_filename]["page_number"].append(doc["page_number"])
-                    print(relevant_sources[cleaned_retrieved_filename]["page_number"])
-                else:
-                    relevant_sources[cleaned_retrieved_filename] = doc
-                    relevant_sources[cleaned_retrieved_filename]["content"] = [doc["content"]]
-                    relevant_sources[cleaned_retrieved_filename]["page_number"] = [doc["page_number"]]
-                # relevant_sources.append(doc)
-                # seen_files.add(cleaned_source_filename)
-    relevant_sources = [relevant_sources[file_name] for file_name in relevant_sources]
-
-    # pdf_to_consider = [ans for ans in response["answer"].split() if ans in file_names]
-    # if len(pdf_to_consider)!=len(to_consider):
-    #     pdf_to_consider = {file for file in file_names for s_file in to_consider if SequenceMatcher(None, file, s_file).ratio() > 0.9}
-
-    # print("PDF to Consider : ", pdf_to_consider)
-    # reference_sources = []
-    # added_file = []
-    # for file in response["source_documents"]:
-    #     if  file["filename"] in pdf_to_consider and file["filename"] not in added_file:
-    #         reference_sources.append(file)
-    #         added_file.append(file["filename"])
-
-    # print(reference_sources)
-
-
-    return relevant_sources
\ No newline at end of file
+
+def get_relevant_sources(result, response, grouped=False):
+    """Group the retrieved chunks cited in the answer, one source per file.
+
+    result maps referenced filenames to cited pages; every retrieved document on a
+    cited page of a referenced file is joined in a single pass over
+    response["source_documents"]. Each source is a copy of its first document with
+    "content" and "page_number" turned into lists, repeated chunks dropped. Sources
+    follow the order of result; grouped=True returns them keyed by filename instead.
+    """
+    cited = {}
+    for filename, pages in result.items():
+        cited.setdefault(_source_filename_key(filename), set()).update(pages)
+
+    groups = {}
+    for doc in response["source_documents"]:
+        key = _source_filename_key(doc["filename"])
+        pages = cited.get(key)
+        if pages is None:
+            continue
+        page_number = doc["page_number"]
+        try:
+            page = int(page_number[0] if isinstance(page_number, list) else page_number)
+        except (IndexError, TypeError, ValueError):
+            continue
+        if page not in pages:
+            continue
+        group = groups.get(key)
+        if group is None:
+            source = dict(doc, content=[doc["content"]], page_number=[page_number])
+            groups[key] = (source, {(page, doc["content"])})
+        elif (page, doc["content"]) not in group[1]:
+            group[1].add((page, doc["content"]))
+            group[0]["content"].append(doc["content"])
+            group[0]["page_number"].append(page_number)
+
+    relevant_sources = {}
+    for key in cited:
+        if key in groups:
+            source = groups[key][0]
+            relevant_sources[source["filename"].rsplit("/", 1)[-1].strip()] = source
+    if grouped:
+        return relevant_sources
+    return list(relevant_sources.values())